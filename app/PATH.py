@@ -9,9 +9,43 @@ KEYFRAMES_PATH = "https://huggingface.co/datasets/ChungDat/hcm-aic2025-keyframes
 MAP_KEYFRAMES_PATH = MAP_KEYFRAMES_PATH = "https://huggingface.co/datasets/ChungDat/hcm-aic2025-additional-data/resolve/main/map-keyframes"
 METADATA_PATH = os.path.join(PROJECT_ROOT, "media-info")
 FPS_PATH = os.path.join(PROJECT_ROOT, "video_fps.json")
+OBJECTS_PATH = os.path.join(PROJECT_ROOT, "objects")
+VIDEOS_PER_PACK_PATH = os.path.join(PROJECT_ROOT, "videos_per_pack.json")
+ALL_TAGS_PATH = os.path.join(PROJECT_ROOT, "all_tags.json")
+ALL_OBJECTS_PATH = os.path.join(PROJECT_ROOT, "all_objects.json")
 
 MY_CLIP_FEATURES_PATH = os.path.join(PROJECT_ROOT, "my_feature")
 MY_MAP_KEYFRAMES_PATH = os.path.join(PROJECT_ROOT, "my-map-keyframes")
 MY_KEYFRAMES_PATH = os.path.join(PROJECT_ROOT, "my-keyframes")
 
-L28_PATH = "https://huggingface.co/datasets/ChungDat/hcm-aic2025-additional-data/resolve/main/video/"
\ No newline at end of file
+L28_PATH = "https://huggingface.co/datasets/ChungDat/hcm-aic2025-additional-data/resolve/main/video/"
+
+LOCAL_MAP_KEYFRAMES_PATH = os.path.join(PROJECT_ROOT, "map-keyframes")
+VIDEO_TAGS_PATHS = [os.path.join(PROJECT_ROOT, pack + "_video_tags.json") for pack in ["L25", "L26"]]
+
+FEATURE_STORE_PATH = os.path.join(PROJECT_ROOT, "feature-store")
+CACHE_PATH = os.path.join(PROJECT_ROOT, "cache")
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_PATH, "embeddings")
+FRAME_CACHE_PATH = os.path.join(CACHE_PATH, "frames")
+KEYFRAME_CACHE_PATH = os.path.join(CACHE_PATH, "keyframes")
+THUMBNAILS_PATH = os.path.join(PROJECT_ROOT, "thumbnails")
+
+# Local keyframe trees (<origin>/<frame>.jpg) thumbnails are generated from, per collection
+LOCAL_KEYFRAMES_PATHS = {
+    "my_collection": os.path.join(PROJECT_ROOT, "keyframes"), # Downloaded copy of KEYFRAMES_PATH
+    "my_custom_collection": MY_KEYFRAMES_PATH,
+}
+
+# Collections served by the local search backend
+LOCAL_COLLECTIONS = {
+    "my_collection": {
+        "features": CLIP_FEATURES_PATH,
+        "map_keyframes": LOCAL_MAP_KEYFRAMES_PATH,
+        "store": os.path.join(FEATURE_STORE_PATH, "my_collection"),
+    },
+    "my_custom_collection": {
+        "features": MY_CLIP_FEATURES_PATH,
+        "map_keyframes": MY_MAP_KEYFRAMES_PATH,
+        "store": os.path.join(FEATURE_STORE_PATH, "my_custom_collection"),
+    },
+}
@@ -0,0 +1,91 @@
+import os
+import json
+
+
+class VideoRecord:
+    """Metadata of one video (origin e.g. 'L21_V001')."""
+
+    __slots__ = ("origin", "pack", "video", "fps", "length", "watch_url", "title", "tags")
+
+    def __init__(self, origin: str, fps: float = 0.0, length: int = 0, watch_url: str = "", title: str = "", tags: tuple[str, ...] = ()) -> None:
+        self.origin = origin
+        self.pack = origin[:3]
+        self.video = origin[4:]
+        self.fps = fps
+        self.length = length
+        self.watch_url = watch_url
+        self.title = title
+        self.tags = tags
+
+
+class VideoCatalog:
+    """
+    Every per-video and per-pack lookup table of the app, loaded once.
+
+    Replaces re-reading video_fps.json, media-info/*.json, videos_per_pack.json, all_tags.json,
+    all_objects.json and the per-pack tag files on every call or session.
+    """
+
+    def __init__(self, fps_file: str, metadata_path: str, videos_per_pack_file: str, all_tags_file: str, all_objects_file: str, tag_files: list[str]) -> None:
+        self.videos_per_pack = _load_json(videos_per_pack_file, {})
+        self.pack_tags = _load_json(all_tags_file, {})
+        self.all_objects = _load_json(all_objects_file, [])
+        fps_data = _load_json(fps_file, {})
+        video_tags = {}
+        for file in tag_files:
+            video_tags.update(_load_json(file, {}))
+
+        origins = set(fps_data)
+        for pack, videos in self.videos_per_pack.items():
+            origins.update(pack + '_' + video for video in videos)
+
+        self.videos = {}
+        for origin in sorted(origins):
+            metadata = _load_json(os.path.join(metadata_path, origin + ".json"), {})
+            self.videos[origin] = VideoRecord(
+                origin,
+                fps=float(fps_data.get(origin, 0.0)),
+                length=int(metadata.get("length", 0) or 0),
+                watch_url=metadata.get("watch_url", ""),
+                title=metadata.get("title", ""),
+                tags=tuple(video_tags.get(origin, ())),
+            )
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def __contains__(self, origin: str) -> bool:
+        return origin in self.videos
+
+    def get(self, origin: str) -> VideoRecord | None:
+        return self.videos.get(origin)
+
+    def fps(self, origin: str) -> float:
+        """Frames per second of a video, 0.0 if unknown."""
+        record = self.videos.get(origin)
+        return record.fps if record else 0.0
+
+    def length(self, origin: str) -> int:
+        """Duration of a video in seconds, 0 if unknown."""
+        record = self.videos.get(origin)
+        return record.length if record else 0
+
+    def start_time(self, origin: str, frame_index: float) -> float:
+        """Timestamp of a frame in seconds, 0.0 if the fps of the video is unknown."""
+        fps = self.fps(origin)
+        if fps == 0:
+            return 0.0
+        return frame_index / fps
+
+    def frame_url(self, origin: str, frame_index: int = 0) -> str:
+        """Youtube URL that starts the video at a frame."""
+        record = self.videos.get(origin)
+        watch_url = record.watch_url if record else ""
+        return watch_url + "&t=" + str(int(self.start_time(origin, frame_index)))
+
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,134 @@
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and lowercase (the CLIP tokenizer lowercases anyway)."""
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings: an in-memory LRU backed by .npy files on disk.
+
+    Text queries are keyed by their normalized text, images by a hash of their bytes; keys also
+    include the model name so switching models never returns stale vectors. The disk tier is
+    shared by every session and survives restarts.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_items: int = 1024) -> None:
+        """
+        Args:
+            cache_dir (str): Folder of the disk tier.
+            model_name (str): Name of the encoder the vectors come from.
+            max_items (int): Vectors kept in memory.
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def text_key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\ntext\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def image_key(self, image_bytes: bytes) -> str:
+        return hashlib.sha1(f"{self.model_name}\nimage\n".encode("utf-8") + image_bytes).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                vector = np.load(path)
+            except (OSError, ValueError):
+                vector = None
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, vector)
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, vector: np.ndarray) -> np.ndarray:
+        """Store a vector in both tiers and return the cached (read-only) copy."""
+        vector = np.array(vector, dtype=np.float32)
+        self._remember(key, vector)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, vector)
+        os.replace(tmp_path, path)
+        return vector
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        vector.flags.writeable = False # Shared by every session
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def encode_text(self, model, text: str) -> np.ndarray:
+        """Embedding of a text query, encoded with the model only on a cache miss."""
+        key = self.text_key(text)
+        vector = self.get(key)
+        if vector is None:
+            vector = self.put(key, model.encode(text))
+        return vector
+
+    def encode_image(self, model, image_bytes: bytes) -> np.ndarray:
+        """Embedding of an image query given its file content, encoded only on a cache miss."""
+        key = self.image_key(image_bytes)
+        vector = self.get(key)
+        if vector is None:
+            from PIL import Image
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            vector = self.put(key, model.encode(image))
+        return vector
+
+    def encode_batch(self, model, texts: list[str], images: list[bytes] = ()) -> np.ndarray:
+        """
+        Embeddings of several queries, the cache misses encoded in a single model call.
+
+        Args:
+            model: Sentence-transformers CLIP model.
+            texts (list[str]): Text queries.
+            images (list[bytes]): Image queries, as file content.
+        Returns:
+            np.ndarray: One row per query, texts first then images.
+        """
+        keys = [self.text_key(text) for text in texts] + [self.image_key(image) for image in images]
+        vectors = [self.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            from PIL import Image
+            inputs = [texts[i] if i < len(texts) else Image.open(io.BytesIO(images[i - len(texts)])).convert("RGB") for i in missing]
+            encoded = model.encode(inputs)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = self.put(keys[i], vector)
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses, "memory_items": len(self._memory)}
@@ -0,0 +1,253 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from frame_cache import FrameCache
+
+SEEK_GAP = 250 # Frames between two samples above which seeking is cheaper than grabbing
+MIN_SEGMENT_S = 30 # Shortest window, in seconds, worth decoding in a process of its own
+DEFAULT_QUALITY = 90 # JPEG quality of cached frames
+
+
+def resolve_stream_url(video_path: str) -> str:
+    """Direct URL of the best stream of a Youtube video, the one `cap_from_youtube` opens."""
+    from cap_from_youtube import list_video_streams
+    streams, _ = list_video_streams(video_path)
+    return streams[-1].url
+
+def open_capture(video_path: str, fromYoutube: bool) -> cv2.VideoCapture:
+    if fromYoutube:
+        video_path = resolve_stream_url(video_path)
+    return cv2.VideoCapture(video_path)
+
+def sample_indices(fps: float, start_timestamp_in_s: float, end_timestamp_in_s: float, step: int | None = None, every_s: float | None = None, frame_count: int = 0) -> np.ndarray:
+    """
+    Frame indices to sample in a time window.
+
+    Args:
+        fps (float): Frames per second of the video.
+        start_timestamp_in_s (float): Start of the window.
+        end_timestamp_in_s (float): End of the window (inclusive).
+        step (int | None): Keep one frame every `step` frames.
+        every_s (float | None): Keep one frame every `every_s` seconds, takes precedence over step.
+        frame_count (int): Frames in the video, 0 if unknown.
+    Returns:
+        np.ndarray: Ascending frame indices.
+    """
+    start_frame = int(round(start_timestamp_in_s * fps))
+    end_frame = int(round(end_timestamp_in_s * fps))
+    if frame_count > 0:
+        end_frame = min(end_frame, frame_count - 1)
+    if every_s:
+        times = np.arange(start_timestamp_in_s, end_timestamp_in_s + 1e-9, every_s)
+        indices = np.unique(np.round(times * fps).astype(np.int64))
+        return indices[indices <= end_frame]
+    return np.arange(start_frame, end_frame + 1, max(int(step or 1), 1), dtype=np.int64)
+
+def encode_frame(frame: np.ndarray, quality: int = 90) -> bytes:
+    """JPEG bytes of a BGR frame, about a tenth of its raw size."""
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode frame")
+    return buffer.tobytes()
+
+def _iter_samples(cap: cv2.VideoCapture, targets: list[int], scale: float, stats: dict, quality: int | None = None):
+    position = 0 # Index of the frame the next grab() returns
+    for target in targets:
+        if target < position:
+            continue
+        if target - position > SEEK_GAP or (position == 0 and target > 0):
+            start_time = time.time()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            stats["seeks"] += 1
+            if position > target: # Landed past it, grab forward from a keyframe interval earlier
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(target - SEEK_GAP, 0))
+                position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+                stats["seeks"] += 1
+            stats["seek"] += time.time() - start_time
+        start_time = time.time()
+        ok = True
+        while position < target and ok:
+            ok = cap.grab()
+            position += 1
+            stats["grabbed"] += 1
+        if ok:
+            ok = cap.grab()
+            position += 1
+        stats["grab"] += time.time() - start_time
+        if not ok:
+            break
+        start_time = time.time()
+        ret, frame = cap.retrieve()
+        stats["decode"] += time.time() - start_time
+        if not ret:
+            break
+        if scale != 1:
+            frame = cv2.resize(frame, dsize=None, fx=scale, fy=scale)
+        # The frame actually decoded, past the target if the seek landed after it
+        yield position - 1, (encode_frame(frame, quality) if quality else frame)
+
+def _new_stats() -> dict:
+    return {"fps": 0.0, "open": 0.0, "seek": 0.0, "grab": 0.0, "decode": 0.0, "seeks": 0, "grabbed": 0, "cached": 0, "missed": 0, "wall": 0.0}
+
+def extract_segment(video_path: str, fromYoutube: bool, targets: list[int], scale: float = 0.5, quality: int | None = None) -> tuple[list[tuple[int, np.ndarray | bytes]], dict]:
+    """Sample given frame indices (ascending) with a capture of its own, the unit of work of the process pool."""
+    stats = _new_stats()
+    start_time = time.time()
+    cap = open_capture(video_path, fromYoutube)
+    stats["open"] = time.time() - start_time
+    samples = list(_iter_samples(cap, targets, scale, stats, quality))
+    cap.release()
+    return samples, stats
+
+def _decode_targets(cap: cv2.VideoCapture | None, video_path: str, fromYoutube: bool, targets: np.ndarray, num_segments: int, scale: float, quality: int | None, stats: dict, wall_time: float):
+    """Decode frame indices (ascending) in one process with `cap`, or in segments in a process pool."""
+    if not len(targets):
+        if cap is not None:
+            cap.release()
+        return
+    if num_segments == 1:
+        if cap is None:
+            start_time = time.time()
+            cap = open_capture(video_path, fromYoutube)
+            stats["open"] += time.time() - start_time
+        try:
+            for sample in _iter_samples(cap, targets.tolist(), scale, stats, quality):
+                yield sample
+                stats["wall"] = time.time() - wall_time
+        finally:
+            cap.release()
+        return
+    if cap is not None:
+        cap.release()
+    if fromYoutube: # Once here rather than in every worker
+        start_time = time.time()
+        video_path, fromYoutube = resolve_stream_url(video_path), False
+        stats["open"] += time.time() - start_time
+    segments = [segment.tolist() for segment in np.array_split(targets, num_segments) if len(segment)]
+    with ProcessPoolExecutor(max_workers=len(segments)) as executor:
+        results = executor.map(extract_segment, [video_path] * len(segments), [fromYoutube] * len(segments), segments, [scale] * len(segments), [quality] * len(segments))
+        for samples, segment_stats in results:
+            for key in ("open", "seek", "grab", "decode", "seeks", "grabbed"):
+                stats[key] += segment_stats[key]
+            for sample in samples:
+                yield sample
+            stats["wall"] = time.time() - wall_time
+
+def iter_frames(video_path: str, fromYoutube: bool, start_timestamp_in_s: float, end_timestamp_in_s: float, step: int | None = None, every_s: float | None = None, scale: float = 0.5, workers: int = 1, quality: int | None = None, stats: dict | None = None, min_segment_s: float = MIN_SEGMENT_S, cache: FrameCache | None = None, origin: str | None = None, fps: float | None = None):
+    """
+    Sample frames of a time window, yielding each one as soon as it is decoded.
+
+    The capture seeks to the first sample (the backend starts decoding at the keyframe before it),
+    frames between samples are only grabbed (demuxed and decoded, never converted or copied)
+    and sampled frames are retrieved. When the next sample is more than SEEK_GAP frames away
+    the capture seeks again instead of grabbing its way there.
+
+    With several workers, windows longer than `min_segment_s` are split into segments decoded
+    concurrently, each in its own process with its own capture; frames are then yielded a
+    segment at a time, in frame order.
+
+    With a frame cache, cached samples are served from it and only the others are decoded (and
+    then cached); if the fps is given too and every sample is cached, the video is not opened.
+
+    Args:
+        video_path (str): Video file or Youtube URL.
+        fromYoutube (bool): Whether video_path is a Youtube URL.
+        start_timestamp_in_s (float): Start of the window.
+        end_timestamp_in_s (float): End of the window (inclusive).
+        step (int | None): Keep one frame every `step` frames.
+        every_s (float | None): Keep one frame every `every_s` seconds, takes precedence over step.
+        scale (float): Resize factor of the frames.
+        workers (int): Processes decoding segments.
+        quality (int | None): Yield JPEG bytes of this quality instead of BGR arrays.
+        stats (dict | None): Filled with the fps of the video and timings ('open', 'seek', 'grab',
+            'decode' summed over segments, 'wall' elapsed, in seconds), plus 'seeks', 'grabbed',
+            'cached' (samples served by the cache) and 'missed' (samples that could not be decoded).
+        min_segment_s (float): Shortest segment worth its own process.
+        cache (FrameCache | None): Frame cache, used with `origin` as the video key.
+        origin (str | None): Name of the video (e.g., 'L21_V001').
+        fps (float | None): Frames per second of the video, read from the video if not given.
+    Yields:
+        tuple[int, np.ndarray | bytes]: Frame index and frame.
+    """
+    wall_time = time.time()
+    stats = _new_stats() if stats is None else stats
+    stats.update(_new_stats())
+    use_cache = cache is not None and origin is not None
+    cap = None
+    frame_count = 0
+    if not fps:
+        start_time = time.time()
+        if fromYoutube: # Resolved once, for this capture and the segment workers
+            video_path, fromYoutube = resolve_stream_url(video_path), False
+        cap = open_capture(video_path, fromYoutube)
+        stats["open"] = time.time() - start_time
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    stats["fps"] = fps
+    if fps <= 0:
+        if cap is not None:
+            cap.release()
+        return
+    targets = sample_indices(fps, start_timestamp_in_s, end_timestamp_in_s, step, every_s, frame_count)
+    # Cache frames are JPEG bytes, decoding always encodes when a cache is used
+    encode_quality = quality or (DEFAULT_QUALITY if use_cache else None)
+    cached = {}
+    if use_cache:
+        for target in targets.tolist():
+            data = cache.get(origin, target, scale, encode_quality)
+            if data is not None:
+                cached[target] = data
+    stats["cached"] = len(cached)
+    missing = targets[~np.isin(targets, list(cached))] if cached else targets
+    num_segments = min(max(workers, 1), max(int((end_timestamp_in_s - start_timestamp_in_s) // max(min_segment_s, 1e-9)), 1))
+
+    decoded = _decode_targets(cap, video_path, fromYoutube, missing, num_segments, scale, encode_quality, stats, wall_time)
+    next_decoded = next(decoded, None)
+    for target in targets.tolist():
+        if target in cached:
+            frame = cached[target]
+        else:
+            while next_decoded is not None and next_decoded[0] < target:
+                next_decoded = next(decoded, None)
+            if next_decoded is None or next_decoded[0] > target: # Past the end, or still landed past it (e.g., an inexact seek)
+                stats["missed"] += 1
+                continue
+            frame = next_decoded[1]
+            if use_cache:
+                cache.put(origin, target, scale, encode_quality, frame)
+            next_decoded = next(decoded, None)
+        if quality is None and use_cache:
+            frame = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+        yield target, frame
+        stats["wall"] = time.time() - wall_time
+    decoded.close()
+
+def read_frame(video_path: str, fromYoutube: bool, frame_index: int, scale: float = 1.0, cache: FrameCache | None = None, origin: str | None = None, fps: float | None = None) -> bytes | None:
+    """JPEG bytes of one frame, from the cache when it is there, None if the video has no such frame."""
+    if not fps: # Sampling needs the fps, so read it first
+        cap = open_capture(video_path, fromYoutube)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        cap.release()
+        if fps <= 0:
+            return None
+    timestamp = frame_index / fps
+    for index, frame in iter_frames(video_path, fromYoutube, timestamp, timestamp, scale=scale, quality=DEFAULT_QUALITY, cache=cache, origin=origin, fps=fps):
+        if index == frame_index:
+            return frame
+    return None
+
+def extract_frames(video_path: str, fromYoutube: bool, start_timestamp_in_s: float, end_timestamp_in_s: float, step: int | None = None, every_s: float | None = None, scale: float = 0.5, workers: int = 1, quality: int | None = None, cache: FrameCache | None = None, origin: str | None = None, fps: float | None = None) -> tuple[list[np.ndarray | bytes], float, list[int], dict]:
+    """
+    Every frame of `iter_frames`, collected.
+
+    Returns:
+        tuple[list[np.ndarray | bytes], float, list[int], dict]: Frames, fps of the video, frame index of each frame and timings.
+    """
+    stats = _new_stats()
+    frames, frame_indices = [], []
+    for frame_index, frame in iter_frames(video_path, fromYoutube, start_timestamp_in_s, end_timestamp_in_s, step, every_s, scale, workers, quality, stats, cache=cache, origin=origin, fps=fps):
+        frames.append(frame)
+        frame_indices.append(frame_index)
+    return frames, stats["fps"], frame_indices, stats
@@ -0,0 +1,220 @@
+import os
+import json
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from keyframe_map import get_keyframe_map
+
+VECTORS_FILE = "features.f32.npy"
+TABLE_FILE = "keyframes.npz"
+META_FILE = "meta.json"
+
+
+def read_frame_indices(map_keyframes_path: str, origin: str, num_frames: int) -> np.ndarray:
+    """
+    Read the frame index of every keyframe of a video from its map-keyframes CSV.
+
+    Args:
+        map_keyframes_path (str): Folder where map-keyframes files are stored.
+        origin (str): Name of video (e.g., 'L21_V001').
+        num_frames (int): Number of keyframes the video has features for.
+    Returns:
+        np.ndarray: Frame index of each keyframe, 0 for keyframes missing from the CSV.
+    """
+    keyframe_map = get_keyframe_map(map_keyframes_path)
+    if keyframe_map is not None and origin in keyframe_map:
+        return np.maximum(keyframe_map.frame_index(origin, np.arange(1, num_frames + 1)), 0).astype(np.int32)
+    csv_path = os.path.join(map_keyframes_path, origin + ".csv")
+    indices = np.zeros(num_frames, dtype=np.int32)
+    if os.path.exists(csv_path):
+        frame_idx = pd.read_csv(csv_path, usecols=["frame_idx"])["frame_idx"].to_numpy()[:num_frames]
+        indices[:len(frame_idx)] = frame_idx
+    return indices
+
+def build_feature_store(features_path: str, map_keyframes_path: str, out_dir: str) -> int:
+    """
+    Pack every per-video .npy feature file into one contiguous matrix plus a row table.
+
+    Vectors are L2-normalized on the way in, so cosine similarity is a dot product against
+    the stored rows. Videos are laid out in sorted origin order.
+
+    Args:
+        features_path (str): Folder with the per-video .npy feature files.
+        map_keyframes_path (str): Folder with the map-keyframes CSV files.
+        out_dir (str): Folder to write the store to.
+    Returns:
+        int: Number of rows written.
+    """
+    files = sorted(f for f in os.listdir(features_path) if f.endswith(".npy"))
+    origins, counts = [], []
+    dim = None
+    for file in files:
+        shape = np.load(os.path.join(features_path, file), mmap_mode="r").shape # Header only
+        if len(shape) != 2 or shape[0] == 0:
+            continue
+        if dim is None:
+            dim = shape[1]
+        if shape[1] != dim:
+            print(f"File {file} does not have {dim} features, skipping")
+            continue
+        origins.append(file[:-4])
+        counts.append(shape[0])
+
+    os.makedirs(out_dir, exist_ok=True)
+    offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    total = int(offsets[-1])
+    dim = dim or 512
+
+    vectors = np.lib.format.open_memmap(os.path.join(out_dir, VECTORS_FILE), mode="w+", dtype=np.float32, shape=(total, dim))
+    frame_index = np.zeros(total, dtype=np.int32)
+    for i, origin in enumerate(origins):
+        start, end = offsets[i], offsets[i + 1]
+        feature = np.load(os.path.join(features_path, origin + ".npy")).astype(np.float32, copy=False)
+        norms = np.linalg.norm(feature, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors[start:end] = feature / norms
+        frame_index[start:end] = read_frame_indices(map_keyframes_path, origin, end - start)
+    vectors.flush()
+    del vectors
+
+    # Pack, video and keyframe n of a row are implied by the offsets, only frame_idx is stored per row
+    np.savez(os.path.join(out_dir, TABLE_FILE), origins=np.asarray(origins, dtype="U16"), offsets=offsets, frame_index=frame_index)
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump({"rows": total, "dim": dim, "videos": len(origins), "normalized": True}, f)
+    return total
+
+def append_feature_store(features_path: str, map_keyframes_path: str, store_dir: str) -> int:
+    """
+    Append videos that are in the features folder but not yet in the store.
+
+    Existing rows keep their position, so anything keyed by row stays valid and only needs the
+    new rows added: saved quantized codes are encoded for them and a saved HNSW graph gets them
+    inserted here.
+
+    Args:
+        features_path (str): Folder with the per-video .npy feature files.
+        map_keyframes_path (str): Folder with the map-keyframes CSV files.
+        store_dir (str): Folder of an existing store.
+    Returns:
+        int: Number of rows appended.
+    """
+    store = FeatureStore.open(store_dir)
+    known = set(store.origins)
+    new = FeatureStore.from_folders(features_path, map_keyframes_path, exclude=known)
+    if len(new) == 0:
+        return 0
+    with open(os.path.join(store_dir, META_FILE), "r") as f:
+        meta = json.load(f)
+
+    total = len(store) + len(new)
+    dim = store.vectors.shape[1]
+    origins = store.origins + new.origins
+    offsets = np.concatenate([store.offsets, store.offsets[-1] + new.offsets[1:]])
+    frame_index = np.concatenate([store.frame_index, new.frame_index]).astype(np.int32)
+
+    tmp_path = os.path.join(store_dir, VECTORS_FILE + ".tmp")
+    vectors = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(total, dim))
+    vectors[:len(store)] = store.vectors
+    vectors[len(store):] = new.vectors
+    vectors.flush()
+    del vectors, store
+    os.replace(tmp_path, os.path.join(store_dir, VECTORS_FILE))
+
+    np.savez(os.path.join(store_dir, TABLE_FILE), origins=np.asarray(origins, dtype="U16"), offsets=offsets, frame_index=frame_index)
+    meta.update({"rows": total, "videos": len(origins)})
+    with open(os.path.join(store_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    # Quantized codes and the HNSW graph saved next to the store are completed with the new rows
+    from quantization import QuantizedIndex
+    from hnsw import HNSWIndex
+    vectors = np.load(os.path.join(store_dir, VECTORS_FILE), mmap_mode="r")
+    for mode in ("int8", "binary"):
+        QuantizedIndex.load(store_dir, vectors, mode)
+    index = HNSWIndex.load(store_dir, vectors)
+    if index is not None:
+        index.add_rows(total)
+        index.save(store_dir)
+    return len(new)
+
+
+class FeatureStore:
+    """
+    All keyframe vectors of a collection as one (rows, dim) matrix with a row table.
+
+    Row i belongs to video `origins[video_codes[i]]`, is its `frame_n[i]`-th keyframe and sits at
+    `frame_index[i]` in the video. Rows of a video are contiguous: `offsets[v]:offsets[v + 1]`.
+    """
+
+    def __init__(self, vectors: np.ndarray, origins: list[str], offsets: np.ndarray, frame_index: np.ndarray) -> None:
+        self.vectors = vectors
+        self.origins = [str(origin) for origin in origins]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        counts = np.diff(self.offsets)
+        self.video_codes = np.repeat(np.arange(len(self.origins), dtype=np.int32), counts)
+        self.frame_n = (np.arange(len(vectors), dtype=np.int64) - np.repeat(self.offsets[:-1], counts) + 1).astype(np.int32)
+        self.frame_index = np.asarray(frame_index)
+        self.packs = np.array([origin[:3] for origin in self.origins], dtype=object)
+        self.videos = np.array([origin[4:] for origin in self.origins], dtype=object)
+
+    @classmethod
+    def open(cls, store_dir: str) -> "FeatureStore":
+        """
+        Open a store written by `build_feature_store` without reading the vectors into memory.
+
+        Args:
+            store_dir (str): Folder the store was written to.
+        Returns:
+            FeatureStore: Store backed by a read-only memory map.
+        """
+        vectors = np.load(os.path.join(store_dir, VECTORS_FILE), mmap_mode="r")
+        with np.load(os.path.join(store_dir, TABLE_FILE)) as table:
+            return cls(vectors, table["origins"].tolist(), table["offsets"], table["frame_index"])
+
+    @classmethod
+    def from_folders(cls, features_path: str, map_keyframes_path: str, exclude: set[str] | None = None) -> "FeatureStore":
+        """Load the per-video .npy files directly into memory, for when no store has been built."""
+        files = sorted(f for f in os.listdir(features_path) if f.endswith(".npy")) if os.path.exists(features_path) else []
+        matrices, origins, frame_index = [], [], []
+        for file in files:
+            if exclude and file[:-4] in exclude:
+                continue
+            feature = np.load(os.path.join(features_path, file))
+            if feature.ndim != 2 or feature.shape[0] == 0:
+                continue
+            if matrices and feature.shape[1] != matrices[0].shape[1]:
+                continue
+            matrices.append(feature.astype(np.float32, copy=False))
+            origins.append(file[:-4])
+            frame_index.append(read_frame_indices(map_keyframes_path, file[:-4], feature.shape[0]))
+
+        vectors = np.concatenate(matrices) if matrices else np.zeros((0, 512), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(m) for m in matrices])
+        frame_index = np.concatenate(frame_index) if frame_index else np.zeros(0, dtype=np.int32)
+        return cls(vectors, origins, offsets, frame_index)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack per-video CLIP features into a memory-mapped feature store.")
+    parser.add_argument("--features", required=True, help="Folder with the per-video .npy feature files")
+    parser.add_argument("--map-keyframes", required=True, help="Folder with the map-keyframes CSV files")
+    parser.add_argument("--out", required=True, help="Folder to write the store to")
+    parser.add_argument("--append", action="store_true", help="Only append videos missing from an existing store")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.append and os.path.exists(os.path.join(args.out, META_FILE)):
+        rows = append_feature_store(args.features, args.map_keyframes, args.out)
+        print(f"Appended {rows} keyframes to {args.out} in {time.time() - start_time:.1f}s")
+    else:
+        rows = build_feature_store(args.features, args.map_keyframes, args.out)
+        print(f"Packed {rows} keyframes into {args.out} in {time.time() - start_time:.1f}s")
@@ -0,0 +1,191 @@
+from functools import lru_cache
+from collections import defaultdict
+import numpy as np
+from qdrant_client.http import models
+
+
+def parse_video_range(text: str) -> tuple[int, int] | None:
+    """
+    Parse a video range such as 'V001-V020', '1-20' or 'V007'.
+
+    Returns:
+        tuple[int, int] | None: Inclusive (first, last) video numbers, None if the text is empty or invalid.
+    """
+    text = text.strip().upper().replace(" ", "")
+    if not text:
+        return None
+    parts = text.split("-")
+    try:
+        numbers = [int(part.lstrip("V")) for part in parts]
+    except ValueError:
+        return None
+    if len(numbers) == 1:
+        return numbers[0], numbers[0]
+    if len(numbers) == 2 and numbers[0] <= numbers[1]:
+        return numbers[0], numbers[1]
+    return None
+
+
+def create_filter_conditions(packs: list[str], tags: list[str], video_range: tuple[int, int] | None = None) -> list[models.FieldCondition] | None:
+    """
+    Create conditions to search for videos in packs with specific tags.
+
+    Agrs:
+        packs (list[str]): A list of selected packs.
+        tags (list[str]): A list of selected tags.
+        video_range (tuple[int, int] | None): Inclusive range of video numbers to search.
+    Returns:
+        list[models.FieldCondition] | None: A lsit of conditions if packs or tags is provided. Returns None otherwise.
+    """
+
+    if not tags and not packs and not video_range:
+        return None
+    conditions = []
+    if packs:
+        conditions.append(
+            models.FieldCondition(
+                key="pack",
+                match=models.MatchAny(any=packs)
+            )
+        )
+    if tags:
+        for tag in tags:
+            conditions.append(
+                models.FieldCondition(
+                    key="tags",
+                    match=models.MatchValue(value=tag)
+                )
+            )
+    if video_range:
+        conditions.append(
+            models.FieldCondition(
+                key="video",
+                match=models.MatchAny(any=[f"V{n:03d}" for n in range(video_range[0], video_range[1] + 1)])
+            )
+        )
+    if not conditions:
+        return None
+    return conditions
+
+def create_ignore_condition(origins: set[str]) -> list[models.FieldCondition] | None:
+    """
+    Create conditions to ignore when searching for videos.
+
+    Ignored videos are grouped by pack, so the filter has one condition per pack instead of
+    one per video.
+
+    Agrs:
+        origins (list[str]): A list of videos to ignore.
+    Returns:
+        list[models.FieldCondition] | None: A list of conditions if origins is provided. Returns None otherwise.
+    """
+
+    if not origins:
+        return None
+    videos_per_pack = defaultdict(list)
+    for origin in sorted(origins):
+        pack, video = origin.split('_')
+        videos_per_pack[pack].append(video)
+    conditions = []
+    for pack, videos in videos_per_pack.items():
+        conditions.append(
+            models.Filter(
+                must=[
+                    models.FieldCondition(
+                        key="pack",
+                        match=models.MatchValue(value=pack)
+                    ),
+                    models.FieldCondition(
+                        key="video",
+                        match=models.MatchAny(any=videos)
+                    ),
+                ]
+            )
+        )
+    if not conditions:
+        return None
+    return conditions
+
+
+class FilterCompiler:
+    """
+    Compiles pack, tag, ignore-list and video-range predicates into row masks over a collection.
+
+    Every predicate is evaluated once per video and broadcast to the keyframe rows; both the
+    per-video masks and the final row masks are cached, so repeated filters across queries and
+    sessions cost a dictionary lookup.
+    """
+
+    def __init__(self, origins: list[str], video_codes: np.ndarray, video_tags: list[list[str]]) -> None:
+        """
+        Args:
+            origins (list[str]): Videos of the collection (e.g., 'L21_V001').
+            video_codes (np.ndarray): Video of each row, as an index into origins.
+            video_tags (list[list[str]]): Tags of each video, parallel to origins.
+        """
+        self.origins = origins
+        self.video_codes = video_codes
+        self.packs = np.array([origin[:3] for origin in origins], dtype=object)
+        self.video_numbers = np.array([int(origin[5:]) if origin[5:].isdigit() else -1 for origin in origins], dtype=np.int64)
+        self.video_tags = [set(tags) for tags in video_tags]
+        self._lookup = {origin: i for i, origin in enumerate(origins)}
+        # Caches of this compiler only, released with it
+        self._pack_mask = lru_cache(maxsize=128)(self._build_pack_mask)
+        self._tag_mask = lru_cache(maxsize=512)(self._build_tag_mask)
+        self._ignore_mask = lru_cache(maxsize=128)(self._build_ignore_mask)
+        self._row_mask = lru_cache(maxsize=64)(self._build_row_mask)
+
+    def _build_pack_mask(self, packs: frozenset[str]) -> np.ndarray:
+        return np.isin(self.packs, list(packs))
+
+    def _build_tag_mask(self, tag: str) -> np.ndarray:
+        return np.array([tag in tags for tags in self.video_tags], dtype=bool)
+
+    def _build_ignore_mask(self, ignore: frozenset[str]) -> np.ndarray:
+        mask = np.ones(len(self.origins), dtype=bool)
+        codes = [self._lookup[origin] for origin in ignore if origin in self._lookup]
+        mask[codes] = False
+        return mask
+
+    def video_mask(self, packs: list[str] | None = None, tags: list[str] | None = None, ignore: set[str] | None = None, video_range: tuple[int, int] | None = None) -> np.ndarray | None:
+        """Boolean mask over videos matching every predicate, None if there is no predicate."""
+        mask = None
+        if packs:
+            mask = self._pack_mask(frozenset(packs)).copy()
+        for tag in tags or []:
+            mask = self._tag_mask(tag).copy() if mask is None else mask & self._tag_mask(tag)
+        if ignore:
+            ignore_mask = self._ignore_mask(frozenset(ignore))
+            mask = ignore_mask.copy() if mask is None else mask & ignore_mask
+        if video_range:
+            range_mask = (self.video_numbers >= video_range[0]) & (self.video_numbers <= video_range[1])
+            mask = range_mask if mask is None else mask & range_mask
+        return mask
+
+    def _build_row_mask(self, packs: frozenset[str], tags: tuple[str, ...], ignore: frozenset[str], video_range: tuple[int, int] | None) -> np.ndarray | None:
+        mask = self.video_mask(packs, tags, ignore, video_range)
+        if mask is None:
+            return None
+        rows = mask[self.video_codes] if len(mask) else np.zeros(len(self.video_codes), dtype=bool)
+        rows.flags.writeable = False # Shared by every caller of the cache
+        return rows
+
+    def compile(self, packs: list[str] | None = None, tags: list[str] | None = None, ignore: set[str] | None = None, video_range: tuple[int, int] | None = None, extra_mask: np.ndarray | None = None) -> np.ndarray | None:
+        """
+        Row mask of the keyframes matching every predicate.
+
+        Args:
+            packs (list[str] | None): Keep videos of any of these packs.
+            tags (list[str] | None): Keep videos having every tag.
+            ignore (set[str] | None): Drop these videos (origins).
+            video_range (tuple[int, int] | None): Keep videos numbered in this inclusive range.
+            extra_mask (np.ndarray | None): Another row mask to AND in (e.g., objects), over the same rows.
+        Returns:
+            np.ndarray | None: Boolean mask over rows, None if nothing is filtered.
+        """
+        mask = self._row_mask(frozenset(packs or ()), tuple(sorted(tags or ())), frozenset(ignore or ()), video_range)
+        if extra_mask is None:
+            return mask
+        if len(extra_mask) != len(self.video_codes):
+            raise ValueError(f"Row mask has {len(extra_mask)} rows, the collection has {len(self.video_codes)}")
+        return extra_mask if mask is None else mask & extra_mask
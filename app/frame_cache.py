@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Size-bounded disk cache of extracted frames (JPEG bytes), keyed by (origin, frame index, scale,
+    JPEG quality).
+
+    Frames are stored as `cache_dir/<origin>/<scale>_q<quality>/<frame index>.jpg`. The files found at start
+    are ordered by modification time, hits move a frame to the recent end (and touch its file so
+    the order survives restarts), and the least recently used frames are deleted once the cache
+    grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 << 30) -> None:
+        """
+        Args:
+            cache_dir (str): Folder of the cache.
+            max_bytes (int): Size the cache is kept under.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # Path -> size, least recently used first
+        self._size = 0
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for file in files:
+                if file.endswith(".jpg"):
+                    path = os.path.join(root, file)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime_ns, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._entries[path] = size
+            self._size += size
+
+    def _path(self, origin: str, frame_index: int, scale: float, quality: int) -> str:
+        return os.path.join(self.cache_dir, origin, f"{scale:g}_q{int(quality)}", f"{int(frame_index)}.jpg")
+
+    def get(self, origin: str, frame_index: int, scale: float, quality: int) -> bytes | None:
+        path = self._path(origin, frame_index, scale, quality)
+        with self._lock:
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError: # Deleted behind our back
+            with self._lock:
+                self._size -= self._entries.pop(path, 0)
+            return None
+        return data
+
+    def put(self, origin: str, frame_index: int, scale: float, quality: int, data: bytes) -> None:
+        path = self._path(origin, frame_index, scale, quality)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(data) - self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            evicted = []
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_path, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "frames": len(self._entries), "bytes": self._size}
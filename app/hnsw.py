@@ -0,0 +1,275 @@
+import os
+import heapq
+import argparse
+import time
+import numpy as np
+
+INDEX_FILE = "hnsw.npz"
+
+
+class HNSWIndex:
+    """
+    Hierarchical navigable small world graph over the rows of a vector matrix.
+
+    Vectors must be L2-normalized (similarity is a dot product). Node ids are row numbers of the
+    matrix, so new rows appended to a feature store can be inserted without rebuilding.
+    Level 0 is a dense (nodes, 2 * M) neighbour array padded with -1; upper levels, which hold
+    few nodes, are dictionaries from node to neighbour array.
+    """
+
+    def __init__(self, vectors: np.ndarray, M: int = 16, ef_construction: int = 100, ef_search: int = 300, seed: int = 0) -> None:
+        self.vectors = np.asarray(vectors) # Plain view of a memmap, avoids per-access subclass overhead
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / np.log(M)
+        self.rng = np.random.default_rng(seed)
+
+        self.size = 0
+        self.levels = np.zeros(0, dtype=np.int8)
+        self.neighbors0 = np.full((0, self.M0), -1, dtype=np.int32)
+        self.upper = [] # upper[l - 1] maps node -> neighbours at level l
+        self.entry_point = -1
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self.levels):
+            return
+        capacity = max(capacity, 2 * len(self.levels))
+        levels = np.zeros(capacity, dtype=np.int8)
+        levels[:self.size] = self.levels[:self.size]
+        neighbors0 = np.full((capacity, self.M0), -1, dtype=np.int32)
+        neighbors0[:self.size] = self.neighbors0[:self.size]
+        self.levels, self.neighbors0 = levels, neighbors0
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            neighbors = self.neighbors0[node]
+            return neighbors[neighbors >= 0]
+        return self.upper[level - 1].get(node, np.zeros(0, dtype=np.int32))
+
+    def _set_neighbors(self, node: int, level: int, neighbors: np.ndarray) -> None:
+        if level == 0:
+            self.neighbors0[node] = -1
+            self.neighbors0[node, :len(neighbors)] = neighbors
+        else:
+            self.upper[level - 1][node] = np.asarray(neighbors, dtype=np.int32)
+
+    def _search_layer(self, query: np.ndarray, entry_points: list[int], ef: int, level: int, visited: np.ndarray, allowed: np.ndarray | None = None) -> list[tuple[float, int]]:
+        """
+        Best-first search of one level.
+
+        Returns up to `ef` (similarity, node) pairs, best first. With `allowed`, every node is
+        still traversed but only allowed nodes are returned.
+        """
+        entry_points = np.asarray(entry_points, dtype=np.int64)
+        visited[entry_points] = True
+        similarities = np.asarray(self.vectors[entry_points], dtype=np.float32) @ query
+        candidates = [(-s, n) for s, n in zip(similarities.tolist(), entry_points.tolist())]
+        heapq.heapify(candidates)
+        results = [(s, n) for s, n in zip(similarities.tolist(), entry_points.tolist()) if allowed is None or allowed[n]]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_similarity, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_similarity < results[0][0]:
+                break
+            neighbors = self._neighbors(node, level)
+            neighbors = neighbors[~visited[neighbors]]
+            if len(neighbors) == 0:
+                continue
+            visited[neighbors] = True
+            similarities = np.asarray(self.vectors[neighbors], dtype=np.float32) @ query
+            for similarity, neighbor in zip(similarities.tolist(), neighbors.tolist()):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbor))
+                    if allowed is None or allowed[neighbor]:
+                        heapq.heappush(results, (similarity, neighbor))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: list[tuple[float, int]], m: int) -> np.ndarray:
+        """
+        Neighbour selection heuristic: keep a candidate only if it is closer to the base node
+        than to every neighbour already kept, which spreads links across clusters.
+        `candidates` are (similarity to the base node, node) pairs, best first.
+        """
+        if len(candidates) <= m:
+            return np.asarray([n for _, n in candidates], dtype=np.int32)
+        nodes = np.asarray([n for _, n in candidates], dtype=np.int64)
+        to_base = np.asarray([s for s, _ in candidates], dtype=np.float32)
+        candidate_vectors = np.asarray(self.vectors[nodes], dtype=np.float32)
+        pairwise = candidate_vectors @ candidate_vectors.T
+        # Each kept neighbour blocks every candidate it is closer to than the base node is
+        blocked = np.zeros(len(nodes), dtype=bool)
+        kept = []
+        while len(kept) < m:
+            free = np.flatnonzero(~blocked)
+            if len(free) == 0:
+                break
+            kept.append(int(free[0]))
+            blocked |= pairwise[:, free[0]] >= to_base
+            blocked[free[0]] = True
+        if len(kept) < m: # Fill up with the closest pruned candidates
+            kept_set = set(kept)
+            kept.extend([i for i in range(len(nodes)) if i not in kept_set][:m - len(kept)])
+        return nodes[kept].astype(np.int32)
+
+    def _random_level(self) -> int:
+        return int(-np.log(1.0 - self.rng.random()) * self.level_mult)
+
+    def add_rows(self, end: int) -> int:
+        """
+        Insert every row of `self.vectors` from the current size up to `end`.
+
+        Args:
+            end (int): Row to stop at (usually len(vectors) after appending new videos).
+        Returns:
+            int: Number of inserted rows.
+        """
+        start = self.size
+        self._reserve(end)
+        visited = np.zeros(end, dtype=bool)
+        for node in range(start, end):
+            self._insert(node, visited)
+        return end - start
+
+    def _insert(self, node: int, visited: np.ndarray) -> None:
+        query = np.asarray(self.vectors[node], dtype=np.float32)
+        level = self._random_level()
+        self.levels[node] = level
+        self.size = node + 1
+        while len(self.upper) < level:
+            self.upper.append({})
+        if self.entry_point < 0:
+            for l in range(1, level + 1):
+                self.upper[l - 1][node] = np.zeros(0, dtype=np.int32)
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry_points = [self.entry_point]
+        for l in range(self.max_level, level, -1):
+            visited[:] = False
+            entry_points = [self._search_layer(query, entry_points, 1, l, visited)[0][1]]
+
+        for l in range(min(level, self.max_level), -1, -1):
+            visited[:] = False
+            found = self._search_layer(query, entry_points, self.ef_construction, l, visited)
+            m = self.M0 if l == 0 else self.M
+            neighbors = self._select_neighbors(found, self.M)
+            self._set_neighbors(node, l, neighbors)
+            for neighbor in neighbors.tolist():
+                links = np.append(self._neighbors(neighbor, l), node)
+                if len(links) > m: # Drop the farthest link, cheaper than re-running the heuristic
+                    similarities = self.vectors[links] @ self.vectors[neighbor]
+                    links = links[np.argsort(-similarities)[:m]]
+                self._set_neighbors(neighbor, l, links)
+            entry_points = [n for _, n in found]
+
+        for l in range(self.max_level + 1, level + 1):
+            self.upper[l - 1][node] = np.zeros(0, dtype=np.int32)
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def search(self, query: np.ndarray, k: int, ef_search: int | None = None, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search.
+
+        Args:
+            query (np.ndarray): L2-normalized query vector.
+            k (int): Number of results.
+            ef_search (int | None): Size of the dynamic candidate list, defaults to `self.ef_search`.
+                Larger is slower and more accurate; it is raised to k if smaller.
+            allowed (np.ndarray | None): Boolean row mask; only allowed rows are returned.
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Rows and similarities, best first.
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        ef = max(ef_search or self.ef_search, k)
+        visited = np.zeros(self.size, dtype=bool)
+        entry_points = [self.entry_point]
+        for l in range(self.max_level, 0, -1):
+            visited[:] = False
+            entry_points = [self._search_layer(query, entry_points, 1, l, visited)[0][1]]
+        visited[:] = False
+        found = self._search_layer(query, entry_points, ef, 0, visited, allowed)[:k]
+        rows = np.asarray([n for _, n in found], dtype=np.int64)
+        similarities = np.asarray([s for s, _ in found], dtype=np.float32)
+        return rows, similarities
+
+    def save(self, store_dir: str) -> None:
+        arrays = {
+            "params": np.asarray([self.M, self.ef_construction, self.ef_search, self.entry_point, self.max_level, self.size], dtype=np.int64),
+            "levels": self.levels[:self.size],
+            "neighbors0": self.neighbors0[:self.size],
+        }
+        for l, layer in enumerate(self.upper, start=1):
+            nodes = np.asarray(sorted(layer), dtype=np.int32)
+            neighbors = np.full((len(nodes), self.M), -1, dtype=np.int32)
+            for i, node in enumerate(nodes.tolist()):
+                neighbors[i, :len(layer[node])] = layer[node]
+            arrays[f"nodes{l}"] = nodes
+            arrays[f"neighbors{l}"] = neighbors
+        np.savez(os.path.join(store_dir, INDEX_FILE), **arrays)
+
+    @classmethod
+    def load(cls, store_dir: str, vectors: np.ndarray, ef_search: int | None = None) -> "HNSWIndex | None":
+        """Load an index saved next to a feature store, or None if it has not been built."""
+        path = os.path.join(store_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            M, ef_construction, saved_ef_search, entry_point, max_level, size = data["params"].tolist()
+            index = cls(vectors, M, ef_construction, ef_search or saved_ef_search)
+            index.size = size
+            index.levels = data["levels"]
+            index.neighbors0 = data["neighbors0"]
+            index.entry_point, index.max_level = entry_point, max_level
+            for l in range(1, max_level + 1):
+                nodes, neighbors = data[f"nodes{l}"], data[f"neighbors{l}"]
+                index.upper.append({node: row[row >= 0] for node, row in zip(nodes.tolist(), neighbors)})
+        index.rng = np.random.default_rng(size) # Do not replay the level sequence of the first build
+        return index
+
+
+if __name__ == "__main__":
+    from feature_store import FeatureStore
+    from quantization import recall_at_k
+    from local_engine import top_k
+
+    parser = argparse.ArgumentParser(description="Build or extend the HNSW index of a feature store. Rows added to the store since the last run are inserted incrementally.")
+    parser.add_argument("--store", required=True, help="Feature store folder")
+    parser.add_argument("--M", type=int, default=16, help="Links per node on upper levels (2 * M on level 0)")
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, default=300)
+    parser.add_argument("--k", type=int, default=300, help="k used to report recall and latency")
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    store = FeatureStore.open(args.store)
+    index = HNSWIndex.load(args.store, store.vectors, args.ef_search)
+    if index is None:
+        index = HNSWIndex(store.vectors, args.M, args.ef_construction, args.ef_search)
+    start_time = time.time()
+    inserted = index.add_rows(len(store))
+    index.save(args.store)
+    print(f"Inserted {inserted} rows in {time.time() - start_time:.1f}s, index has {len(index)} rows")
+
+    rng = np.random.default_rng(0)
+    queries = np.asarray(store.vectors[rng.choice(len(store), size=min(args.queries, len(store)), replace=False)], dtype=np.float32)
+    recalls, latencies = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        rows, _ = index.search(query, args.k)
+        latencies.append(time.perf_counter() - start_time)
+        recalls.append(recall_at_k(top_k(np.asarray(store.vectors @ query), args.k), rows))
+    print(f"ef_search={index.ef_search}: recall@{args.k} = {np.mean(recalls):.3f}, median latency {np.median(latencies) * 1000:.1f} ms")
@@ -0,0 +1,228 @@
+import os
+import json
+import argparse
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from PATH import CLIP_FEATURES_PATH, LOCAL_MAP_KEYFRAMES_PATH, VIDEO_TAGS_PATHS, CACHE_PATH
+from feature_store import read_frame_indices
+from local_engine import frame_file_name, load_video_tags
+
+POINT_NAMESPACE = uuid.UUID("6f1c1a52-3c55-4f0e-9a51-0c7d2d7b6e10")
+PAYLOAD_INDEXES = {
+    "pack": models.PayloadSchemaType.KEYWORD,
+    "video": models.PayloadSchemaType.KEYWORD,
+    "origin": models.PayloadSchemaType.KEYWORD, # Grouping key of grouped search
+    "tags": models.PayloadSchemaType.KEYWORD,
+    "frame_index": models.PayloadSchemaType.INTEGER,
+}
+
+
+def point_id(origin: str, frame_n: int) -> str:
+    """Point ID of the n-th keyframe of a video, the same on every run (e.g., re-ingesting after a crash)."""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{origin}/{frame_n}"))
+
+def read_video(features_path: str, map_keyframes_path: str, file: str, tags: list[str] | None = None) -> tuple[str, np.ndarray, list[str], list[dict]] | None:
+    """
+    Read the features of one video and build its points.
+
+    Args:
+        features_path (str): Folder with the per-video .npy feature files.
+        map_keyframes_path (str): Folder with the map-keyframes CSV files.
+        file (str): Feature file of the video (e.g., 'L21_V001.npy').
+        tags (list[str] | None): Tags of the video.
+    Returns:
+        tuple[str, np.ndarray, list[str], list[dict]] | None: Origin, vectors, point IDs and payloads, None if the file is not a feature matrix.
+    """
+    origin = file[:-4]
+    feature = np.load(os.path.join(features_path, file))
+    if feature.ndim != 2 or feature.shape[0] == 0:
+        return None
+    frame_index = read_frame_indices(map_keyframes_path, origin, feature.shape[0]).tolist()
+    ids, payloads = [], []
+    for i in range(feature.shape[0]):
+        payload = {"pack": origin[:3], "video": origin[4:], "frame_index": frame_index[i], "frame": frame_file_name(i + 1), "origin": origin}
+        if tags:
+            payload["tags"] = tags
+        ids.append(point_id(origin, i + 1))
+        payloads.append(payload)
+    return origin, feature.astype(np.float32, copy=False), ids, payloads
+
+
+class Checkpoint:
+    """Videos already ingested into a collection, saved to a JSON file after every acknowledged video."""
+
+    def __init__(self, path: str, collection_name: str) -> None:
+        self.path = path
+        self.collection_name = collection_name
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("collection") == collection_name:
+                self.done = set(data.get("done", []))
+
+    def add(self, origin: str) -> None:
+        self.done.add(origin)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"collection": self.collection_name, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def prepare_collection(client: QdrantClient, collection_name: str, dim: int) -> None:
+    """Create the collection if needed, with indexing paused for the bulk upload, and its payload indexes."""
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+        )
+        print(f"Collection '{collection_name}' created.")
+    else:
+        client.update_collection(collection_name=collection_name, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0))
+    schema = client.get_collection(collection_name).payload_schema
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name not in schema:
+            client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+
+def ingest(client: QdrantClient, collection_name: str, features_path: str, map_keyframes_path: str, packs: list[str] | None = None, origins: set[str] | None = None, tag_files: list[str] | None = None, batch_size: int = 512, workers: int | None = None, max_in_flight: int = 4, checkpoint_path: str | None = None) -> int:
+    """
+    Upload per-video features into a Qdrant collection.
+
+    Feature files are read in a process pool and their points streamed in fixed-size batches,
+    with at most `max_in_flight` upserts pending. Reads are submitted through a window of
+    max(max_in_flight, workers) videos, so only that many feature files are in memory at once
+    however large the packs are. A video is recorded in the checkpoint once
+    all of its points are acknowledged, so an interrupted run resumes at the first unfinished
+    video; point IDs are deterministic, so re-sending its batches only overwrites them.
+
+    Args:
+        client (QdrantClient): Target server.
+        collection_name (str): Collection to fill, created if it does not exist.
+        features_path (str): Folder with the per-video .npy feature files.
+        map_keyframes_path (str): Folder with the map-keyframes CSV files.
+        packs (list[str] | None): Only ingest these packs (e.g., ['L21', 'L22']).
+        origins (set[str] | None): Only ingest these videos (e.g., {'L21_V001'}).
+        tag_files (list[str] | None): Per-pack video tag files, stored in the 'tags' payload.
+        batch_size (int): Points per upsert.
+        workers (int | None): Processes reading feature files.
+        max_in_flight (int): Upserts pending at once.
+        checkpoint_path (str | None): Progress file, defaults to cache/ingest_<collection>.json.
+    Returns:
+        int: Number of points uploaded.
+    """
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(CACHE_PATH, f"ingest_{collection_name}.json"), collection_name)
+    files = sorted(f for f in os.listdir(features_path) if f.endswith(".npy"))
+    if packs:
+        files = [f for f in files if f[:3] in packs]
+    if origins is not None:
+        files = [f for f in files if f[:-4] in origins]
+    files = [f for f in files if f[:-4] not in checkpoint.done]
+    if not files:
+        print("Nothing to ingest.")
+        return 0
+    video_tags = load_video_tags(tag_files or [])
+    dim = np.load(os.path.join(features_path, files[0]), mmap_mode="r").shape[1]
+    prepare_collection(client, collection_name, dim)
+    print(f"Ingesting {len(files)} videos ({len(checkpoint.done)} already done)")
+
+    remaining = {} # Batches of each video not acknowledged yet
+    pending = {} # Upsert future -> videos in its batch
+    points = 0
+    start_time = time.time()
+
+    def collect(done_futures) -> None:
+        nonlocal points
+        for future in done_futures:
+            origins, size = pending.pop(future)
+            future.result()
+            points += size
+            for origin in origins:
+                remaining[origin] -= 1
+                if remaining[origin] == 0:
+                    del remaining[origin]
+                    checkpoint.add(origin)
+        print(f"\r{points} points, {points / max(time.time() - start_time, 1e-9):.0f} points/s", end="", flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as readers, ThreadPoolExecutor(max_workers=max_in_flight) as writers:
+        def submit(vectors, ids, payloads, origins) -> None:
+            while len(pending) >= max_in_flight:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            batch = models.Batch(ids=ids, vectors=np.concatenate(vectors).tolist(), payloads=payloads)
+            future = writers.submit(client.upsert, collection_name=collection_name, points=batch, wait=True)
+            pending[future] = (origins, len(ids))
+
+        def read_videos():
+            """Videos in file order, with at most `read_ahead` read or being read ahead of the consumer."""
+            read_ahead = max(max_in_flight, workers or os.cpu_count() or 1)
+            reads = deque()
+            for file in files:
+                if len(reads) >= read_ahead:
+                    yield reads.popleft().result()
+                reads.append(readers.submit(read_video, features_path, map_keyframes_path, file, video_tags.get(file[:-4])))
+            while reads:
+                yield reads.popleft().result()
+
+        vectors, ids, payloads, origins = [], [], [], []
+        for video in read_videos():
+            if video is None:
+                continue
+            origin, feature, video_ids, video_payloads = video
+            if feature.shape[1] != dim:
+                print(f"\nFile {origin}.npy does not have {dim} features, skipping")
+                continue
+            start = 0
+            while start < len(video_ids):
+                take = min(batch_size - len(ids), len(video_ids) - start)
+                vectors.append(feature[start:start + take])
+                ids.extend(video_ids[start:start + take])
+                payloads.extend(video_payloads[start:start + take])
+                origins.append(origin)
+                # Counted before the batch is sent, so a video is never done while some of it is unsent
+                remaining[origin] = remaining.get(origin, 0) + 1
+                start += take
+                if len(ids) == batch_size:
+                    submit(vectors, ids, payloads, origins)
+                    vectors, ids, payloads, origins = [], [], [], []
+        if ids:
+            submit(vectors, ids, payloads, origins)
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+    print()
+
+    client.update_collection(collection_name=collection_name, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=20000))
+    return points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload CLIP features and keyframe payloads into a Qdrant collection.")
+    parser.add_argument("--collection", default="my_collection")
+    parser.add_argument("--features", default=CLIP_FEATURES_PATH, help="Folder with the per-video .npy feature files")
+    parser.add_argument("--map-keyframes", default=LOCAL_MAP_KEYFRAMES_PATH, help="Folder with the map-keyframes CSV files")
+    parser.add_argument("--packs", nargs="*", help="Only ingest these packs (e.g., L21 L22)")
+    parser.add_argument("--url", default=None, help="Qdrant URL, defaults to QDRANT_URL or a local server")
+    parser.add_argument("--grpc", action="store_true", help="Upload over gRPC")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=None, help="Processes reading feature files")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Upserts pending at once")
+    parser.add_argument("--checkpoint", default=None, help="Progress file, defaults to cache/ingest_<collection>.json")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = QdrantClient(
+        url=args.url or os.getenv("QDRANT_URL", "http://localhost:6333"),
+        api_key=os.getenv("QDRANT_TOKEN_WRITE"),
+        prefer_grpc=args.grpc,
+        timeout=60,
+    )
+    start_time = time.time()
+    points = ingest(client, args.collection, args.features, args.map_keyframes, args.packs, None, VIDEO_TAGS_PATHS, args.batch_size, args.workers, args.max_in_flight, args.checkpoint)
+    elapsed = time.time() - start_time
+    print(f"Uploaded {points} points in {elapsed:.1f}s ({points / max(elapsed, 1e-9):.0f} points/s)")
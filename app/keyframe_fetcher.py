@@ -0,0 +1,174 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class KeyframeFetcher:
+    """
+    Read-through local cache of remote keyframe images, filled concurrently over pooled connections.
+
+    Images are stored once per content as `cache_dir/objects/<sha256[:2]>/<sha256>.jpg`, and each
+    URL points to its content with a small ref file `cache_dir/refs/<sha1(url)[:2]>/<sha1(url)>`,
+    so identical images behind different URLs share a file. Downloads run in a thread pool over
+    one `requests.Session` whose connection pool is as large as the pool, and a URL being
+    downloaded is never requested twice. Local paths are returned as they are.
+
+    Like `FrameCache`, images are kept in least recently used order (file modification time at
+    start, touched on every hit) and the oldest are deleted once the cache grows past
+    `max_bytes`; a ref whose image was deleted is a miss.
+    """
+
+    def __init__(self, cache_dir: str, max_workers: int = 16, timeout: float = 10.0, retries: int = 2, max_bytes: int = 1 << 30) -> None:
+        """
+        Args:
+            cache_dir (str): Folder of the cache.
+            max_workers (int): Concurrent downloads, also the size of the connection pool.
+            timeout (float): Seconds to wait for a server response.
+            retries (int): Retries of a failed download (connection errors and 5xx responses).
+            max_bytes (int): Size the images are kept under.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=Retry(total=retries, backoff_factor=0.2, status_forcelist=(500, 502, 503, 504)),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="keyframe-fetch")
+        self._lock = threading.Lock()
+        self._in_flight = {} # URL -> download future
+        self.hits = 0
+        self.downloads = 0
+        self.failures = 0
+        self._objects = OrderedDict() # Image path -> size, least recently used first
+        self._size = 0
+        entries = []
+        for root, _, files in os.walk(os.path.join(cache_dir, "objects")):
+            for file in files:
+                if file.endswith(".jpg"):
+                    path = os.path.join(root, file)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime_ns, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._objects[path] = size
+            self._size += size
+
+    @staticmethod
+    def is_remote(path: str) -> bool:
+        return path.startswith(("http://", "https://"))
+
+    def _ref_path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "refs", digest[:2], digest)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest + ".jpg")
+
+    def cached_path(self, url: str) -> str | None:
+        """Local file of an image without downloading it, None if it is not cached."""
+        if not self.is_remote(url):
+            return url
+        try:
+            with open(self._ref_path(url), "r") as f:
+                path = self._object_path(f.read().strip())
+        except OSError:
+            return None
+        with self._lock:
+            if path not in self._objects:
+                return None
+            self._objects.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError: # Deleted behind our back
+            with self._lock:
+                self._size -= self._objects.pop(path, 0)
+            return None
+        return path
+
+    def _add(self, path: str, size: int) -> None:
+        """Record a stored image and delete the least recently used ones past `max_bytes`."""
+        with self._lock:
+            self._size += size - self._objects.pop(path, 0)
+            self._objects[path] = size
+            evicted = []
+            while self._size > self.max_bytes and len(self._objects) > 1:
+                old_path, old_size = self._objects.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _download(self, url: str) -> str | None:
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.content
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                self._write(path, data)
+            self._write(self._ref_path(url), digest.encode("ascii"))
+            self._add(path, len(data))
+            with self._lock:
+                self.downloads += 1
+            return path
+        except (requests.RequestException, OSError):
+            with self._lock:
+                self.failures += 1
+            return None
+        finally:
+            with self._lock:
+                self._in_flight.pop(url, None)
+
+    def _submit(self, url: str) -> Future | None:
+        """Download future of an uncached URL (an existing one if it is in flight), None if cached."""
+        if self.cached_path(url) is not None:
+            with self._lock:
+                self.hits += 1
+            return None
+        with self._lock:
+            future = self._in_flight.get(url)
+            if future is None:
+                future = self._executor.submit(self._download, url)
+                self._in_flight[url] = future
+            return future
+
+    def prefetch(self, urls: list[str]) -> int:
+        """Start downloading every uncached URL in the background, returns how many were started or in flight."""
+        return sum(self._submit(url) is not None for url in dict.fromkeys(urls) if self.is_remote(url))
+
+    def fetch(self, url: str) -> str | None:
+        """Local file of an image, downloaded (or waited for, if prefetched) when needed; None if it failed."""
+        if not self.is_remote(url):
+            return url
+        future = self._submit(url)
+        return self.cached_path(url) if future is None else future.result()
+
+    def fetch_many(self, urls: list[str]) -> list[str | None]:
+        """Local files of several images, downloaded concurrently."""
+        futures = {url: self._submit(url) for url in dict.fromkeys(urls) if self.is_remote(url)}
+        paths = {url: self.cached_path(url) if future is None else future.result() for url, future in futures.items()}
+        return [paths.get(url, url) if self.is_remote(url) else url for url in urls]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "downloads": self.downloads, "failures": self.failures, "in_flight": len(self._in_flight), "images": len(self._objects), "bytes": self._size}
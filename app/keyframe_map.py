@@ -0,0 +1,156 @@
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+
+class KeyframeMap:
+    """
+    Every map-keyframes CSV compiled into typed column arrays.
+
+    Row `offsets[v] + n - 1` holds the n-th keyframe of video `origins[v]`: its `pts_time`, the
+    `fps` of the video and its `frame_idx`. Frame indices are ascending within a video, as in
+    the CSVs. Lookups take arrays of (video, n) or (video, frame index) and never touch the disk.
+    """
+
+    def __init__(self, origins: list[str], offsets: np.ndarray, pts_time: np.ndarray, fps: np.ndarray, frame_idx: np.ndarray) -> None:
+        self.origins = [str(origin) for origin in origins]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.pts_time = pts_time
+        self.fps = fps
+        self.frame_idx = frame_idx
+        self._lookup = {origin: i for i, origin in enumerate(self.origins)}
+        self._video_codes = np.repeat(np.arange(len(self.origins), dtype=np.int64), np.diff(self.offsets))
+        self._stride = int(frame_idx.max()) + 1 if len(frame_idx) else 1
+        self._sorted_keys = self._video_codes * self._stride + frame_idx # Ascending: videos in order, frames ascending
+
+    @classmethod
+    def from_folder(cls, map_keyframes_path: str) -> "KeyframeMap":
+        """Compile every CSV of a map-keyframes folder."""
+        files = sorted(f for f in os.listdir(map_keyframes_path) if f.endswith(".csv"))
+        origins, pts_time, fps, frame_idx = [], [], [], []
+        for file in files:
+            df = pd.read_csv(os.path.join(map_keyframes_path, file))
+            origins.append(file[:-4])
+            pts_time.append(df["pts_time"].to_numpy(dtype=np.float64))
+            fps.append(df["fps"].to_numpy(dtype=np.float32))
+            frame_idx.append(df["frame_idx"].to_numpy(dtype=np.int64))
+        offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(x) for x in frame_idx])
+        return cls(
+            origins,
+            offsets,
+            np.concatenate(pts_time) if pts_time else np.zeros(0, dtype=np.float64),
+            np.concatenate(fps) if fps else np.zeros(0, dtype=np.float32),
+            np.concatenate(frame_idx) if frame_idx else np.zeros(0, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, file: str) -> "KeyframeMap":
+        with np.load(file) as data:
+            return cls(data["origins"].tolist(), data["offsets"], data["pts_time"], data["fps"], data["frame_idx"])
+
+    def save(self, file: str) -> None:
+        np.savez(file, origins=np.asarray(self.origins, dtype="U16"), offsets=self.offsets, pts_time=self.pts_time, fps=self.fps, frame_idx=self.frame_idx)
+
+    def __contains__(self, origin: str) -> bool:
+        return origin in self._lookup
+
+    def keyframe_count(self, origin: str) -> int:
+        code = self._lookup.get(origin)
+        if code is None:
+            return 0
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+    def _codes(self, origins) -> np.ndarray:
+        origins = np.atleast_1d(np.asarray(origins))
+        unique, inverse = np.unique(origins, return_inverse=True)
+        return np.asarray([self._lookup.get(str(origin), -1) for origin in unique], dtype=np.int64)[inverse.ravel()]
+
+    def rows(self, origins, frame_ns) -> np.ndarray:
+        """
+        Rows of the n-th keyframes of videos.
+
+        Args:
+            origins: Video of each lookup (e.g., ['L21_V001', 'L21_V001']), or one video for all.
+            frame_ns: N-th keyframe of each lookup (1-based, as in the CSVs).
+        Returns:
+            np.ndarray: Row of each lookup, -1 where the video or keyframe does not exist.
+        """
+        frame_ns = np.atleast_1d(np.asarray(frame_ns, dtype=np.int64))
+        codes = np.broadcast_to(self._codes(origins), frame_ns.shape) if np.ndim(origins) == 0 else self._codes(origins)
+        safe_codes = np.maximum(codes, 0)
+        starts = self.offsets[safe_codes]
+        counts = self.offsets[safe_codes + 1] - starts
+        valid = (codes >= 0) & (frame_ns >= 1) & (frame_ns <= counts)
+        return np.where(valid, starts + frame_ns - 1, -1)
+
+    def frame_index(self, origins, frame_ns) -> np.ndarray:
+        """Frame index of the n-th keyframes of videos, -1 where they do not exist."""
+        rows = self.rows(origins, frame_ns)
+        return np.where(rows >= 0, self.frame_idx[np.maximum(rows, 0)], -1) if len(self.frame_idx) else np.full(len(rows), -1)
+
+    def timestamp(self, origins, frame_ns) -> np.ndarray:
+        """Timestamp in seconds of the n-th keyframes of videos, NaN where they do not exist."""
+        rows = self.rows(origins, frame_ns)
+        return np.where(rows >= 0, self.pts_time[np.maximum(rows, 0)], np.nan) if len(self.pts_time) else np.full(len(rows), np.nan)
+
+    def nearest_keyframe(self, origins, frame_indices) -> np.ndarray:
+        """
+        N-th keyframe closest to arbitrary frames of videos.
+
+        Args:
+            origins: Video of each lookup, or one video for all.
+            frame_indices: Frame index of each lookup.
+        Returns:
+            np.ndarray: 1-based keyframe n of each lookup, -1 for unknown videos.
+        """
+        frame_indices = np.atleast_1d(np.asarray(frame_indices, dtype=np.int64))
+        if len(self.frame_idx) == 0:
+            return np.full(len(frame_indices), -1)
+        codes = np.broadcast_to(self._codes(origins), frame_indices.shape) if np.ndim(origins) == 0 else self._codes(origins)
+        safe_codes = np.maximum(codes, 0)
+        starts = self.offsets[safe_codes]
+        ends = self.offsets[safe_codes + 1]
+        valid = (codes >= 0) & (ends > starts)
+        keys = safe_codes * self._stride + np.clip(frame_indices, 0, self._stride - 1)
+        position = np.searchsorted(self._sorted_keys, keys)
+        right = np.clip(position, starts, np.maximum(ends - 1, starts))
+        left = np.clip(position - 1, starts, np.maximum(ends - 1, starts))
+        take_left = np.abs(frame_indices - self.frame_idx[left]) <= np.abs(self.frame_idx[right] - frame_indices)
+        nearest = np.where(take_left, left, right)
+        return np.where(valid, nearest - starts + 1, -1)
+
+
+_maps = {}
+
+def get_keyframe_map(map_keyframes_path: str) -> KeyframeMap | None:
+    """
+    Keyframe map of a local map-keyframes folder, loaded once per process.
+
+    Uses the compiled `<folder>.npz` when it exists, otherwise compiles the folder in memory.
+    Returns None for folders that are not local (e.g., a remote URL).
+    """
+    if map_keyframes_path not in _maps:
+        compiled = map_keyframes_path.rstrip("/\\") + ".npz"
+        if os.path.exists(compiled):
+            _maps[map_keyframes_path] = KeyframeMap.load(compiled)
+        elif os.path.isdir(map_keyframes_path):
+            _maps[map_keyframes_path] = KeyframeMap.from_folder(map_keyframes_path)
+        else:
+            _maps[map_keyframes_path] = None
+    return _maps[map_keyframes_path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a map-keyframes folder into one columnar .npz file.")
+    parser.add_argument("--map-keyframes", required=True, help="Folder with the map-keyframes CSV files")
+    parser.add_argument("--out", help="Output file, defaults to <folder>.npz")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    keyframe_map = KeyframeMap.from_folder(args.map_keyframes)
+    out = args.out or args.map_keyframes.rstrip("/\\") + ".npz"
+    keyframe_map.save(out)
+    print(f"Compiled {len(keyframe_map.frame_idx)} keyframes of {len(keyframe_map.origins)} videos into {out} in {time.time() - start_time:.1f}s")
@@ -0,0 +1,492 @@
+import os
+import json
+import threading
+import numpy as np
+from qdrant_client.http import models
+from feature_store import FeatureStore, META_FILE
+from filters import FilterCompiler
+from temporal import match_events, frame_times
+
+HNSW_MIN_FILTERED_FRACTION = 0.2
+GATHER_MAX_FRACTION = 0.3 # Filters keeping fewer rows have them gathered, broader ones are scored in place
+SCORE_CHUNK_ROWS = 65536
+
+
+def frame_file_name(frame_n: int) -> str:
+    """Name of the n-th keyframe image (e.g., 1 -> '001.jpg')."""
+    return f"{frame_n:03d}.jpg"
+
+def load_video_tags(tag_files: list[str]) -> dict[str, list[str]]:
+    """
+    Merge per-pack tag files (e.g., L25_video_tags.json) into one mapping.
+
+    Args:
+        tag_files (list[str]): Paths to the tag files.
+    Returns:
+        dict[str, list[str]]: Tags of each video, keyed by origin (e.g., 'L25_V001').
+    """
+    tags = {}
+    for file in tag_files:
+        if not os.path.exists(file):
+            continue
+        with open(file, "r", encoding="utf-8") as f:
+            tags.update(json.load(f))
+    return tags
+
+
+class LocalCollection:
+    """
+    Search view over the keyframe vectors of one collection.
+
+    Row i of `vectors` is one keyframe; the payload columns (`video_codes`, `frame_n`,
+    `frame_index`) are parallel arrays, and per-video data is stored once in `origins`/`tags`.
+    """
+
+    def __init__(self, store: FeatureStore, video_tags: dict[str, list[str]] | None = None) -> None:
+        video_tags = video_tags or {}
+        self.store = store
+        self.vectors = store.vectors # L2-normalized, cosine similarity is a plain dot product
+        self.video_codes = store.video_codes
+        self.frame_n = store.frame_n
+        self.frame_index = store.frame_index
+        self.origins = store.origins
+        self.packs = store.packs
+        self.videos = store.videos
+        self.tags = [video_tags.get(origin, []) for origin in self.origins]
+        self.quantized = None
+        self.hnsw = None
+        self.filter_compiler = FilterCompiler(self.origins, self.video_codes, self.tags)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def payload(self, row: int) -> dict:
+        """Build the same payload the Qdrant collection stores for a keyframe."""
+        code = self.video_codes[row]
+        payload = {
+            "pack": self.packs[code],
+            "video": self.videos[code],
+            "frame_index": int(self.frame_index[row]),
+            "frame": frame_file_name(int(self.frame_n[row])),
+            "origin": self.origins[code],
+        }
+        if self.tags[code]:
+            payload["tags"] = self.tags[code]
+        return payload
+
+    def filter_mask(self, query_filter: models.Filter | None, row_mask: np.ndarray | None = None) -> np.ndarray | None:
+        """
+        Evaluate a Qdrant filter over every row.
+
+        Args:
+            query_filter (models.Filter | None): Filter built for the Qdrant backend.
+            row_mask (np.ndarray | None): Precomputed boolean mask over rows to AND with the filter.
+                Rows past its end (e.g., videos appended after it was built) do not match.
+        Returns:
+            np.ndarray | None: Boolean mask of matching rows, or None when everything matches.
+        """
+        mask = None
+        if query_filter is not None and (query_filter.must or query_filter.should or query_filter.must_not):
+            mask = self._filter_mask(query_filter)
+        if row_mask is not None:
+            padded = np.zeros(len(self), dtype=bool)
+            padded[:min(len(row_mask), len(self))] = row_mask[:len(self)]
+            mask = padded if mask is None else mask & padded
+        return mask
+
+    def _filter_mask(self, query_filter: models.Filter) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for condition in _as_list(query_filter.must):
+            mask &= self._condition_mask(condition)
+        if query_filter.should:
+            any_mask = np.zeros(len(self), dtype=bool)
+            for condition in _as_list(query_filter.should):
+                any_mask |= self._condition_mask(condition)
+            mask &= any_mask
+        for condition in _as_list(query_filter.must_not):
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def _condition_mask(self, condition) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self._filter_mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            mask = np.zeros(len(self), dtype=bool)
+            ids = np.asarray([i for i in condition.has_id if isinstance(i, int) and 0 <= i < len(self)], dtype=np.int64)
+            mask[ids] = True
+            return mask
+        if not isinstance(condition, models.FieldCondition):
+            raise ValueError(f"Unsupported condition for local search: {type(condition).__name__}")
+
+        if condition.key in ("pack", "video", "tags"):
+            # Evaluate once per video, then broadcast to its keyframes
+            if condition.key == "tags":
+                video_mask = np.array([_match_any(tags, condition.match) for tags in self.tags], dtype=bool)
+            else:
+                column = self.packs if condition.key == "pack" else self.videos
+                video_mask = np.array([_match_any([value], condition.match) for value in column], dtype=bool)
+            if len(video_mask) == 0:
+                return np.zeros(len(self), dtype=bool)
+            return video_mask[self.video_codes]
+
+        if condition.key == "frame_index":
+            column = self.frame_index
+        elif condition.key == "frame_n":
+            column = self.frame_n
+        else:
+            raise ValueError(f"Unsupported payload key for local search: {condition.key}")
+        if condition.range is not None:
+            mask = np.ones(len(self), dtype=bool)
+            if condition.range.gt is not None:
+                mask &= column > condition.range.gt
+            if condition.range.gte is not None:
+                mask &= column >= condition.range.gte
+            if condition.range.lt is not None:
+                mask &= column < condition.range.lt
+            if condition.range.lte is not None:
+                mask &= column <= condition.range.lte
+            return mask
+        if isinstance(condition.match, models.MatchValue):
+            return column == condition.match.value
+        if isinstance(condition.match, models.MatchAny):
+            return np.isin(column, condition.match.any)
+        raise ValueError(f"Unsupported match for local search on {condition.key}")
+
+
+def _as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    if isinstance(conditions, list):
+        return conditions
+    return [conditions]
+
+def _match_any(values: list, match) -> bool:
+    if isinstance(match, models.MatchValue):
+        return match.value in values
+    if isinstance(match, models.MatchAny):
+        return any(value in match.any for value in values)
+    if isinstance(match, models.MatchExcept):
+        return any(value not in match.except_ for value in values)
+    raise ValueError(f"Unsupported match for local search: {type(match).__name__}")
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+
+    Uses argpartition so only the selected k elements are fully sorted.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def score_candidates(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray | None = None) -> np.ndarray:
+    """
+    Dot product of every query with every candidate row, as a (queries, candidates) matrix.
+
+    A small candidate set is gathered from `vectors` and scored in one matrix multiply. A large
+    one is not copied out of the memory map: contiguous chunks of rows holding candidates are
+    scored in place and only the candidates' columns are kept.
+
+    Args:
+        vectors (np.ndarray): (rows, dim) matrix, usually memory-mapped.
+        queries (np.ndarray): (queries, dim) matrix.
+        candidates (np.ndarray | None): Ascending rows to score, None for every row.
+    Returns:
+        np.ndarray: Scores, one column per candidate.
+    """
+    if candidates is None:
+        return queries @ vectors.T
+    if len(candidates) <= GATHER_MAX_FRACTION * len(vectors):
+        return queries @ vectors[candidates].T
+    scores = np.empty((len(queries), len(candidates)), dtype=np.float32)
+    for start in range(int(candidates[0]) // SCORE_CHUNK_ROWS * SCORE_CHUNK_ROWS, int(candidates[-1]) + 1, SCORE_CHUNK_ROWS):
+        lo, hi = np.searchsorted(candidates, [start, start + SCORE_CHUNK_ROWS])
+        if lo < hi:
+            scores[:, lo:hi] = (queries @ vectors[start:start + SCORE_CHUNK_ROWS].T)[:, candidates[lo:hi] - start]
+    return scores
+
+def grouped_top_k(codes: np.ndarray, scores: np.ndarray, k: int, m: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Best `m` scores of each of the `k` groups with the highest best score.
+
+    The groups are the first k distinct ones among the top scores, found with argpartition on
+    a candidate set that starts at k * m scores and doubles until it holds k groups; every
+    score left out is below them, so no left-out group can rank higher. Only the members of
+    those k groups are then sorted to take their best m.
+
+    Args:
+        codes (np.ndarray): Group of each score (e.g., video codes).
+        scores (np.ndarray): Scores to select from.
+        k (int): Number of groups.
+        m (int): Members per group.
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Indices of the selected scores, best group first and best
+            score first within a group, and the offsets of each group in them.
+    """
+    n = len(scores)
+    if n == 0 or k <= 0 or m <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    size = min(k * m, n)
+    while True:
+        candidate_codes = codes[top_k(scores, size)]
+        _, first = np.unique(candidate_codes, return_index=True)
+        if len(first) >= k or size == n:
+            break
+        size = min(size * 2, n)
+    groups = candidate_codes[np.sort(first)][:k]
+
+    # Members of the selected groups, by group rank then descending score
+    group_rank = np.full(int(codes.max()) + 1, -1, dtype=np.int64)
+    group_rank[groups] = np.arange(len(groups))
+    members = np.flatnonzero(group_rank[codes] >= 0)
+    member_groups = group_rank[codes[members]]
+    order = np.lexsort((-scores[members], member_groups))
+    members, member_groups = members[order], member_groups[order]
+    starts = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(member_groups, minlength=len(groups)), out=starts[1:])
+    keep = np.arange(len(members)) - starts[member_groups] < m
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum(np.minimum(np.diff(starts), m), out=offsets[1:])
+    return members[keep], offsets
+
+
+class LocalSearchEngine:
+    """
+    In-process replacement for the subset of `QdrantClient` used by the app.
+
+    Collections are opened lazily from their feature store the first time they are queried,
+    and answer `search`, `query_points_groups`, `scroll`, `query_batch_points`, `count` and `get_collection` with the
+    same result models as Qdrant.
+    """
+
+    def __init__(self, collections: dict[str, dict[str, str]], tag_files: list[str] | None = None, quantization: str | None = None, rescore_factor: int = 4, index: str | None = None, ef_search: int | None = None) -> None:
+        """
+        Args:
+            collections (dict[str, dict[str, str]]): Collection name -> folders of its 'features',
+                'map_keyframes' and packed feature 'store'. The store is memory-mapped when it has
+                been built, otherwise the per-video features are loaded into memory.
+            tag_files (list[str] | None): Per-pack video tag files used for the 'tags' payload.
+            quantization (str | None): 'int8' or 'binary' to rank by quantized codes first and
+                re-score the best `rescore_factor * limit` candidates exactly. None scores exactly.
+            rescore_factor (int): Candidates re-scored exactly per requested result.
+            index (str | None): 'hnsw' to search the HNSW graph saved next to the feature store.
+                Collections without a saved graph, or whose graph lacks rows of the store, are
+                searched by brute force.
+            ef_search (int | None): HNSW candidate list size, defaults to the value it was built with.
+        """
+        self.collections = collections
+        self.tag_files = tag_files or []
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.index = index
+        self.ef_search = ef_search
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, collection_name: str) -> LocalCollection:
+        if collection_name not in self.collections:
+            raise ValueError(f"Collection {collection_name} does not exist")
+        with self._lock:
+            if collection_name not in self._loaded:
+                paths = self.collections[collection_name]
+                if os.path.exists(os.path.join(paths["store"], META_FILE)):
+                    store = FeatureStore.open(paths["store"])
+                else:
+                    store = FeatureStore.from_folders(paths["features"], paths["map_keyframes"])
+                collection = LocalCollection(store, load_video_tags(self.tag_files))
+                if self.quantization:
+                    from quantization import QuantizedIndex
+                    collection.quantized = QuantizedIndex.load(paths["store"], store.vectors, self.quantization, self.rescore_factor)
+                    if collection.quantized is None:
+                        collection.quantized = QuantizedIndex.build(store.vectors, self.quantization, self.rescore_factor)
+                if self.index == "hnsw":
+                    from hnsw import HNSWIndex
+                    collection.hnsw = HNSWIndex.load(paths["store"], store.vectors, self.ef_search)
+                    if collection.hnsw is not None and len(collection.hnsw) < len(store):
+                        # Rows missing from the graph could never be returned
+                        print(f"HNSW index of {collection_name} is missing {len(store) - len(collection.hnsw)} rows, searching by brute force until app/hnsw.py extends it")
+                        collection.hnsw = None
+                self._loaded[collection_name] = collection
+            return self._loaded[collection_name]
+
+    def filter_compiler(self, collection_name: str) -> FilterCompiler:
+        """Filter compiler over the rows of a collection, shared by every query and session."""
+        return self._collection(collection_name).filter_compiler
+
+    def _scored_points(self, collection: LocalCollection, rows: np.ndarray, scores: np.ndarray, with_payload: bool, with_vectors: bool) -> list[models.ScoredPoint]:
+        return [
+            models.ScoredPoint(
+                id=int(row),
+                version=0,
+                score=float(score),
+                payload=collection.payload(row) if with_payload else None,
+                vector=collection.vectors[row].tolist() if with_vectors else None,
+            )
+            for row, score in zip(rows, scores)
+        ]
+
+    def _search_rows(self, collection: LocalCollection, query_vectors, query_filter: models.Filter | None, limits: list[int], offsets: list[int], score_thresholds: list[float | None], row_mask: np.ndarray | None = None) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Top rows and scores of each query vector (one per row of `query_vectors`) under one filter."""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+        mask = collection.filter_mask(query_filter, row_mask)
+        candidates = None if mask is None else np.flatnonzero(mask)
+        # A graph search over a selective filter would visit most of the graph for few results
+        use_hnsw = collection.hnsw is not None and (candidates is None or len(candidates) > HNSW_MIN_FILTERED_FRACTION * len(collection))
+        if not use_hnsw and collection.quantized is None:
+            # One matrix multiply scores every query against the candidates
+            score_matrix = score_candidates(collection.vectors, queries, candidates)
+        results = []
+        for i, (limit, offset, score_threshold) in enumerate(zip(limits, offsets, score_thresholds)):
+            if use_hnsw:
+                rows, top_scores = collection.hnsw.search(queries[i], offset + limit, allowed=mask)
+                rows, top_scores = rows[offset:], top_scores[offset:]
+            elif collection.quantized is not None:
+                rows, top_scores = collection.quantized.search(queries[i], offset + limit, candidates)
+                rows, top_scores = rows[offset:], top_scores[offset:]
+            else:
+                scores = score_matrix[i]
+                order = top_k(scores, offset + limit)[offset:]
+                rows = order if candidates is None else candidates[order]
+                top_scores = scores[order]
+            if score_threshold is not None:
+                keep = top_scores >= score_threshold
+                rows, top_scores = rows[keep], top_scores[keep]
+            results.append((rows, top_scores))
+        return results
+
+    def search(self, collection_name: str, query_vector, limit: int = 10, query_filter: models.Filter | None = None, offset: int = 0, with_payload: bool = True, with_vectors: bool = False, score_threshold: float | None = None, row_mask: np.ndarray | None = None, **kwargs) -> list[models.ScoredPoint]:
+        """
+        Cosine similarity search, same signature and result as `QdrantClient.search`.
+
+        `row_mask` is a local-only pre-filter: a boolean mask over the collection rows.
+        """
+        collection = self._collection(collection_name)
+        [(rows, scores)] = self._search_rows(collection, query_vector, query_filter, [limit], [offset or 0], [score_threshold], row_mask)
+        return self._scored_points(collection, rows, scores, with_payload, with_vectors)
+
+    def query_batch_points(self, collection_name: str, requests: list[models.QueryRequest], row_mask: np.ndarray | None = None, **kwargs) -> list[models.QueryResponse]:
+        """
+        Run several nearest-neighbour queries, same result as `QdrantClient.query_batch_points`.
+
+        Requests sharing a filter are scored together, so the filter is compiled once and the
+        exact backend scores them in a single matrix multiply.
+        """
+        collection = self._collection(collection_name)
+        groups = [] # (filter, request positions)
+        for i, request in enumerate(requests):
+            for query_filter, positions in groups:
+                if query_filter == request.filter:
+                    positions.append(i)
+                    break
+            else:
+                groups.append((request.filter, [i]))
+
+        responses = [None] * len(requests)
+        for query_filter, positions in groups:
+            batch = [requests[i] for i in positions]
+            results = self._search_rows(
+                collection,
+                [request.query for request in batch],
+                query_filter,
+                [request.limit or 10 for request in batch],
+                [request.offset or 0 for request in batch],
+                [request.score_threshold for request in batch],
+                row_mask,
+            )
+            for i, request, (rows, scores) in zip(positions, batch, results):
+                points = self._scored_points(collection, rows, scores, request.with_payload is not False, bool(request.with_vector))
+                responses[i] = models.QueryResponse(points=points)
+        return responses
+
+    def score_rows(self, collection_name: str, query_vectors, query_filter: models.Filter | None = None, row_mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Exact cosine score of every keyframe passing a filter, for several queries in one matrix multiply.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Rows passing the filter, and a (queries, rows) score matrix.
+        """
+        collection = self._collection(collection_name)
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+        mask = collection.filter_mask(query_filter, row_mask)
+        rows = np.arange(len(collection)) if mask is None else np.flatnonzero(mask)
+        return rows, score_candidates(collection.vectors, queries, None if mask is None else rows)
+
+    def query_points_groups(self, collection_name: str, query, group_by: str = "origin", query_filter: models.Filter | None = None, limit: int = 10, group_size: int = 1, with_payload: bool = True, with_vectors: bool = False, score_threshold: float | None = None, row_mask: np.ndarray | None = None, **kwargs) -> models.GroupsResult:
+        """
+        Best `group_size` keyframes of the `limit` best videos, same signature and result as
+        `QdrantClient.query_points_groups` with a query vector. Keyframes are always grouped by
+        video (`group_by` is ignored) and scored exactly, whatever the index.
+        """
+        collection = self._collection(collection_name)
+        rows, score_matrix = self.score_rows(collection_name, query, query_filter, row_mask)
+        scores = score_matrix[0]
+        if score_threshold is not None:
+            keep = scores >= score_threshold
+            rows, scores = rows[keep], scores[keep]
+        selected, offsets = grouped_top_k(collection.video_codes[rows], scores, limit, group_size)
+        hits = self._scored_points(collection, rows[selected], scores[selected], with_payload, with_vectors)
+        return models.GroupsResult(groups=[
+            models.PointGroup(id=collection.origins[collection.video_codes[rows[selected[start]]]], hits=hits[start:end])
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        ])
+
+    def match_chains(self, collection_name: str, rows: np.ndarray, event_scores: list[np.ndarray], video_fps, min_gap: float = 0.0, max_gap: float | None = None, limit: int = 100) -> list[tuple[float, list[models.ScoredPoint]]]:
+        """
+        Best ordered chain of keyframes matching a sequence of events, in each video.
+
+        Args:
+            collection_name (str): Collection the rows belong to.
+            rows (np.ndarray): Candidate keyframes, as returned by `score_rows`.
+            event_scores (list[np.ndarray]): Score of every candidate for each event, in event order.
+            video_fps: Function giving the fps of a video (origin), 0 if unknown.
+            min_gap (float): Minimum seconds between consecutive events.
+            max_gap (float | None): Maximum seconds between consecutive events, None for no limit.
+            limit (int): Number of videos to return.
+        Returns:
+            list[tuple[float, list[models.ScoredPoint]]]: (chain score, keyframes of the chain in event order) of the top videos.
+        """
+        collection = self._collection(collection_name)
+        codes = collection.video_codes[rows]
+        fps = np.asarray([video_fps(origin) for origin in collection.origins], dtype=np.float64)
+        times = frame_times(collection.frame_index[rows], fps[codes] if len(fps) else np.zeros(len(rows)))
+        chain_scores, chains = match_events([codes] * len(event_scores), [times] * len(event_scores), list(event_scores), min_gap, max_gap, limit)
+        return [
+            (float(score), self._scored_points(collection, rows[chain], [event_scores[q][i] for q, i in enumerate(chain)], True, False))
+            for score, chain in zip(chain_scores, chains)
+        ]
+
+    def scroll(self, collection_name: str, scroll_filter: models.Filter | None = None, limit: int = 10, offset: int | None = None, with_payload: bool = True, with_vectors: bool = False, row_mask: np.ndarray | None = None, **kwargs) -> tuple[list[models.Record], int | None]:
+        """Page through points in storage order, same result as `QdrantClient.scroll`."""
+        collection = self._collection(collection_name)
+        mask = collection.filter_mask(scroll_filter, row_mask)
+        rows = np.arange(len(collection)) if mask is None else np.flatnonzero(mask)
+        start = np.searchsorted(rows, offset or 0)
+        page = rows[start:start + limit]
+        next_offset = int(rows[start + limit]) if start + limit < len(rows) else None
+        records = [
+            models.Record(
+                id=int(row),
+                payload=collection.payload(row) if with_payload else None,
+                vector=collection.vectors[row].tolist() if with_vectors else None,
+            )
+            for row in page
+        ]
+        return records, next_offset
+
+    def count(self, collection_name: str, count_filter: models.Filter | None = None, exact: bool = True, row_mask: np.ndarray | None = None, **kwargs) -> models.CountResult:
+        collection = self._collection(collection_name)
+        mask = collection.filter_mask(count_filter, row_mask)
+        return models.CountResult(count=len(collection) if mask is None else int(mask.sum()))
+
+    def get_collection(self, collection_name: str) -> dict:
+        collection = self._collection(collection_name)
+        return {"points_count": len(collection), "vectors_count": len(collection), "videos_count": len(collection.origins)}
@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+INDEX_FILE = "objects.npz"
+
+
+def read_video_objects(objects_path: str, origin: str, num_frames: int) -> list[tuple[int, str, float]]:
+    """
+    Read the detections of every keyframe of a video.
+
+    Args:
+        objects_path (str): Folder where object files are stored.
+        origin (str): Name of video.
+        num_frames (int): Number of keyframes of the video.
+    Returns:
+        list[tuple[int, str, float]]: (keyframe n - 1, label, detection score) of every detection.
+    """
+    detections = []
+    for i in range(num_frames):
+        json_path = os.path.join(objects_path, origin, f"{i + 1:03d}.json")
+        if not os.path.exists(json_path):
+            continue
+        try:
+            with open(json_path, "r") as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Skipping corrupted JSON file: {json_path}")
+            continue
+        for label, score in zip(data.get("detection_class_entities", []), data.get("detection_scores", [])):
+            detections.append((i, label, float(score))) # Scores are stored as strings
+    return detections
+
+def build_object_index(objects_path: str, origins: list[str], offsets: np.ndarray, labels: list[str], workers: int | None = None) -> "ObjectIndex":
+    """
+    Build label -> keyframe posting lists over a keyframe row space.
+
+    Args:
+        objects_path (str): Folder where object files are stored.
+        origins (list[str]): Videos of the row space, in row order (e.g., FeatureStore.origins).
+        offsets (np.ndarray): Row offset of each video, length len(origins) + 1.
+        labels (list[str]): Known labels (all_objects.json); unseen labels are appended.
+        workers (int | None): Processes reading the JSON files.
+    Returns:
+        ObjectIndex: The index.
+    """
+    label_ids = {label: i for i, label in enumerate(labels)}
+    labels = list(labels)
+    label_column, row_column, score_column = [], [], []
+    counts = np.diff(offsets)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(read_video_objects, [objects_path] * len(origins), origins, counts.tolist(), chunksize=8)
+        for start, detections in zip(offsets[:-1].tolist(), results):
+            for i, label, score in detections:
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+                label_column.append(label_ids[label])
+                row_column.append(start + i)
+                score_column.append(score)
+
+    label_column = np.asarray(label_column, dtype=np.int32)
+    row_column = np.asarray(row_column, dtype=np.uint32)
+    score_column = np.asarray(score_column, dtype=np.float16)
+    order = np.lexsort((row_column, label_column))
+    label_offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    label_offsets[1:] = np.cumsum(np.bincount(label_column, minlength=len(labels)))
+    return ObjectIndex(labels, label_offsets, row_column[order], score_column[order], origins, offsets)
+
+
+class ObjectIndex:
+    """
+    Inverted index from detected object label to the keyframe rows it appears in.
+
+    The posting list of label i is `rows[label_offsets[i]:label_offsets[i + 1]]` (ascending, with
+    the detection score of each entry). Queries turn posting lists into packed row bitmaps, so
+    AND/OR of several labels are bitwise operations over len(rows) / 8 bytes.
+    """
+
+    def __init__(self, labels: list[str], label_offsets: np.ndarray, rows: np.ndarray, scores: np.ndarray, origins: list[str], offsets: np.ndarray) -> None:
+        self.labels = [str(label) for label in labels]
+        self.label_offsets = np.asarray(label_offsets, dtype=np.int64)
+        self.rows = rows
+        self.scores = scores
+        self.origins = [str(origin) for origin in origins]
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.num_rows = int(self.offsets[-1]) if len(self.offsets) else 0
+        self._label_ids = {label: i for i, label in enumerate(self.labels)}
+        self._video_lookup = {origin: i for i, origin in enumerate(self.origins)}
+        self._bitmap = lru_cache(maxsize=256)(self._label_bitmap)
+
+    @classmethod
+    def load(cls, store_dir: str) -> "ObjectIndex | None":
+        """Load the index saved next to a feature store, or None if it has not been built."""
+        path = os.path.join(store_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["labels"].tolist(), data["label_offsets"], data["rows"], data["scores"], data["origins"].tolist(), data["offsets"])
+
+    def save(self, store_dir: str) -> None:
+        np.savez(
+            os.path.join(store_dir, INDEX_FILE),
+            labels=np.asarray(self.labels),
+            label_offsets=self.label_offsets,
+            rows=self.rows,
+            scores=self.scores,
+            origins=np.asarray(self.origins, dtype="U16"),
+            offsets=self.offsets,
+        )
+
+    def _label_bitmap(self, label: str, min_score: float) -> np.ndarray:
+        mask = np.zeros(self.num_rows, dtype=bool)
+        label_id = self._label_ids.get(label)
+        if label_id is not None:
+            start, end = self.label_offsets[label_id], self.label_offsets[label_id + 1]
+            rows = self.rows[start:end]
+            mask[rows[self.scores[start:end] >= min_score]] = True
+        return np.packbits(mask)
+
+    def match(self, labels: list[str], min_score: float = 0.0, match_all: bool = True) -> np.ndarray:
+        """
+        Rows whose keyframe contains the objects.
+
+        Args:
+            labels (list[str]): Object labels to look for.
+            min_score (float): Ignore detections below this confidence.
+            match_all (bool): Require every label (AND) instead of any of them (OR).
+        Returns:
+            np.ndarray: Boolean mask over the rows of the index.
+        """
+        if not labels:
+            return np.ones(self.num_rows, dtype=bool)
+        bitmap = None
+        for label in labels:
+            label_bitmap = self._bitmap(label, float(min_score))
+            if bitmap is None:
+                bitmap = label_bitmap.copy()
+            elif match_all:
+                bitmap &= label_bitmap
+            else:
+                bitmap |= label_bitmap
+        return np.unpackbits(bitmap, count=self.num_rows).astype(bool)
+
+    def remap(self, origins: list[str], offsets: np.ndarray) -> "ObjectIndex":
+        """
+        The same index over another row space (e.g., its feature store after a rebuild or append).
+
+        Videos are matched by origin; the detections of videos missing from the new row space, or
+        whose keyframe count changed, are dropped so none lands on the wrong keyframe.
+
+        Args:
+            origins (list[str]): Videos of the new row space, in row order.
+            offsets (np.ndarray): Row offset of each video, length len(origins) + 1.
+        Returns:
+            ObjectIndex: This index if the row spaces are the same, a remapped copy otherwise.
+        """
+        origins = [str(origin) for origin in origins]
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if origins == self.origins and np.array_equal(offsets, self.offsets):
+            return self
+        lookup = {origin: i for i, origin in enumerate(origins)}
+        shift = np.zeros(len(self.origins), dtype=np.int64)
+        valid = np.zeros(len(self.origins), dtype=bool)
+        for code, origin in enumerate(self.origins):
+            new_code = lookup.get(origin)
+            if new_code is not None and offsets[new_code + 1] - offsets[new_code] == self.offsets[code + 1] - self.offsets[code]:
+                shift[code] = offsets[new_code] - self.offsets[code]
+                valid[code] = True
+        codes = np.searchsorted(self.offsets, self.rows, side="right") - 1
+        keep = valid[codes]
+        rows = (self.rows.astype(np.int64) + shift[codes])[keep]
+        label_column = np.repeat(np.arange(len(self.labels), dtype=np.int32), np.diff(self.label_offsets))[keep]
+        order = np.lexsort((rows, label_column))
+        label_offsets = np.zeros(len(self.labels) + 1, dtype=np.int64)
+        label_offsets[1:] = np.cumsum(np.bincount(label_column, minlength=len(self.labels)))
+        return ObjectIndex(self.labels, label_offsets, rows[order].astype(np.uint32), self.scores[keep][order], origins, offsets)
+
+    def rows_of(self, origins: list[str], frame_ns: list[int]) -> np.ndarray:
+        """Rows of (video, keyframe n) pairs, -1 where the video is not indexed."""
+        codes = np.asarray([self._video_lookup.get(origin, -1) for origin in origins], dtype=np.int64)
+        frame_ns = np.asarray(frame_ns, dtype=np.int64)
+        safe_codes = np.maximum(codes, 0)
+        valid = (codes >= 0) & (frame_ns >= 1) & (frame_ns <= self.offsets[safe_codes + 1] - self.offsets[safe_codes])
+        return np.where(valid, self.offsets[safe_codes] + frame_ns - 1, -1)
+
+
+if __name__ == "__main__":
+    from feature_store import FeatureStore, META_FILE
+
+    parser = argparse.ArgumentParser(description="Build the detected-object inverted index of a feature store.")
+    parser.add_argument("--store", required=True, help="Feature store folder, the index is saved there")
+    parser.add_argument("--objects", default="objects", help="Folder with the per-keyframe object JSON files")
+    parser.add_argument("--labels", default="all_objects.json", help="Known object labels")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store, META_FILE)):
+        raise SystemExit(f"No feature store in {args.store}, build it with app/feature_store.py first")
+    store = FeatureStore.open(args.store)
+    labels = json.load(open(args.labels, "r")) if os.path.exists(args.labels) else []
+    start_time = time.time()
+    index = build_object_index(args.objects, store.origins, store.offsets, labels, args.workers)
+    index.save(args.store)
+    print(f"Indexed {len(index.rows)} detections of {len(index.labels)} labels over {index.num_rows} keyframes in {time.time() - start_time:.1f}s")
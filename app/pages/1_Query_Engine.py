@@ -1,6 +1,4 @@
 import streamlit as st
-import os
-from PATH import METADATA_PATH, FPS_PATH, L28_PATH
 from utils import *
 from state import init_session_state
 
@@ -8,6 +6,7 @@ st.set_page_config(page_title="Query Engine", layout='wide')
 
 model = load_model()
 client = load_client()
+catalog = load_catalog()
 init_session_state()
 load_value("collection_name")
 load_value("file_content")
@@ -100,7 +99,12 @@ with st.sidebar:
         filter_tags = sorted(list(set(filter_tags)))
     
     st.multiselect("Tags", options=filter_tags, key="filter_tags", help="Filter by tags within the selected packs.")
+    st.text_input("Videos", key="filter_video_range", placeholder="e.g., V001-V020", help="Only search videos numbered in this range.")
     st.multiselect("Objects", options=st.session_state.all_objects, key="filter_objects", help="Filter by objects detected in the keyframes.")
+    if st.session_state.filter_objects:
+        cols = st.columns([2, 1])
+        cols[0].slider("Min confidence", min_value=0.0, max_value=1.0, step=0.05, key="filter_objects_score", help="Ignore detections below this score.")
+        cols[1].toggle("Match all", key="filter_objects_all", help="Require every selected object instead of any of them.")
     
     with st.expander(label="Ignore"):
         for item in st.session_state.filter_ignore.copy():
@@ -128,10 +132,18 @@ L28: du lịch văn hóa, tản mạn Mê Kông
 L29: du lịch văn hóa, đôi mắt Mê Kông
 L30: đời sống, lan toả năng lượng tích cực''')
 
+    st.toggle("Group by video", key="group_by_video", help="Return the best keyframes of the best videos instead of the best keyframes overall.")
+    if st.session_state.group_by_video:
+        cols = st.columns(2)
+        cols[0].number_input("Videos", min_value=1, max_value=300, key="group_limit")
+        cols[1].number_input("Per video", min_value=1, max_value=50, key="group_size")
+
     # --- Search Execution ---
     cols = st.columns(2)
     cols[0].button("🔍 Search", on_click=search_query, args=(model, client, st.session_state.collection_name, 300), type="primary", use_container_width=True)
     cols[1].button("Save Log", on_click=save_log, use_container_width=True)
+    cache_stats = load_embedding_cache().stats()
+    st.caption(f"Embedding cache: {cache_stats['memory_hits']} memory hits, {cache_stats['disk_hits']} disk hits, {cache_stats['misses']} misses")
 
     st.divider()
 
@@ -162,94 +174,48 @@ L30: đời sống, lan toả năng lượng tích cực''')
 st.header("Search Results")
 
 # Result controls
-cols = st.columns([2, 1, 1])
+cols = st.columns([2, 1, 1, 1])
 with cols[0]:
     num_of_cols = st.slider("Columns", min_value=2, max_value=15, value=5, step=1)
 with cols[1]:
-    st.toggle("Sort by video", key="sort_by_video")
+    st.toggle("Sort by video", key="sort_by_video", on_change=sort_results, args=(client,), help="Group all the results by video, pages follow the grouped order.")
 with cols[2]:
-    if st.session_state.results:
-        st.write(f"**{len(st.session_state.results)} results**")
-
-# Results display
-if not st.session_state.sort_by_video:
-    if st.session_state.results:
-        cols = st.columns(num_of_cols)
-        for i, hit in enumerate(st.session_state.results):
-            pack = hit.payload.get("pack")
-            video = hit.payload.get("video")
-            frame_index = hit.payload.get("frame_index")
-            frame = hit.payload.get("frame")
-            origin = pack + '_' + video
-            metadata = get_video_metadata(METADATA_PATH, origin, ["watch_url"])
-            start_time = get_frame_start_time(FPS_PATH, origin, frame_index)
-            frame_path = os.path.join(st.session_state.available_frames_path[st.session_state.collection_name], origin, frame)
-            if pack == "L28":
-                video_data = os.path.join(L28_PATH, origin + ".mp4")
-            else:
-                video_data = get_frame_url(FPS_PATH, origin, metadata)
-
-            with cols[i % num_of_cols]:
-                st.image(frame_path, use_container_width=True)
-                st.caption(f"{origin} - {start_time:.2f}s")
-                if st.button("Details", key=f"image_{i}", use_container_width=True):
-                    show_details(
-                        origin=origin,
-                        frame_index=frame_index,
-                        frame=frame,
-                        data=video_data,
-                        frame_path=frame_path,
-                        start_time=start_time,
-                        fps_file=FPS_PATH,
-                        video_name=origin,
-                    )
-    else:
-        st.info("No results to display. Run a search to see results here.")
+    st.selectbox("Per page", options=[25, 50, 100, 300], key="page_size", help="Results fetched and shown at a time, applies to the next search.")
+with cols[3]:
+    if len(st.session_state.results):
+        first = st.session_state.page * st.session_state.search["request"]["page_size"]
+        st.write(f"**Results {first + 1}-{first + len(st.session_state.results)}**")
+
+# Pages are fetched on demand, the next one is prefetched in the background
+search = st.session_state.search
+if search is not None and (st.session_state.page > 0 or search["last_page"] != 0):
+    cols = st.columns([1, 1, 6])
+    cols[0].button("Previous", on_click=load_page, args=(client, st.session_state.page - 1), disabled=st.session_state.page == 0, use_container_width=True)
+    cols[1].button("Next", on_click=load_page, args=(client, st.session_state.page + 1), disabled=search["last_page"] == st.session_state.page, use_container_width=True)
+    cols[2].write(f"Page {st.session_state.page + 1}")
+    if search["request"]["hits"] is not None:
+        st.caption("Grouped, object-filtered and video-sorted searches are fetched whole, then split into pages.")
+
+# Results display, from the result set built by the search
+results = st.session_state.results
+if not len(results):
+    st.info("No results to display. Run a search to see results here.")
+elif not st.session_state.sort_by_video:
+    cols = st.columns(num_of_cols)
+    for row in range(len(results)):
+        with cols[row % num_of_cols]:
+            st.image(render_image(results, row, num_of_cols), use_container_width=True)
+            st.caption(f"{results.origin(row)} - {results.start_time[row]:.2f}s")
+            if st.button("Details", key=f"image_{row}", use_container_width=True):
+                show_result_details(results, row)
 else:
-    if st.session_state.results:
-        for i, candidate in enumerate(st.session_state.origin_rank):
-            video_hits = []
-            for hit in st.session_state.results_sorted:
-                pack = hit.payload.get("pack")
-                video = hit.payload.get("video")
-                origin = pack + '_' + video
-                if not video_hits and origin == candidate:
-                    video_hits.append(hit)
-                elif video_hits:
-                    if origin == candidate:
-                        video_hits.append(hit)
-                    else:
-                        break
-            st.subheader(f"{i + 1}. {candidate}")
-            cols = st.columns(num_of_cols)
-            for j, hit in enumerate(video_hits):
-                pack = hit.payload.get("pack")
-                video = hit.payload.get("video")
-                frame = hit.payload.get("frame")
-                frame_index = hit.payload.get("frame_index")
-                origin = pack + '_' + video
-                metadata = get_video_metadata(METADATA_PATH, origin, ["watch_url"])
-                start_time = get_frame_start_time(FPS_PATH, origin, frame_index)
-                frame_path = os.path.join(st.session_state.available_frames_path[st.session_state.collection_name], origin, frame)
-                if hit.payload.get("pack") == "L28":
-                    video_data = os.path.join(L28_PATH, origin + ".mp4")
-                else:
-                    video_data = get_frame_url(FPS_PATH, origin, metadata)
-
-                with cols[j % num_of_cols]:
-                    st.image(frame_path, use_container_width=True)
-                    st.caption(f"{start_time:.2f}s")
-                    if st.button("Details", key=f"image_{candidate}_{j}", use_container_width=True):
-                        show_details(
-                            origin=origin,
-                            frame_index=frame_index,
-                            frame=frame,
-                            data=video_data,
-                            frame_path=frame_path,
-                            start_time=start_time,
-                            fps_file=FPS_PATH,
-                            video_name=origin,
-                        )
-            st.divider()
-    else:
-        st.info("No results to display. Run a search to see results here.")
\ No newline at end of file
+    for i, candidate in enumerate(results.origins):
+        st.subheader(f"{i + 1}. {candidate}")
+        cols = st.columns(num_of_cols)
+        for j, row in enumerate(results.group(i).tolist()):
+            with cols[j % num_of_cols]:
+                st.image(render_image(results, row, num_of_cols), use_container_width=True)
+                st.caption(f"{results.start_time[row]:.2f}s")
+                if st.button("Details", key=f"image_{candidate}_{j}", use_container_width=True):
+                    show_result_details(results, row)
+        st.divider()
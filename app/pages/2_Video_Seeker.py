@@ -3,13 +3,14 @@ import os
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from PATH import METADATA_PATH, FPS_PATH, L28_PATH, KEYFRAMES_PATH
+from PATH import L28_PATH, KEYFRAMES_PATH
 from utils import *
 from state import init_session_state
 
 st.set_page_config(page_title="Video Seeker", layout='wide')
 
 client = load_client()
+catalog = load_catalog()
 init_session_state()
 load_value("collection_name")
 load_value("file_content")
@@ -102,13 +103,22 @@ if st.session_state.seek_pack:
             if st.session_state.seek_pack == "L28":
                 video_data = os.path.join(L28_PATH, origin + ".mp4")
             else:
-                metadata = get_video_metadata(METADATA_PATH, origin, ["watch_url"])
-                video_data = get_frame_url(FPS_PATH, origin, metadata)
+                video_data = catalog.frame_url(origin)
+            # Only generated thumbnails are shown, a whole pack of full-size keyframes is too heavy
+            thumbnail = keyframe_image("my_collection", origin, "001.jpg", None, 10)
+            if thumbnail:
+                st.image(thumbnail, use_container_width=True)
             if st.button(label=origin, key=f"video_{i}", width='content'): 
                 show_details(origin=origin,
                             frame_index=0,
                             frame="001.jpg",
                             data=video_data,
                             frame_path=frame,
-                            fps_file=FPS_PATH,
-                            video_name=origin)
\ No newline at end of file
+                            video_name=origin)
+
+    # One sprite sheet per selected video instead of one image per keyframe
+    for origin in origins if st.session_state.seek_videos else []:
+        sprite = video_sprite("my_collection", origin)
+        if sprite:
+            with st.expander(f"Keyframes of {origin}"):
+                st.image(sprite)
@@ -3,14 +3,18 @@ import os
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from PATH import METADATA_PATH, FPS_PATH, L28_PATH
+from PATH import L28_PATH
 from utils import *
+from extraction import iter_frames
 from state import init_session_state
 import time
 
+FRAME_QUALITY = 90
+
 st.set_page_config(page_title="Frame Extrator", layout='wide')
 st.sidebar.header("Frame Extractor")
 
+catalog = load_catalog()
 init_session_state()
 
 
@@ -56,9 +60,15 @@ with timestamp_container:
         with start_cols[2]:
             end_second = st.number_input(label="Second", min_value=0, key="end_second")
     with cols[2]:
-        st.slider(label="Step", key="step", min_value=5, max_value=30, step=5)
+        st.radio(label="Sampling", options=["Frames", "Seconds"], key="sampling", horizontal=True)
+        if st.session_state.sampling == "Seconds":
+            st.number_input(label="Every (s)", key="every_s", min_value=0.1, value=1.0, step=0.5)
+        else:
+            st.slider(label="Step", key="step", min_value=5, max_value=30, step=5)
+        st.number_input(label="Workers", key="extract_workers", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1, help="Processes decoding segments of windows longer than 30 seconds.")
 
 cols = st.columns(10)
+rendered = False
 if st.button("Extract Frame", key="extract_frame"):
     if not st.session_state.extract_pack:
         st.warning("Please select a pack")
@@ -70,8 +80,7 @@ if st.button("Extract Frame", key="extract_frame"):
             video_data = os.path.join(L28_PATH, origin + ".mp4")
             fromYoutube = False
         else:
-            metadata = get_video_metadata(METADATA_PATH, origin, ["length", "watch_url"])
-            video_data = get_frame_url(FPS_PATH, origin, metadata)
+            video_data = catalog.frame_url(origin)
             fromYoutube = True
 
         start_timestamp_in_s = (start_hour * 3600 + start_minute * 60 + start_second)
@@ -86,10 +95,27 @@ if st.button("Extract Frame", key="extract_frame"):
                 end_timestamp_in_s = start_timestamp_in_s + 1 * 60 + 30 # Extract frame for 1.5 minutes long
 
             start_time = time.time()
-            st.session_state.frames, st.session_state.fps = sample_frames_2(video_data, fromYoutube, start_timestamp_in_s, end_timestamp_in_s, st.session_state.step, 0.5)
+            every_s = st.session_state.every_s if st.session_state.sampling == "Seconds" else None
+            # Frames are shown as soon as they are decoded and kept in session as JPEG bytes
+            st.session_state.frames, st.session_state.frame_indices = [], []
+            stats = {}
+            progress = st.empty()
+            for frame_index, frame in iter_frames(
+                video_data, fromYoutube, start_timestamp_in_s, end_timestamp_in_s, st.session_state.get("step", 5), every_s, 0.5, st.session_state.extract_workers, FRAME_QUALITY, stats,
+                cache=load_frame_cache(), origin=origin, fps=catalog.fps(origin),
+            ):
+                with cols[len(st.session_state.frames) % 10]:
+                    st.image(frame, f"{frame_index + 1}")
+                st.session_state.frames.append(frame)
+                st.session_state.frame_indices.append(frame_index)
+                progress.caption(f"{len(st.session_state.frames)} frames | {time.time() - start_time:.2f}s")
+            rendered = True
             end_time = time.time()
+            st.session_state.fps = stats["fps"]
             st.session_state.start_frame = start_timestamp_in_s * st.session_state.fps
             st.write(f"Process time : {end_time - start_time}")
-for i, frame in enumerate(st.session_state.frames):
-    with cols[i % 10]:
-        st.image(frame, f"{st.session_state.start_frame + i * st.session_state.step + 1}", channels="BGR")
+            st.caption(f"Wall {stats['wall']:.2f}s | Open {stats['open']:.2f}s | Seek {stats['seek']:.2f}s ({stats['seeks']} seeks) | Grab {stats['grab']:.2f}s ({stats['grabbed']} skipped frames) | Decode {stats['decode']:.2f}s ({len(st.session_state.frames) - stats['cached']} frames) | Cached {stats['cached']} frames" + (f" | Missed {stats['missed']} frames" if stats['missed'] else ""))
+if not rendered:
+    for i, (frame, frame_index) in enumerate(zip(st.session_state.frames, st.session_state.frame_indices)):
+        with cols[i % 10]:
+            st.image(frame, f"{frame_index + 1}")
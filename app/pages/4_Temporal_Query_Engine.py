@@ -1,6 +1,4 @@
 import streamlit as st
-import os
-from PATH import METADATA_PATH, FPS_PATH, L28_PATH
 from utils import *
 from state import init_session_state
 
@@ -8,6 +6,7 @@ st.set_page_config(page_title="Query Engine", layout='wide')
 
 model = load_model()
 client = load_client()
+catalog = load_catalog()
 init_session_state()
 load_value("collection_name")
 load_value("file_content")
@@ -89,6 +88,10 @@ with st.sidebar:
     # --- Image Query Input ---
     st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"], key="image_upload")
 
+    cols = st.columns(2)
+    cols[0].number_input("Min gap (s)", min_value=0.0, step=1.0, key="temporal_min_gap", help="Minimum seconds between consecutive events.")
+    cols[1].number_input("Max gap (s)", min_value=0.0, step=5.0, key="temporal_max_gap", help="Maximum seconds between consecutive events, 0 for no limit.")
+
     # --- Filter Section ---
     st.header("Filters")
     st.multiselect("Packs", options=st.session_state.available_packs, key="filter_packs", help="Select video packs to search within.")
@@ -100,6 +103,7 @@ with st.sidebar:
         filter_tags = sorted(list(set(filter_tags)))
     
     st.multiselect("Tags", options=filter_tags, key="filter_tags", help="Filter by tags within the selected packs.")
+    st.text_input("Videos", key="filter_video_range", placeholder="e.g., V001-V020", help="Only search videos numbered in this range.")
     # st.multiselect("Objects", options=st.session_state.all_objects, key="filter_objects", help="Filter by objects detected in the keyframes.")
     
     with st.expander(label="Ignore"):
@@ -132,6 +136,8 @@ L30: đời sống, lan toả năng lượng tích cực''')
     cols = st.columns(2)
     cols[0].button("🔍 Search", on_click=temporal_search_query, args=(model, client, st.session_state.collection_name, 200), type="primary", use_container_width=True)
     cols[1].button("Save Log", on_click=save_log, use_container_width=True)
+    cache_stats = load_embedding_cache().stats()
+    st.caption(f"Embedding cache: {cache_stats['memory_hits']} memory hits, {cache_stats['disk_hits']} disk hits, {cache_stats['misses']} misses")
 
     st.divider()
 
@@ -166,54 +172,21 @@ cols = st.columns([2, 1])
 with cols[0]:
     num_of_cols = st.slider("Columns", min_value=2, max_value=15, value=5, step=1)
 with cols[1]:
-    if st.session_state.results:
+    if len(st.session_state.temporal_results):
         st.write(f"**{len(st.session_state.temporal_results)} results**")
 
 
-if st.session_state.temporal_results:
-    for i, candidate in enumerate(st.session_state.origin_rank):
-        video_hits = []
-        for hit in st.session_state.temporal_results:
-            pack = hit.payload.get("pack")
-            video = hit.payload.get("video")
-            origin = pack + '_' + video
-            if not video_hits and origin == candidate:
-                video_hits.append(hit)
-            elif video_hits:
-                if origin == candidate:
-                    video_hits.append(hit)
-                else:
-                    break
+results = st.session_state.temporal_results
+if len(results):
+    for i, candidate in enumerate(results.origins):
         st.subheader(f"{i + 1}. {candidate}")
         cols = st.columns(num_of_cols)
-        for j, hit in enumerate(video_hits):
-            pack = hit.payload.get("pack")
-            video = hit.payload.get("video")
-            frame = hit.payload.get("frame")
-            frame_index = hit.payload.get("frame_index")
-            origin = pack + '_' + video
-            metadata = get_video_metadata(METADATA_PATH, origin, ["watch_url"])
-            start_time = get_frame_start_time(FPS_PATH, origin, frame_index)
-            frame_path = os.path.join(st.session_state.available_frames_path[st.session_state.collection_name], origin, frame)
-            if hit.payload.get("pack") == "L28":
-                video_data = os.path.join(L28_PATH, origin + ".mp4")
-            else:
-                video_data = get_frame_url(FPS_PATH, origin, metadata)
-
+        for j, row in enumerate(results.group(i).tolist()):
             with cols[j % num_of_cols]:
-                st.image(frame_path, use_container_width=True)
-                st.caption(f"{start_time:.2f}s")
+                st.image(render_image(results, row, num_of_cols), use_container_width=True)
+                st.caption(f"{results.start_time[row]:.2f}s")
                 if st.button("Details", key=f"image_{candidate}_{j}", use_container_width=True):
-                    show_details(
-                        origin=origin,
-                        frame_index=frame_index,
-                        frame=frame,
-                        data=video_data,
-                        frame_path=frame_path,
-                        start_time=start_time,
-                        fps_file=FPS_PATH,
-                        video_name=origin,
-                    )
+                    show_result_details(results, row)
         st.divider()
 else:
-    st.info("No results to display. Run a search to see results here.")
\ No newline at end of file
+    st.info("No results to display. Run a search to see results here.")
@@ -0,0 +1,234 @@
+import os
+import argparse
+import time
+import numpy as np
+from local_engine import top_k
+
+INT8_CODES_FILE = "codes.int8.npy"
+INT8_PARAMS_FILE = "codes.int8.npz"
+BINARY_CODES_FILE = "codes.bin.npy"
+CHUNK_SIZE = 65536
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[x]
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 scalar quantization.
+
+    Each dimension is mapped linearly from its [min, max] over the corpus onto [-128, 127],
+    so a vector takes 1 byte per dimension instead of 4.
+    """
+
+    def __init__(self, low: np.ndarray, scale: np.ndarray) -> None:
+        self.low = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        low = np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        high = np.full(vectors.shape[1], -np.inf, dtype=np.float32)
+        for start in range(0, len(vectors), CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + CHUNK_SIZE], dtype=np.float32)
+            low = np.minimum(low, chunk.min(axis=0))
+            high = np.maximum(high, chunk.max(axis=0))
+        scale = (high - low) / 255.0
+        scale[scale == 0] = 1.0
+        return cls(low, scale)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + CHUNK_SIZE], dtype=np.float32)
+            codes[start:start + CHUNK_SIZE] = np.clip(np.rint((chunk - self.low) / self.scale) - 128, -128, 127)
+        return codes
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products between a query and int8 codes.
+
+        x ~ low + scale * (code + 128), so q.x ~ (q * scale).code + q.low + 128 * sum(q * scale).
+        """
+        weights = query * self.scale
+        offset = float(query @ self.low + 128.0 * weights.sum())
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_SIZE):
+            scores[start:start + CHUNK_SIZE] = codes[start:start + CHUNK_SIZE].astype(np.float32) @ weights
+        return scores + offset
+
+
+def binary_encode(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign of every dimension into bits (512 dims -> 64 bytes per vector)."""
+    codes = np.empty((len(vectors), (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+    for start in range(0, len(vectors), CHUNK_SIZE):
+        codes[start:start + CHUNK_SIZE] = np.packbits(np.asarray(vectors[start:start + CHUNK_SIZE]) > 0, axis=1)
+    return codes
+
+def hamming_scores(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Negated Hamming distance between the sign bits of a query and every code (higher is closer)."""
+    query_bits = np.packbits(query > 0)
+    distances = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), CHUNK_SIZE):
+        distances[start:start + CHUNK_SIZE] = _popcount(codes[start:start + CHUNK_SIZE] ^ query_bits).sum(axis=1, dtype=np.int32)
+    return -distances.astype(np.float32)
+
+
+class QuantizedIndex:
+    """
+    Two-pass search: rank every row by its quantized code, then re-score the best
+    `rescore_factor * k` candidates exactly against the float vectors.
+
+    Only the codes need to stay in memory; the float vectors are read for the candidates only,
+    so they can stay memory-mapped on disk.
+    """
+
+    def __init__(self, vectors: np.ndarray, mode: str, codes: np.ndarray, quantizer: ScalarQuantizer | None = None, rescore_factor: int = 4) -> None:
+        self.vectors = vectors
+        self.mode = mode
+        self.codes = codes
+        self.quantizer = quantizer
+        self.rescore_factor = rescore_factor
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, mode: str, rescore_factor: int = 4) -> "QuantizedIndex":
+        """
+        Args:
+            vectors (np.ndarray): L2-normalized float vectors (e.g., a FeatureStore matrix).
+            mode (str): 'int8' or 'binary'.
+            rescore_factor (int): Candidates re-scored exactly per requested result.
+        """
+        if mode == "int8":
+            quantizer = ScalarQuantizer.fit(vectors)
+            return cls(vectors, mode, quantizer.encode(vectors), quantizer, rescore_factor)
+        if mode == "binary":
+            return cls(vectors, mode, binary_encode(vectors), None, rescore_factor)
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    @classmethod
+    def load(cls, store_dir: str, vectors: np.ndarray, mode: str, rescore_factor: int = 4) -> "QuantizedIndex | None":
+        """
+        Load codes saved next to a feature store, or None if they have not been built.
+
+        Codes missing the last rows of the store (appended after the codes were built) are
+        completed and saved again; codes with more rows than the store belong to another
+        store and are ignored.
+        """
+        if mode == "int8":
+            codes_path = os.path.join(store_dir, INT8_CODES_FILE)
+            params_path = os.path.join(store_dir, INT8_PARAMS_FILE)
+            if not (os.path.exists(codes_path) and os.path.exists(params_path)):
+                return None
+            with np.load(params_path) as params:
+                quantizer = ScalarQuantizer(params["low"], params["scale"])
+        elif mode == "binary":
+            codes_path = os.path.join(store_dir, BINARY_CODES_FILE)
+            if not os.path.exists(codes_path):
+                return None
+            quantizer = None
+        else:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        index = cls(vectors, mode, np.load(codes_path), quantizer, rescore_factor)
+        if len(index.codes) > len(vectors):
+            print(f"{mode} codes in {store_dir} have {len(index.codes)} rows for a store of {len(vectors)}, ignoring them")
+            return None
+        if len(index.codes) < len(vectors):
+            print(f"{mode} codes in {store_dir} are missing {len(vectors) - len(index.codes)} rows, encoding them")
+            index.extend()
+            try:
+                index.save(store_dir)
+            except OSError:
+                pass
+        return index
+
+    def extend(self) -> int:
+        """
+        Encode the rows of `vectors` past the last code, returns how many were added.
+
+        int8 rows keep the quantizer fitted on the original rows; values outside its range are
+        clipped, which only costs precision in the first pass (candidates are re-scored exactly).
+        """
+        missing = self.vectors[len(self.codes):]
+        if len(missing) == 0:
+            return 0
+        codes = self.quantizer.encode(missing) if self.mode == "int8" else binary_encode(missing)
+        self.codes = np.concatenate([self.codes, codes])
+        return len(codes)
+
+    def save(self, store_dir: str) -> None:
+        if self.mode == "int8":
+            np.save(os.path.join(store_dir, INT8_CODES_FILE), self.codes)
+            np.savez(os.path.join(store_dir, INT8_PARAMS_FILE), low=self.quantizer.low, scale=self.quantizer.scale)
+        else:
+            np.save(os.path.join(store_dir, BINARY_CODES_FILE), self.codes)
+
+    def approximate_scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "int8":
+            return self.quantizer.scores(codes, query)
+        return hamming_scores(codes, query)
+
+    def search(self, query: np.ndarray, k: int, rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by exact score among the best quantized candidates.
+
+        Args:
+            query (np.ndarray): L2-normalized query vector.
+            k (int): Number of results.
+            rows (np.ndarray | None): Restrict the search to these rows (e.g., filtered rows).
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Rows and exact scores, best first.
+        """
+        approximate = self.approximate_scores(query, rows)
+        candidates = top_k(approximate, k * self.rescore_factor)
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates = np.sort(candidates) # Sequential reads from the memory map
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        order = top_k(exact, k)
+        return candidates[order], exact[order]
+
+
+def recall_at_k(exact_rows: np.ndarray, approximate_rows: np.ndarray) -> float:
+    """Fraction of the exact top-k rows that the approximate search also returned."""
+    if len(exact_rows) == 0:
+        return 1.0
+    return len(np.intersect1d(exact_rows, approximate_rows)) / len(exact_rows)
+
+def evaluate_recall(index: QuantizedIndex, queries: np.ndarray, k: int) -> float:
+    """Mean recall@k of a quantized index against exact brute-force search."""
+    recalls = []
+    for query in queries:
+        exact_rows = top_k(np.asarray(index.vectors @ query, dtype=np.float32), k)
+        approximate_rows, _ = index.search(query, k)
+        recalls.append(recall_at_k(exact_rows, approximate_rows))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+if __name__ == "__main__":
+    from feature_store import FeatureStore
+
+    parser = argparse.ArgumentParser(description="Build quantized codes for a feature store and report recall@k against exact search.")
+    parser.add_argument("--store", required=True, help="Feature store folder")
+    parser.add_argument("--modes", nargs="+", default=["int8", "binary"], choices=["int8", "binary"])
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50, help="Number of stored vectors used as recall queries")
+    args = parser.parse_args()
+
+    store = FeatureStore.open(args.store)
+    rng = np.random.default_rng(0)
+    queries = np.asarray(store.vectors[rng.choice(len(store), size=min(args.queries, len(store)), replace=False)], dtype=np.float32)
+    for mode in args.modes:
+        start_time = time.time()
+        index = QuantizedIndex.build(store.vectors, mode, args.rescore_factor)
+        index.save(args.store)
+        build_time = time.time() - start_time
+        ratio = store.vectors.nbytes / index.codes.nbytes
+        recall = evaluate_recall(index, queries, args.k)
+        print(f"{mode}: built in {build_time:.1f}s, {index.codes.nbytes / 1e6:.1f} MB ({ratio:.0f}x smaller), recall@{args.k} = {recall:.3f}")
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+from PATH import L28_PATH, THUMBNAILS_PATH
+from catalog import VideoCatalog
+from thumbnails import thumbnail_path, thumbnail_widths
+
+
+class ResultSet:
+    """
+    Results of one search as columns in rank order, grouped by video.
+
+    Rows hold only arrays (video code, frame name, frame index, start time, score, rank and
+    whether thumbnails exist); per-video values (origin, video to play) are stored once per
+    group. Groups are the videos in order of their best row, and `group_rows` lists the rows of
+    each group, by frame index, between `offsets[g]` and `offsets[g + 1]`.
+    """
+
+    def __init__(self, collection_name: str, frames_path: str, origins: list[str], video: np.ndarray, frame: np.ndarray, frame_index: np.ndarray, start_time: np.ndarray, score: np.ndarray, thumbnail: np.ndarray, video_data: list[str], thumbnail_widths: tuple[int, ...] = ()) -> None:
+        self.collection_name = collection_name
+        self.frames_path = frames_path
+        self.origins = origins
+        self.video = video
+        self.frame = frame
+        self.frame_index = frame_index
+        self.start_time = start_time
+        self.score = score
+        self.rank = np.arange(len(video), dtype=np.int32)
+        self.thumbnail = thumbnail
+        self.video_data = video_data
+        self.thumbnail_widths = thumbnail_widths # Pyramid levels of the collection's thumbnails
+        # Rows ordered by (group, frame index), stable so equal frames keep their rank order
+        self.group_rows = np.lexsort((frame_index, video)).astype(np.int32)
+        self.offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(video, minlength=len(origins)), out=self.offsets[1:])
+        self.images = {} # Row -> local copy of its keyframe, filled as rows are rendered
+
+    @classmethod
+    def from_hits(cls, hits: list, collection_name: str, frames_path: str, catalog: VideoCatalog) -> "ResultSet":
+        """
+        Build the result set of a search in one pass over its hits.
+
+        Args:
+            hits (list): Search results (ScoredPoint or Record), best first.
+            collection_name (str): Collection they come from.
+            frames_path (str): Keyframe folder or URL of the collection.
+            catalog (VideoCatalog): Fps and URLs of the videos.
+        Returns:
+            ResultSet: The columns and groups of the hits.
+        """
+        codes = {}
+        video, frame, frame_index, score = [], [], [], []
+        for hit in hits:
+            video.append(codes.setdefault(hit.payload.get("pack") + '_' + hit.payload.get("video"), len(codes)))
+            frame.append(hit.payload.get("frame"))
+            frame_index.append(hit.payload.get("frame_index"))
+            score.append(getattr(hit, "score", None))
+        origins = list(codes)
+        video = np.asarray(video, dtype=np.int32)
+        frame_index = np.asarray(frame_index, dtype=np.int64)
+        fps = np.asarray([catalog.fps(origin) for origin in origins], dtype=np.float64)[video] if len(video) else np.zeros(0)
+        start_time = np.divide(frame_index, fps, out=np.zeros(len(video)), where=fps > 0)
+        thumbnails_path = os.path.join(THUMBNAILS_PATH, collection_name)
+        widths = thumbnail_widths(thumbnails_path)
+        thumbnail = np.asarray([os.path.exists(thumbnail_path(thumbnails_path, min(widths), origins[v], f)) for v, f in zip(video.tolist(), frame)], dtype=bool)
+        video_data = [os.path.join(L28_PATH, origin + ".mp4") if origin[:3] == "L28" else catalog.frame_url(origin) for origin in origins]
+        return cls(
+            collection_name, frames_path, origins, video, np.asarray(frame, dtype=str), frame_index, start_time,
+            np.asarray([np.nan if s is None else s for s in score], dtype=np.float32), thumbnail, video_data, widths,
+        )
+
+    def __len__(self) -> int:
+        return len(self.video)
+
+    def origin(self, row: int) -> str:
+        return self.origins[self.video[row]]
+
+    def frame_path(self, row: int) -> str:
+        return os.path.join(self.frames_path, self.origin(row), str(self.frame[row]))
+
+    def group(self, g: int) -> np.ndarray:
+        """Rows of the g-th video, by frame index."""
+        return self.group_rows[self.offsets[g]:self.offsets[g + 1]]
@@ -1,8 +1,11 @@
 import streamlit as st
-import json
 from PATH import KEYFRAMES_PATH, MY_KEYFRAMES_PATH
+from utils import load_catalog, load_keyframe_map, build_result_set
 
 def init_session_state():
+    catalog = load_catalog()
+    load_keyframe_map() # Compiled once at startup instead of on the first details dialog
+
     if "collections" not in st.session_state:
         st.session_state.collections = ["my_collection", "my_custom_collection"]
 
@@ -21,33 +24,56 @@ def init_session_state():
     if "file_content" not in st.session_state:
         st.session_state.file_content = ""
 
-    if "results" not in st.session_state:
-        st.session_state.results = []
+    # Last search of the Query Engine, fetched and shown a page at a time
+    if "search" not in st.session_state:
+        st.session_state.search = None
+
+    if "page" not in st.session_state:
+        st.session_state.page = 0
+
+    if "page_size" not in st.session_state:
+        st.session_state.page_size = 50
 
-    if "results_sorted" not in st.session_state:
-        st.session_state.results_sorted = []
+    # Grouped search: at most group_size keyframes from each of the group_limit best videos
+    if "group_by_video" not in st.session_state:
+        st.session_state.group_by_video = False
 
-    if "temporal_results" not in st.session_state:
-        st.session_state.temporal_results = []
+    if "group_limit" not in st.session_state:
+        st.session_state.group_limit = 50
+
+    if "group_size" not in st.session_state:
+        st.session_state.group_size = 3
+
+    # Per-event results of the last temporal search, reused while the filters do not change
+    if "temporal_cache" not in st.session_state:
+        st.session_state.temporal_cache = {}
 
     if "video_list" not in st.session_state:
         st.session_state.video_list = []
 
     if "available_tags" not in st.session_state:
-        st.session_state.available_tags = json.load(open("all_tags.json", "r", encoding="utf-8"))
+        st.session_state.available_tags = catalog.pack_tags
 
     if "available_packs" not in st.session_state:
         st.session_state.available_packs = ["L21", "L22", "L23", "L24", "L25", "L26", "L27", "L28", "L29", "L30", "K01", "K02", "K03", "K04", "K05", "K06", "K07", "K08", "K09", "K10", "K11", "K12", "K13", "K14", "K15", "K16", "K17", "K18", "K19", "K20"]
     
     if "available_videos_per_pack" not in st.session_state:
-        st.session_state.available_videos_per_pack = json.load(open("videos_per_pack.json", 'r'))
+        st.session_state.available_videos_per_pack = catalog.videos_per_pack
 
     if "available_frames_path" not in st.session_state:
         st.session_state.available_frames_path = {"my_collection": KEYFRAMES_PATH, "my_custom_collection": MY_KEYFRAMES_PATH}
 
+    # Result sets of the last search of each page, what their grids render
+    for key in ("results", "temporal_results"):
+        if key not in st.session_state:
+            st.session_state[key] = build_result_set([], st.session_state.collection_name)
+
     if "frames" not in st.session_state:
         st.session_state.frames = []
 
+    if "frame_indices" not in st.session_state:
+        st.session_state.frame_indices = []
+
     if "start_frame" not in st.session_state:
         st.session_state.start_frame = 0
 
@@ -56,10 +82,26 @@ def init_session_state():
 
     # Load all object labels
     if "all_objects" not in st.session_state:
-        st.session_state.all_objects = json.load(open("all_objects.json", "r"))
+        st.session_state.all_objects = catalog.all_objects
 
     if "filter_ignore" not in st.session_state:
         st.session_state.filter_ignore = set()
 
+    if "filter_video_range" not in st.session_state:
+        st.session_state.filter_video_range = ""
+
     if "filter_objects" not in st.session_state:
-        st.session_state.filter_objects = []
\ No newline at end of file
+        st.session_state.filter_objects = []
+
+    if "filter_objects_score" not in st.session_state:
+        st.session_state.filter_objects_score = 0.0
+
+    if "filter_objects_all" not in st.session_state:
+        st.session_state.filter_objects_all = True
+
+    # Seconds allowed between consecutive temporal events, 0 max means no limit
+    if "temporal_min_gap" not in st.session_state:
+        st.session_state.temporal_min_gap = 0.0
+
+    if "temporal_max_gap" not in st.session_state:
+        st.session_state.temporal_max_gap = 0.0
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os
+import json
+import argparse
+import time
+import hashlib
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from PATH import CLIP_FEATURES_PATH, LOCAL_MAP_KEYFRAMES_PATH, VIDEO_TAGS_PATHS, CACHE_PATH
+from local_engine import load_video_tags
+from ingest import ingest, point_id, Checkpoint
+
+
+def file_digest(path: str, previous: dict | None = None) -> dict | None:
+    """
+    Hash of a file's content with its size and modification time, None if it does not exist.
+
+    The hash of `previous` (an earlier digest of the same file) is reused when the size and
+    modification time have not changed, so unchanged files are not read again.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime_ns:
+        return previous
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return {"sha1": sha1.hexdigest(), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+def _same(a: dict | None, b: dict | None) -> bool:
+    return (a or {}).get("sha1") == (b or {}).get("sha1")
+
+
+class Manifest:
+    """
+    What a collection was last synced from: the feature file, map-keyframes CSV, keyframe count
+    and tags of every video, and the tag files.
+    """
+
+    def __init__(self, path: str, collection_name: str) -> None:
+        self.path = path
+        self.collection_name = collection_name
+        self.videos = {}
+        self.tag_files = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("collection") == collection_name:
+                self.videos = data.get("videos", {})
+                self.tag_files = data.get("tag_files", {})
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"collection": self.collection_name, "videos": self.videos, "tag_files": self.tag_files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def scan(features_path: str, map_keyframes_path: str, tag_files: list[str], manifest: Manifest, packs: list[str] | None = None) -> tuple[dict, dict]:
+    """Current state of the source files, in the manifest's format (videos, tag files)."""
+    video_tags = load_video_tags(tag_files)
+    videos = {}
+    files = sorted(f for f in os.listdir(features_path) if f.endswith(".npy")) if os.path.exists(features_path) else []
+    for file in files:
+        origin = file[:-4]
+        if packs and origin[:3] not in packs:
+            continue
+        previous = manifest.videos.get(origin, {})
+        features = file_digest(os.path.join(features_path, file), previous.get("features"))
+        rows = previous.get("rows") if features is previous.get("features") else None
+        if rows is None:
+            rows = int(np.load(os.path.join(features_path, file), mmap_mode="r").shape[0])
+        videos[origin] = {
+            "features": features,
+            "map_keyframes": file_digest(os.path.join(map_keyframes_path, origin + ".csv"), previous.get("map_keyframes")),
+            "rows": rows,
+            "tags": sorted(video_tags.get(origin, [])),
+        }
+    tag_digests = {file: file_digest(file, manifest.tag_files.get(file)) for file in tag_files}
+    return videos, tag_digests
+
+def _video_filter(origin: str) -> models.Filter:
+    return models.Filter(must=[
+        models.FieldCondition(key="pack", match=models.MatchValue(value=origin[:3])),
+        models.FieldCondition(key="video", match=models.MatchValue(value=origin[4:])),
+    ])
+
+def sync(client: QdrantClient, collection_name: str, features_path: str, map_keyframes_path: str, tag_files: list[str] | None = None, packs: list[str] | None = None, manifest_path: str | None = None, **ingest_kwargs) -> dict[str, int]:
+    """
+    Bring a collection up to date with the source files, touching only what changed since the last sync.
+
+    Videos whose feature file or map-keyframes CSV changed (or are new) are upserted, keyframes
+    past the new end of a shorter video and videos whose feature file vanished are deleted,
+    and videos whose tags changed get their 'tags' payload patched in place. Videos missing from
+    the manifest have their existing points deleted first, so a collection built with other point
+    IDs (e.g., the sequential ones of qdrant.ipynb) is not left with duplicates.
+
+    Args:
+        client (QdrantClient): Target server.
+        collection_name (str): Collection to update.
+        features_path (str): Folder with the per-video .npy feature files.
+        map_keyframes_path (str): Folder with the map-keyframes CSV files.
+        tag_files (list[str] | None): Per-pack video tag files.
+        packs (list[str] | None): Only sync these packs, other videos of the manifest are left as they are.
+        manifest_path (str | None): Manifest file, defaults to cache/manifest_<collection>.json.
+        **ingest_kwargs: batch_size, workers and max_in_flight of `ingest`.
+    Returns:
+        dict[str, int]: Number of upserted, deleted and retagged videos.
+    """
+    tag_files = tag_files or []
+    manifest = Manifest(manifest_path or os.path.join(CACHE_PATH, f"manifest_{collection_name}.json"), collection_name)
+    videos, tag_digests = scan(features_path, map_keyframes_path, tag_files, manifest, packs)
+    known = {origin: entry for origin, entry in manifest.videos.items() if not packs or origin[:3] in packs}
+
+    changed = {
+        origin for origin, entry in videos.items()
+        if origin not in known or not _same(entry["features"], known[origin]["features"]) or not _same(entry["map_keyframes"], known[origin]["map_keyframes"])
+    }
+    vanished = set(known) - set(videos)
+    # Tags only need comparing when a tag file changed
+    tags_changed = any(not _same(digest, manifest.tag_files.get(file)) for file, digest in tag_digests.items())
+    retagged = {
+        origin for origin, entry in videos.items()
+        if tags_changed and origin in known and origin not in changed and entry["tags"] != known[origin].get("tags", [])
+    }
+
+    if changed:
+        # A resumable run of its own, removed once the sync is recorded in the manifest
+        checkpoint_path = manifest.path[:-5] + ".checkpoint.json"
+        done = Checkpoint(checkpoint_path, collection_name).done
+        unlisted = sorted(origin for origin in changed if origin not in known and origin not in done)
+        if unlisted and client.collection_exists(collection_name):
+            for pack in sorted({origin[:3] for origin in unlisted}):
+                client.delete(collection_name=collection_name, points_selector=models.FilterSelector(filter=models.Filter(must=[
+                    models.FieldCondition(key="pack", match=models.MatchValue(value=pack)),
+                    models.FieldCondition(key="video", match=models.MatchAny(any=[origin[4:] for origin in unlisted if origin[:3] == pack])),
+                ])))
+        ingest(client, collection_name, features_path, map_keyframes_path, origins=changed, tag_files=tag_files, checkpoint_path=checkpoint_path, **ingest_kwargs)
+        shrunk = [(origin, videos[origin]["rows"], known[origin]["rows"]) for origin in changed if origin in known and known[origin]["rows"] > videos[origin]["rows"]]
+        stale_ids = [point_id(origin, n) for origin, rows, old_rows in shrunk for n in range(rows + 1, old_rows + 1)]
+        if stale_ids:
+            client.delete(collection_name=collection_name, points_selector=models.PointIdsList(points=stale_ids))
+    for origin in sorted(vanished):
+        client.delete(collection_name=collection_name, points_selector=models.FilterSelector(filter=_video_filter(origin)))
+    for origin in sorted(retagged):
+        if videos[origin]["tags"]:
+            client.set_payload(collection_name=collection_name, payload={"tags": videos[origin]["tags"]}, points=_video_filter(origin))
+        else:
+            client.delete_payload(collection_name=collection_name, keys=["tags"], points=_video_filter(origin))
+
+    for origin in vanished:
+        del manifest.videos[origin]
+    manifest.videos.update(videos)
+    if not packs: # Tags of other packs were not compared
+        manifest.tag_files.update(tag_digests)
+    manifest.save()
+    if changed and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {"upserted": len(changed), "deleted": len(vanished), "retagged": len(retagged)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a Qdrant collection with the feature, map-keyframes and tag files, uploading only what changed.")
+    parser.add_argument("--collection", default="my_collection")
+    parser.add_argument("--features", default=CLIP_FEATURES_PATH, help="Folder with the per-video .npy feature files")
+    parser.add_argument("--map-keyframes", default=LOCAL_MAP_KEYFRAMES_PATH, help="Folder with the map-keyframes CSV files")
+    parser.add_argument("--packs", nargs="*", help="Only sync these packs (e.g., L21 L22)")
+    parser.add_argument("--manifest", default=None, help="Manifest file, defaults to cache/manifest_<collection>.json")
+    parser.add_argument("--url", default=None, help="Qdrant URL, defaults to QDRANT_URL or a local server")
+    parser.add_argument("--grpc", action="store_true", help="Upload over gRPC")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=None, help="Processes reading feature files")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Upserts pending at once")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = QdrantClient(
+        url=args.url or os.getenv("QDRANT_URL", "http://localhost:6333"),
+        api_key=os.getenv("QDRANT_TOKEN_WRITE"),
+        prefer_grpc=args.grpc,
+        timeout=60,
+    )
+    start_time = time.time()
+    counts = sync(
+        client, args.collection, args.features, args.map_keyframes, VIDEO_TAGS_PATHS, args.packs, args.manifest,
+        batch_size=args.batch_size, workers=args.workers, max_in_flight=args.max_in_flight,
+    )
+    print(f"Upserted {counts['upserted']}, deleted {counts['deleted']} and retagged {counts['retagged']} videos in {time.time() - start_time:.1f}s")
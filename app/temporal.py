@@ -0,0 +1,158 @@
+import numpy as np
+
+DEFAULT_FPS = 25.0 # Used for videos whose fps is unknown, so their keyframes stay ordered
+
+
+class RangeMax:
+    """
+    Sparse table over a fixed array: argmax of any index range in two lookups.
+
+    Level j holds the argmax of every window of 2**j values, so a range [lo, hi) is covered
+    by the two (overlapping) windows of the largest power of two that fits in it.
+    """
+
+    def __init__(self, values: np.ndarray) -> None:
+        self.values = values
+        n = len(values)
+        self.levels = [np.arange(n, dtype=np.int64)]
+        maxima = values
+        width = 1
+        while 2 * width <= n:
+            previous = self.levels[-1]
+            size = n - 2 * width + 1
+            take_left = maxima[:size] >= maxima[width:width + size]
+            self.levels.append(np.where(take_left, previous[:size], previous[width:width + size]))
+            maxima = np.where(take_left, maxima[:size], maxima[width:width + size])
+            width *= 2
+
+    def argmax(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """Index of the largest value in each range [lo, hi), ranges must not be empty."""
+        level = np.floor(np.log2(np.maximum(hi - lo, 1))).astype(np.int64)
+        result = np.empty(len(lo), dtype=np.int64)
+        for j in np.unique(level):
+            selected = level == j
+            left = self.levels[j][lo[selected]]
+            right = self.levels[j][hi[selected] - (1 << int(j))]
+            result[selected] = np.where(self.values[left] >= self.values[right], left, right)
+        return result
+
+
+def match_events(codes: list[np.ndarray], times: list[np.ndarray], scores: list[np.ndarray], min_gap: float = 0.0, max_gap: float | None = None, k: int = 100) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Best ordered chain of keyframes, one per event, in each video.
+
+    A chain picks a candidate of every event in the same video, each strictly later than the
+    previous one and `min_gap` to `max_gap` seconds after it; its score is the sum of the event
+    scores. Event by event, the best chain ending at every candidate is the candidate score plus
+    a range max over the previous event's chains in the allowed time window, which is a
+    contiguous range once candidates are sorted by (video, time).
+
+    Args:
+        codes (list[np.ndarray]): Video of each candidate keyframe, one array per event.
+        times (list[np.ndarray]): Timestamp in seconds of each candidate.
+        scores (list[np.ndarray]): Similarity of each candidate to its event.
+        min_gap (float): Minimum seconds between consecutive events.
+        max_gap (float | None): Maximum seconds between consecutive events, None for no limit.
+        k (int): Number of videos to return.
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Score of the best chain of the top k videos, and the
+            chains as a (videos, events) array of indices into each event's candidates.
+    """
+    num_events = len(codes)
+    if num_events == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros((0, 0), dtype=np.int64)
+    codes = [np.asarray(c, dtype=np.int64) for c in codes]
+    times = [np.asarray(t, dtype=np.float64) for t in times]
+    all_times = np.concatenate(times)
+    t_min = float(all_times.min()) if len(all_times) else 0.0
+    stride = (float(all_times.max()) - t_min if len(all_times) else 0.0) + 1.0
+
+    def keys(c, t):
+        return c * stride + (t - t_min)
+
+    values = np.asarray(scores[0], dtype=np.float64)
+    backs = []
+    for q in range(1, num_events):
+        sorted_keys = keys(codes[q - 1], times[q - 1])
+        if np.all(sorted_keys[1:] >= sorted_keys[:-1]): # Dense candidates are already in (video, time) order
+            order = np.arange(len(sorted_keys))
+        else:
+            order = np.argsort(sorted_keys, kind="stable")
+            sorted_keys = sorted_keys[order]
+        c, t = codes[q], times[q]
+        lower = np.maximum(t - max_gap, t_min) if max_gap is not None else np.full(len(t), t_min)
+        lo = np.searchsorted(sorted_keys, keys(c, lower), side="left")
+        hi = np.minimum(
+            np.searchsorted(sorted_keys, keys(c, t - min_gap), side="right"),
+            np.searchsorted(sorted_keys, keys(c, t), side="left"),
+        )
+        valid = hi > lo
+        best = np.zeros(len(t), dtype=np.int64)
+        if valid.any():
+            best[valid] = RangeMax(values[order]).argmax(lo[valid], hi[valid])
+        back = order[best] if len(order) else best
+        values = np.where(valid, np.asarray(scores[q], dtype=np.float64) + (values[back] if len(values) else 0.0), -np.inf)
+        backs.append(back)
+
+    # Best chain per video, videos ranked by it
+    complete = np.flatnonzero(np.isfinite(values))
+    ranked = complete[np.argsort(-values[complete], kind="stable")]
+    _, first = np.unique(codes[-1][ranked], return_index=True)
+    ends = ranked[np.sort(first)][:k]
+
+    chains = np.empty((len(ends), num_events), dtype=np.int64)
+    chains[:, -1] = ends
+    for q in range(num_events - 1, 0, -1):
+        chains[:, q - 1] = backs[q - 1][chains[:, q]]
+    return values[ends].astype(np.float32), chains
+
+
+def frame_times(frame_index: np.ndarray, fps: np.ndarray) -> np.ndarray:
+    """Timestamp in seconds of frames, given the fps of their video (0 if unknown)."""
+    fps = np.asarray(fps, dtype=np.float64)
+    return np.asarray(frame_index, dtype=np.float64) / np.where(fps > 0, fps, DEFAULT_FPS)
+
+
+def match_points(responses: list, video_fps, min_gap: float = 0.0, max_gap: float | None = None, k: int = 100) -> list[tuple[float, list]]:
+    """
+    Best ordered chains over the hits of a batch search, one response per event.
+
+    Args:
+        responses (list): Result of `query_batch_points`, one `QueryResponse` per event in order.
+        video_fps: Function giving the fps of a video (origin), 0 if unknown.
+        min_gap (float): Minimum seconds between consecutive events.
+        max_gap (float | None): Maximum seconds between consecutive events, None for no limit.
+        k (int): Number of videos to return.
+    Returns:
+        list[tuple[float, list]]: (chain score, hits of the chain in event order) of the top videos.
+    """
+    video_codes = {}
+    codes, times, scores = [], [], []
+    for response in responses:
+        origins = [point.payload.get("pack") + '_' + point.payload.get("video") for point in response.points]
+        codes.append(np.asarray([video_codes.setdefault(origin, len(video_codes)) for origin in origins], dtype=np.int64))
+        times.append(frame_times(
+            [point.payload.get("frame_index") for point in response.points],
+            [video_fps(origin) for origin in origins],
+        ))
+        scores.append(np.asarray([point.score for point in response.points], dtype=np.float64))
+    chain_scores, chains = match_events(codes, times, scores, min_gap, max_gap, k)
+    return [
+        (float(score), [responses[q].points[i] for q, i in enumerate(chain)])
+        for score, chain in zip(chain_scores, chains.tolist())
+    ]
+
+
+def rank_temporal_chains(chains: list[tuple[float, list]]) -> list:
+    """
+    Flatten matched chains into the result list of the temporal page.
+
+    Args:
+        chains (list[tuple[float, list]]): (chain score, hits in event order) of each video, best first.
+    Returns:
+        list: Hits of every chain, video after video.
+    """
+    final_list = []
+    for _, hits in chains:
+        final_list.extend(hits)
+    return final_list
@@ -0,0 +1,178 @@
+import os
+import json
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from PATH import THUMBNAILS_PATH, LOCAL_KEYFRAMES_PATHS
+
+THUMBNAIL_WIDTHS = (320, 160, 80) # Pyramid levels, in pixels
+SPRITE_WIDTH = 80 # Width of a sprite tile
+SPRITE_COLUMNS = 20 # Tiles per sprite row
+QUALITY = 80
+MANIFEST_FILE = "manifest.json" # Pyramid levels of a thumbnails folder, read by the app
+
+
+def thumbnail_path(thumbnails_path: str, width: int, origin: str, frame: str) -> str:
+    """Thumbnail of a keyframe at one pyramid level (e.g., thumbnails/my_collection/160/L21_V001/001.jpg)."""
+    return os.path.join(thumbnails_path, str(width), origin, frame)
+
+def sprite_path(thumbnails_path: str, origin: str) -> str:
+    """Sprite sheet of a video, its layout is in the .json file of the same name."""
+    return os.path.join(thumbnails_path, "sprites", origin + ".jpg")
+
+def thumbnail_widths(thumbnails_path: str) -> tuple[int, ...]:
+    """Pyramid levels a thumbnails folder was built with, THUMBNAIL_WIDTHS if it has no manifest."""
+    try:
+        with open(os.path.join(thumbnails_path, MANIFEST_FILE), "r") as f:
+            return tuple(json.load(f)["widths"])
+    except (OSError, ValueError, KeyError):
+        return THUMBNAIL_WIDTHS
+
+def pick_width(target: float, widths: tuple[int, ...] = THUMBNAIL_WIDTHS) -> int:
+    """Smallest pyramid level at least `target` pixels wide, the largest if none is."""
+    larger = [width for width in widths if width >= target]
+    return min(larger) if larger else max(widths)
+
+def _stale(path: str, source_mtime: float) -> bool:
+    return not os.path.exists(path) or os.path.getmtime(path) < source_mtime
+
+def _write(path: str, image: np.ndarray, quality: int) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode {path}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.tobytes())
+    os.replace(tmp_path, path)
+
+def _resize(image: np.ndarray, width: int) -> np.ndarray:
+    height = max(int(round(image.shape[0] * width / image.shape[1])), 1)
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+def build_video(keyframes_path: str, thumbnails_path: str, origin: str, widths: tuple[int, ...] = THUMBNAIL_WIDTHS, sprite_width: int = SPRITE_WIDTH, columns: int = SPRITE_COLUMNS, quality: int = QUALITY) -> int:
+    """
+    Thumbnails and sprite sheet of one video.
+
+    Each keyframe is shrunk level by level, largest first, so every level is resized from the
+    previous one instead of the full image. Keyframes whose thumbnails are newer than them are
+    skipped, the sprite is rebuilt when any keyframe changed.
+
+    Args:
+        keyframes_path (str): Folder with the per-video keyframe folders.
+        thumbnails_path (str): Output folder.
+        origin (str): Video to process (e.g., 'L21_V001').
+        widths (tuple[int, ...]): Pyramid levels, in pixels.
+        sprite_width (int): Width of a sprite tile.
+        columns (int): Tiles per sprite row.
+        quality (int): JPEG quality.
+    Returns:
+        int: Number of keyframes (re)generated.
+    """
+    video_path = os.path.join(keyframes_path, origin)
+    frames = sorted(f for f in os.listdir(video_path) if f.lower().endswith(".jpg"))
+    if not frames:
+        return 0
+    widths = tuple(sorted(widths, reverse=True))
+    sprite = sprite_path(thumbnails_path, origin)
+    tiles = []
+    generated = 0
+    for frame in frames:
+        source = os.path.join(video_path, frame)
+        source_mtime = os.path.getmtime(source)
+        if any(_stale(thumbnail_path(thumbnails_path, width, origin, frame), source_mtime) for width in widths):
+            image = cv2.imread(source)
+            if image is None:
+                continue
+            level = image
+            for width in widths:
+                level = _resize(level, width) if level.shape[1] > width else level
+                _write(thumbnail_path(thumbnails_path, width, origin, frame), level, quality)
+            generated += 1
+        tiles.append(frame)
+
+    layout = sprite_layout(thumbnails_path, origin)
+    if tiles and (generated or layout is None or layout["frames"] != tiles or layout["tile"][0] != sprite_width or not os.path.exists(sprite)):
+        # Tiles are read back from the closest level instead of decoding the keyframes again
+        source_width = pick_width(sprite_width, widths)
+        images = [cv2.imread(thumbnail_path(thumbnails_path, source_width, origin, frame)) for frame in tiles]
+        tiles = [frame for frame, image in zip(tiles, images) if image is not None] # Missing or corrupt files are left out
+        images = [image for image in images if image is not None]
+        if not images:
+            return generated
+        tile_height = max(int(round(images[0].shape[0] * sprite_width / images[0].shape[1])), 1)
+        rows = (len(images) + columns - 1) // columns
+        sheet = np.zeros((rows * tile_height, min(columns, len(images)) * sprite_width, 3), dtype=np.uint8)
+        for i, image in enumerate(images):
+            tile = cv2.resize(image, (sprite_width, tile_height), interpolation=cv2.INTER_AREA)
+            y, x = (i // columns) * tile_height, (i % columns) * sprite_width
+            sheet[y:y + tile_height, x:x + sprite_width] = tile
+        _write(sprite, sheet, quality)
+        with open(sprite[:-4] + ".json", "w") as f:
+            json.dump({"tile": [sprite_width, tile_height], "columns": columns, "frames": tiles}, f)
+    return generated
+
+def build_thumbnails(keyframes_path: str, thumbnails_path: str, origins: list[str] | None = None, packs: list[str] | None = None, workers: int | None = None, **kwargs) -> int:
+    """
+    Thumbnails and sprite sheets of every video of a keyframe tree, videos processed in parallel.
+
+    Args:
+        keyframes_path (str): Folder with the per-video keyframe folders.
+        thumbnails_path (str): Output folder.
+        origins (list[str] | None): Only these videos.
+        packs (list[str] | None): Only these packs (e.g., ['L21', 'L22']).
+        workers (int | None): Processes, one video at a time each.
+        **kwargs: widths, sprite_width, columns and quality of `build_video`. The widths are
+            saved in the folder's manifest, where the app reads them from.
+    Returns:
+        int: Number of keyframes (re)generated.
+    """
+    videos = sorted(d for d in os.listdir(keyframes_path) if os.path.isdir(os.path.join(keyframes_path, d)))
+    if origins:
+        videos = [origin for origin in videos if origin in origins]
+    if packs:
+        videos = [origin for origin in videos if origin[:3] in packs]
+    os.makedirs(thumbnails_path, exist_ok=True)
+    with open(os.path.join(thumbnails_path, MANIFEST_FILE), "w") as f:
+        json.dump({"widths": sorted(kwargs.get("widths", THUMBNAIL_WIDTHS), reverse=True)}, f)
+    generated = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(build_video, keyframes_path, thumbnails_path, origin, **kwargs) for origin in videos]
+        for i, future in enumerate(futures):
+            generated += future.result()
+            print(f"\r{i + 1}/{len(videos)} videos, {generated} keyframes", end="", flush=True)
+    print()
+    return generated
+
+def sprite_layout(thumbnails_path: str, origin: str) -> dict | None:
+    """Tile size, columns and frame names of a video's sprite sheet, None if it was not generated."""
+    path = sprite_path(thumbnails_path, origin)[:-4] + ".json"
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate keyframe thumbnails and per-video sprite sheets for the result grids.")
+    parser.add_argument("--collection", default="my_collection")
+    parser.add_argument("--keyframes", default=None, help="Local keyframe folder, defaults to the collection's one in PATH.py")
+    parser.add_argument("--out", default=None, help="Output folder, defaults to thumbnails/<collection>")
+    parser.add_argument("--packs", nargs="*", help="Only these packs (e.g., L21 L22)")
+    parser.add_argument("--widths", type=int, nargs="*", default=list(THUMBNAIL_WIDTHS))
+    parser.add_argument("--sprite-width", type=int, default=SPRITE_WIDTH)
+    parser.add_argument("--columns", type=int, default=SPRITE_COLUMNS, help="Tiles per sprite row")
+    parser.add_argument("--quality", type=int, default=QUALITY)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    keyframes_path = args.keyframes or LOCAL_KEYFRAMES_PATHS[args.collection]
+    thumbnails_path = args.out or os.path.join(THUMBNAILS_PATH, args.collection)
+    start_time = time.time()
+    generated = build_thumbnails(
+        keyframes_path, thumbnails_path, packs=args.packs, workers=args.workers,
+        widths=tuple(args.widths), sprite_width=args.sprite_width, columns=args.columns, quality=args.quality,
+    )
+    print(f"Generated thumbnails of {generated} keyframes in {time.time() - start_time:.1f}s")
@@ -3,16 +3,26 @@ import streamlit as st
 import numpy as np
 import os
 import json
-import cv2
-import time
-from cap_from_youtube import cap_from_youtube
 from sentence_transformers import SentenceTransformer
 from qdrant_client.http import models
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
-from PATH import METADATA_PATH
-from collections import Counter
-from collections import defaultdict
+from PATH import METADATA_PATH, FPS_PATH, LOCAL_MAP_KEYFRAMES_PATH, OBJECTS_PATH, EMBEDDING_CACHE_PATH, FRAME_CACHE_PATH, KEYFRAME_CACHE_PATH, THUMBNAILS_PATH, VIDEOS_PER_PACK_PATH, ALL_TAGS_PATH, ALL_OBJECTS_PATH, LOCAL_COLLECTIONS, VIDEO_TAGS_PATHS
+from local_engine import LocalSearchEngine
+from feature_store import FeatureStore, META_FILE
+from catalog import VideoCatalog
+from keyframe_map import KeyframeMap, get_keyframe_map
+from object_index import ObjectIndex
+from filters import parse_video_range, create_filter_conditions, create_ignore_condition, FilterCompiler
+from ingest import point_id
+from embedding_cache import EmbeddingCache
+from frame_cache import FrameCache
+from extraction import read_frame
+from thumbnails import thumbnail_path, sprite_path, pick_width, thumbnail_widths
+from keyframe_fetcher import KeyframeFetcher
+from result_set import ResultSet
+from temporal import match_points, rank_temporal_chains
+from concurrent.futures import ThreadPoolExecutor
 
 ##########################
 # PROCESS VIDEO FUNCTION #
@@ -35,46 +45,6 @@ def get_video_pack_files(folder: str, video_pack: str) -> list[str]:
             files.append(file_name)
     return files
 
-def get_video_metadata(folder: str, video: str, selected_keys: list[str]) -> dict:
-    """
-    Get metadata from a JSON file.
-    Args:
-        folder (str): Folder where JSON files are located.
-        video (str): Name of video.
-        selected_keys (list[str]): Keys to extract from the metadata.
-            Available keys: ['author', 'channel_id', 'channel_url', 'description', 'keywords', 
-            'length', 'publish_date', 'thumbnail_url', 'title', 'watch_url']
-    Returns:
-        dict: Metadata as a dictionary."""
-    
-    metadata_path = os.path.join(folder, video + ".json")
-    if not os.path.exists(metadata_path):
-        return {}
-    metadata = json.load(open(metadata_path, "r", encoding="utf-8"))
-    return {key: metadata[key] for key in selected_keys if key in metadata}
-
-def get_video_fps(file: str, video: str) -> float:
-    """
-    Get the frames per second (FPS) of a video from a .json file.
-    Args:
-        file (str): Path to the .json file containing videos fps.
-        video (str): Name of video.
-    Returns:
-        float: Frames per second of video."""
-    
-    if not os.path.exists(file):
-        return 0.0
-    fps_data = json.load(open(file, 'r'))
-    if video not in fps_data.keys():
-        return 0.0
-    return float(fps_data[video])
-
-def get_video_duration(video_name: str) -> int:
-    """Gets the duration of a video in seconds."""
-
-    metadata = get_video_metadata(METADATA_PATH, video_name, ["length"])
-    return metadata.get("length", 0)
-
 def get_keyframe_data(folder: str, video: str) -> pd.DataFrame:
     """
     Get timestamp, fps, frame_index of each keyframe in video.
@@ -106,154 +76,6 @@ def get_object_data(folder: str, video: str, frame_n: str) -> list:
         data = json.load(f)
         return data.get("detection_class_entities", [])
 
-def get_keyframe_image_path(folder: str, video: str, frame_n: int) -> str:
-    """
-    Get path to keyframe.
-
-    Args:
-        folder (str): Folder where keyframes are stored.
-        video (str): Name of video.
-        frame_n (int): The n-th keyframe.
-    Returns:
-        str: Path to keyframe.
-    """
-    
-    if frame_n < 10:
-        frame_n = "00" + str(frame_n)
-    elif frame_n < 100:
-        frame_n = "0" + str(frame_n)
-    else:
-        frame_n = str(frame_n)
-
-    path = os.path.join(folder, video, frame_n + ".jpg")
-    if not os.path.exists(path):
-        return ""
-    return path
-
-def get_keyframe_index(folder: str, video: str, frame_n: int) -> int:
-    """
-    Get the actual frame index of n-th keyframe.
-
-    Args:
-        folder (str): Folder where map-keyframes files are stored.
-        video (str): Name of video.
-        frame_n (int): N-th keyframe of video.
-    Returns:
-        int: The actual frame index of n-th keyframe.
-    """
-    df = pd.read_csv(os.path.join(folder, video + ".csv"))
-    try:
-        frame_index = df.iloc[frame_n - 1]["frame_idx"] # Offset by -1 because the first line of the csv is the header
-        return int(frame_index)
-    except IndexError:
-        print(f"{frame_n} keyframe does not exists in {video}.csv. Returning 0.")
-
-def get_frame_start_time(fps_file: str, video: str, frame_index: float) -> float:
-    """
-    Get timestamp of frame in video.
-
-    Agrs:
-        fps_file (str): Path to the .json file containing videos fps.
-        video (str): Name of video.
-        frame_index (int): Frame index in video.
-    Returns:
-        float: Timestamp of frame.
-    """
-    fps = get_video_fps(fps_file, video)
-    if fps == 0:
-        return 0.0
-    return frame_index / fps
-        
-def get_frame_url(file: str, video: str, metadata: dict, frame_index: int = 0) -> str:
-    """
-    Get the URL to youtube of a specific frame from metadata.
-    Args:
-        file (str): Path to the .json file containing videos fps.
-        video (str): Name of video.
-        metatdata (dict): Metadata dictionary containing video information.
-        frame_index (int): Index of the frame
-    Returns:
-        str: URL that starts video at frame.
-    """
-    
-    time = get_frame_start_time(file, video, frame_index)
-    url = metadata["watch_url"] + "&t=" + str(int(time))
-    return url
-
-def sample_frames(video_path: str, fromYoutube: bool, start_timestamp_in_s: int, end_timestamp_in_s: int, step: int, scale: float) -> tuple[list[np.ndarray], int]:
-    start_time = time.time()
-    if fromYoutube:
-        cap = cap_from_youtube(video_path)
-    else:
-        cap = cv2.VideoCapture(video_path)
-    end_time = time.time()
-    st.write(f"Open VideoCapture time: {end_time - start_time}")
-
-    VID_FPS = cap.get(cv2.CAP_PROP_FPS)
-    VID_FRAME_COUNT = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-    start_frame = start_timestamp_in_s * VID_FPS
-    end_frame = end_timestamp_in_s * VID_FPS
-
-    frames = []
-    count = 0
-    current_frame = start_frame
-    start_time = time.time()
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    end_time = time.time()
-    st.write(f"Set frame position time: {end_time - start_time}")
-    st.write(f"Start frame: {start_frame} | Frame count: {VID_FRAME_COUNT}")
-    start_time = time.time()
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if (count % step == 0):
-            frame = cv2.resize(frame, dsize=None, fx=scale, fy=scale)
-            frames.append(frame)
-        count += 1
-        current_frame += 1
-        if current_frame > end_frame:
-            break
-    cap.release()
-    end_time = time.time()
-    st.write(f"Extract frames time: {end_time - start_time}")
-    return frames, VID_FPS
-
-def sample_frames_2(video_path: str, fromYoutube: bool, start_timestamp_in_s: int, end_timestamp_in_s: int, step: int, scale: float) -> tuple[list[np.ndarray], int]:
-    start_time = time.time()
-    if fromYoutube:
-        cap = cap_from_youtube(video_path)
-    else:
-        cap = cv2.VideoCapture(video_path)
-    end_time = time.time()
-    st.write(f"Open VideoCapture time: {end_time - start_time}")
-
-    VID_FPS = cap.get(cv2.CAP_PROP_FPS)
-    VID_FRAME_COUNT = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-    start_frame = start_timestamp_in_s * VID_FPS
-    end_frame = end_timestamp_in_s * VID_FPS
-
-    frames = []
-    current_frame = 0
-    start_time = time.time()
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if (current_frame < start_frame):
-            current_frame += 1
-            continue
-        if current_frame > end_frame:
-            break
-        if (current_frame % step == 0):
-            frame = cv2.resize(frame, dsize=None, fx=scale, fy=scale)
-            frames.append(frame)
-        current_frame += 1
-    cap.release()
-    end_time = time.time()
-    st.write(f"Extract frames time: {end_time - start_time}")
-    return frames, VID_FPS
-
 
 #######################
 # STREAMLIT FUNCTIONS #
@@ -306,73 +128,47 @@ def store_value(key: str) -> None:
 def load_value(key: str) -> None:
     st.session_state["_" + key] = st.session_state[key]
 
-@st.cache_data
-def create_filter_conditions(packs: list[str], tags: list[str]) -> list[models.FieldCondition] | None:
-    """
-    Create conditions to search for videos in packs with specific tags.
-
-    Agrs:
-        packs (list[str]): A list of selected packs.
-        tags (list[str]): A list of selected tags.
-    Returns:
-        list[models.FieldCondition] | None: A lsit of conditions if packs or tags is provided. Returns None otherwise.
-    """
+def search_filter_key(collection_name: str) -> tuple:
+    """Hashable summary of the collection and the pack, tag, video range and ignore filters of the current session."""
+    return (
+        collection_name,
+        tuple(sorted(st.session_state.filter_packs)),
+        tuple(sorted(st.session_state.filter_tags)),
+        tuple(sorted(st.session_state.filter_ignore)),
+        parse_video_range(st.session_state.get("filter_video_range", "")),
+    )
 
-    if not tags and not packs:
-        return None
-    conditions = []
-    if packs:
-        conditions.append(
-            models.FieldCondition(
-                key="pack",
-                match=models.MatchAny(any=packs)
-            )
-        )
-    if tags:
-        for tag in tags:
-            conditions.append(
-                models.FieldCondition(
-                    key="tags",
-                    match=models.MatchValue(value=tag)
-                )
-            )
-    if not conditions:
-        return None
-    return conditions
+ID_FILTER_MAX_POINTS = 4096 # Keyframes above which a payload filter is smaller than their point IDs
 
-@st.cache_data
-def create_ignore_condition(origins: set[str]) -> list[models.FieldCondition] | None:
+def compile_search_filter(client: QdrantClient | LocalSearchEngine, collection_name: str, object_mask: np.ndarray | None = None) -> tuple[models.Filter | None, dict]:
     """
-    Create conditions to ignore when searching for videos.
+    Compile the pack, tag, video range and ignore filters of the current session.
+
+    The local engine gets a cached row mask (with the object mask folded in). Qdrant gets the
+    point IDs of the matching keyframes when they are few and the collection has the IDs of
+    ingest.py, a payload filter otherwise.
 
-    Agrs:
-        origins (list[str]): A list of videos to ignore.
     Returns:
-        list[models.FieldCondition] | None: A list of conditions if origins is provided. Returns None otherwise.
+        tuple[models.Filter | None, dict]: Qdrant filter, and extra keyword arguments for the search call.
     """
-
-    if not origins:
-        return None
-    conditions = []
-    for origin in origins:
-        pack, video = origin.split('_')
-        conditions.append(
-            models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="pack",
-                        match=models.MatchValue(value=pack)
-                    ),
-                    models.FieldCondition(
-                        key="video",
-                        match=models.MatchValue(value=video)
-                    ),
-                ]
-            )
+    video_range = parse_video_range(st.session_state.get("filter_video_range", ""))
+    if isinstance(client, LocalSearchEngine):
+        row_mask = client.filter_compiler(collection_name).compile(
+            st.session_state.filter_packs, st.session_state.filter_tags, st.session_state.filter_ignore, video_range, object_mask
         )
-    if not conditions:
-        return None
-    return conditions
+        return None, ({"row_mask": row_mask} if row_mask is not None else {})
+    compiler = load_point_filter_compiler(client, collection_name)
+    if compiler is not None:
+        row_mask = compiler.compile(st.session_state.filter_packs, st.session_state.filter_tags, st.session_state.filter_ignore, video_range)
+        if row_mask is not None and row_mask.sum() <= ID_FILTER_MAX_POINTS:
+            rows = np.flatnonzero(row_mask)
+            codes = compiler.video_codes[rows]
+            frame_ns = rows - load_keyframe_map().offsets[codes] + 1
+            ids = [point_id(compiler.origins[code], frame_n) for code, frame_n in zip(codes.tolist(), frame_ns.tolist())]
+            return models.Filter(must=[models.HasIdCondition(has_id=ids)]), {}
+    query_condition = create_filter_conditions(st.session_state.filter_packs, st.session_state.filter_tags, video_range)
+    ignore_condition = create_ignore_condition(st.session_state.filter_ignore)
+    return models.Filter(must=query_condition, must_not=ignore_condition), {}
 
 def search_query(model: SentenceTransformer, client: QdrantClient, collection_name: str, limit: int = 200) -> None:
     """Perform search based on the current inputs and update results in session state."""
@@ -382,128 +178,190 @@ def search_query(model: SentenceTransformer, client: QdrantClient, collection_na
             text_queries.append(inp["query"])
 
     image_query = st.session_state.get("image_upload")
-    query_condition = create_filter_conditions(st.session_state.filter_packs, st.session_state.filter_tags)
-    ignore_condition = create_ignore_condition(st.session_state.filter_ignore)
+    has_filter = bool(st.session_state.filter_packs or st.session_state.filter_tags or parse_video_range(st.session_state.get("filter_video_range", "")))
 
-    if not text_queries and not image_query and not query_condition and not st.session_state.filter_objects:
+    if not text_queries and not image_query and not has_filter and not st.session_state.filter_objects:
         st.warning("Please enter a query or select a filter.")
         return
 
-    query_vectors = []
     log_query = []
-
     if text_queries:
         if len(text_queries) > 1:
             st.warning("Currently only single text query is supported. Using the first query.")
-        text_vector = model.encode(text_queries[0]).tolist()
-        query_vectors.append(text_vector)
         log_query.append(text_queries[0])
 
-    if image_query:
-        from PIL import Image
-        image = Image.open(image_query).convert("RGB")
-        image_vector = model.encode(image).tolist()
-        query_vectors.append(image_vector)
-
-    if query_vectors:
-        if len(query_vectors) > 1:
-            final_query_vector = np.mean(query_vectors, axis=0).tolist()
+    # Text and image are encoded together, one model call for whatever the cache misses
+    query_vectors = load_embedding_cache().encode_batch(model, log_query, [image_query.getvalue()] if image_query else [])
+
+    # Objects are matched with the inverted index when it has been built
+    object_index = load_object_index(collection_name) if st.session_state.filter_objects else None
+    object_mask = None
+    if object_index is not None:
+        object_mask = object_index.match(st.session_state.filter_objects, st.session_state.filter_objects_score, st.session_state.filter_objects_all)
+    # The local engine applies the object mask before scoring, Qdrant results are post-filtered
+    pre_filter_objects = isinstance(client, LocalSearchEngine) and object_mask is not None
+    query_filter, pre_filter = compile_search_filter(client, collection_name, object_mask if pre_filter_objects else None)
+
+    # Results are fetched a page at a time; grouped and object post-filtered searches are
+    # fetched whole and sliced into pages
+    request = {"vector": None, "filter": query_filter, "pre_filter": pre_filter, "limit": limit, "page_size": st.session_state.page_size, "hits": None}
+    if len(query_vectors):
+        final_query_vector = query_vectors.mean(axis=0).tolist()
+        if st.session_state.group_by_video:
+            # The best keyframes of the best videos, grouped by the engine instead of over-fetching
+            groups = client.query_points_groups(
+                collection_name=collection_name,
+                query=final_query_vector,
+                group_by="origin",
+                limit=st.session_state.group_limit,
+                group_size=st.session_state.group_size,
+                query_filter=query_filter,
+                **pre_filter,
+            ).groups
+            if not groups and not isinstance(client, LocalSearchEngine):
+                st.warning("No groups returned, the collection may lack the 'origin' payload. Ingest it with app/ingest.py to group by video.")
+            request["hits"] = [hit for group in groups for hit in group.hits]
         else:
-            final_query_vector = query_vectors[0]
-        
-        st.session_state.results = client.search(
-            collection_name=collection_name,
-            query_vector=final_query_vector,
-            limit=limit,
-            query_filter=models.Filter(must=query_condition, must_not=ignore_condition),
-        )
-    else: # No query, just filters
-        st.session_state.results, _ = client.scroll(
-            collection_name=collection_name,
-            scroll_filter=models.Filter(must=query_condition, must_not=ignore_condition),
-            limit=limit
-        )
+            request["vector"] = final_query_vector
 
     # Post-filter by objects
-    if st.session_state.filter_objects:
+    if st.session_state.filter_objects and not pre_filter_objects:
         filtered_results = []
         # If no other filters are applied, we need to get all points first
-        if not query_condition and not query_vectors:
-            all_results, _ = client.scroll(collection_name=collection_name, limit=10000) # A high limit to get all points
-            st.session_state.results = all_results
-
-        for hit in st.session_state.results:
-            video_name = hit.payload.get("pack") + '_' + hit.payload.get("video")
-            frame_file = hit.payload.get("frame")
-            object_data = get_object_data("objects", video_name, frame_file)
-            if all(obj in object_data for obj in st.session_state.filter_objects):
-                filtered_results.append(hit)
-        st.session_state.results = filtered_results
-
-    st.session_state.origin_rank = []
-    seen = set()
-    for hit in st.session_state.results:
-        pack = hit.payload.get("pack")
-        video = hit.payload.get("video")
-        origin = pack + '_' + video
-        if origin not in seen:
-            st.session_state.origin_rank.append(origin)
-            seen.add(origin)
-    st.session_state.results_sorted = sorted(
-        st.session_state.results,
-        key=lambda x: (st.session_state.origin_rank.index(x.payload.get("pack") + '_' + x.payload.get("video")), x.payload.get("frame_index"))
-    )
+        if not has_filter and not len(query_vectors):
+            hits, _ = client.scroll(collection_name=collection_name, limit=10000) # A high limit to get all points
+        elif request["hits"] is None:
+            hits, _ = fetch_page(client, collection_name, {**request, "page_size": limit}, 0)
+        else:
+            hits = request["hits"]
+
+        if object_index is not None:
+            rows = object_index.rows_of(
+                [hit.payload.get("pack") + '_' + hit.payload.get("video") for hit in hits],
+                [int(hit.payload.get("frame")[:-4]) for hit in hits],
+            )
+            keep = (rows >= 0) & object_mask[np.maximum(rows, 0)] if len(object_mask) else np.zeros(len(rows), dtype=bool)
+            filtered_results = [hit for hit, kept in zip(hits, keep) if kept]
+        else:
+            for hit in hits:
+                video_name = hit.payload.get("pack") + '_' + hit.payload.get("video")
+                frame_file = hit.payload.get("frame")
+                object_data = get_object_data(OBJECTS_PATH, video_name, frame_file)
+                if all(obj in object_data for obj in st.session_state.filter_objects):
+                    filtered_results.append(hit)
+        request["hits"] = filtered_results[:limit]
+
+    st.session_state.search = {"collection": collection_name, "request": request, "pages": {}, "futures": {}, "offsets": {0: None}, "last_page": None}
+    if st.session_state.get("sort_by_video"):
+        sort_results(client)
+    else:
+        load_page(client, 0)
     st.session_state.log.append({"collection": collection_name, "query": log_query, "filter_packs": st.session_state.filter_packs, "filter_tags": st.session_state.filter_tags, "filter_objects": st.session_state.filter_objects})
     
-def rerank_temporal_queries(results):
-    # Step 1: collect payloads per query for frequency
-    payloads_per_query = []
-    for resp in results:
-        query_payloads = {
-            p.payload.get("pack") + '_' + p.payload.get("video")
-            for p in resp.points
-        }
-        payloads_per_query.append(query_payloads)
-
-    freq = Counter()
-    for query_set in payloads_per_query:
-        freq.update(query_set)
-
-    # Step 2: group all points by payload, storing query index too
-    groups = defaultdict(list)
-    for q_idx, resp in enumerate(results):
-        for p in resp.points:
-            key = p.payload.get("pack") + '_' + p.payload.get("video")
-            if groups[key] and groups[key][0][0] != 0:
-                continue
-            groups[key].append((q_idx, p))  # store query index
-
-    # Step 3: sort groups by frequency, then best score
-    def group_sort_key(item):
-        payload, pts = item
-        return (
-            -freq[payload],                        # more queries first
-            -max(p.score for _, p in pts)          # best score in group
+def fetch_page(client: QdrantClient, collection_name: str, request: dict, page: int, scroll_offset=None) -> tuple[list, object]:
+    """
+    Hits of one result page of a search.
+
+    Args:
+        client (QdrantClient): Search backend.
+        collection_name (str): Collection searched.
+        request (dict): Query vector (None for a filter-only scroll), filter, extra search
+            arguments, total limit, page size, and the whole hit list for pre-fetched searches.
+        page (int): Page number, from 0.
+        scroll_offset: Offset returned by the scroll of the previous page.
+    Returns:
+        tuple[list, object]: Hits, and the scroll offset of the next page (None for scored searches or the last page).
+    """
+    start = page * request["page_size"]
+    size = min(request["page_size"], request["limit"] - start)
+    if size <= 0:
+        return [], None
+    if request["hits"] is not None:
+        return request["hits"][start:start + size], None
+    if request["vector"] is not None:
+        hits = client.search(
+            collection_name=collection_name,
+            query_vector=request["vector"],
+            limit=size,
+            offset=start,
+            query_filter=request["filter"],
+            **request["pre_filter"],
         )
-    
-    sorted_groups = sorted(groups.items(), key=group_sort_key)
-    st.session_state.origin_rank = []
-    seen = set()
-    for origin, pts in sorted_groups:
-        if origin not in seen:
-            seen.add(origin)
-            st.session_state.origin_rank.append(origin)
-
-    # Step 4: sort inside each group by query index first, then score
-    final_list = []
-    for payload, pts in sorted_groups:
-        pts_sorted = sorted(
-            pts,
-            key=lambda x: (x[0], -x[1].score)  # query index ascending, score descending
+        return hits, None
+    return client.scroll(collection_name=collection_name, scroll_filter=request["filter"], limit=size, offset=scroll_offset, **request["pre_filter"])
+
+def _fetch_page_job(client: QdrantClient, collection_name: str, request: dict, page: int, scroll_offset, fetcher: KeyframeFetcher, frames_path: str) -> tuple[list, object]:
+    """Fetch a page in the background and start downloading its keyframes."""
+    hits, next_offset = fetch_page(client, collection_name, request, page, scroll_offset)
+    fetcher.prefetch([os.path.join(frames_path, hit.payload.get("pack") + '_' + hit.payload.get("video"), hit.payload.get("frame")) for hit in hits])
+    return hits, next_offset
+
+@st.cache_resource
+def load_page_executor() -> ThreadPoolExecutor:
+    """Threads fetching the next result page of every session in the background."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="page-prefetch")
+
+def load_page(client: QdrantClient, page: int) -> None:
+    """
+    Show a page of the last search: fetch it unless it was prefetched, build its result set,
+    then start fetching the next page in the background.
+    """
+    search = st.session_state.search
+    collection_name, request = search["collection"], search["request"]
+    if page not in search["pages"]:
+        future = search["futures"].pop(page, None)
+        if future is not None:
+            hits, next_offset = future.result()
+        else:
+            hits, next_offset = fetch_page(client, collection_name, request, page, search["offsets"].get(page))
+        if not hits and page > 0: # The previous page ended exactly at the last result
+            search["last_page"] = page - 1
+            return
+        search["pages"][page] = build_result_set(hits, collection_name)
+        search["offsets"][page + 1] = next_offset
+        scrolled_to_end = request["vector"] is None and request["hits"] is None and next_offset is None
+        total = request["limit"] if request["hits"] is None else min(request["limit"], len(request["hits"]))
+        if len(hits) < request["page_size"] or scrolled_to_end or (page + 1) * request["page_size"] >= total:
+            search["last_page"] = page
+    st.session_state.page = page
+    st.session_state.results = search["pages"][page]
+    prefetch_keyframes(st.session_state.results)
+
+    next_page = page + 1
+    if (search["last_page"] is None or next_page <= search["last_page"]) and next_page not in search["pages"] and next_page not in search["futures"]:
+        search["futures"][next_page] = load_page_executor().submit(
+            _fetch_page_job, client, collection_name, request, next_page, search["offsets"].get(next_page),
+            load_keyframe_fetcher(), st.session_state.available_frames_path[collection_name],
         )
-        final_list.extend(p for _, p in pts_sorted)
 
-    return final_list
+def sort_results(client: QdrantClient) -> None:
+    """
+    Order the whole result list of the last search by video (videos by their best hit) or back
+    by score, following "Sort by video", and show its first page.
+
+    Sorting needs every hit, so a search fetched a page at a time is fetched whole first.
+    """
+    search = st.session_state.search
+    if search is None:
+        return
+    request = search["request"]
+    if "ranked_hits" not in request:
+        if request["hits"] is None:
+            for future in search["futures"].values():
+                future.cancel()
+            request["hits"], _ = fetch_page(client, search["collection"], {**request, "page_size": request["limit"]}, 0)
+        request["ranked_hits"] = request["hits"]
+    hits = request["ranked_hits"]
+    if st.session_state.sort_by_video:
+        video_rank = {}
+        for hit in hits:
+            video_rank.setdefault((hit.payload.get("pack"), hit.payload.get("video")), len(video_rank))
+        hits = sorted(hits, key=lambda hit: video_rank[(hit.payload.get("pack"), hit.payload.get("video"))])
+    request["hits"] = hits
+    search.update({"pages": {}, "futures": {}, "offsets": {0: None}, "last_page": None})
+    load_page(client, 0)
+
+TEMPORAL_CANDIDATES = 1000 # Hits per event fetched from Qdrant to build the chains from
 
 def temporal_search_query(model: SentenceTransformer, client: QdrantClient, collection_name: str, limit: int = 200) -> None:
     """Perform search based on the current inputs and update results in session state."""
@@ -513,52 +371,58 @@ def temporal_search_query(model: SentenceTransformer, client: QdrantClient, coll
             text_queries.append(inp["query"])
 
     image_query = st.session_state.get("image_upload")
-    query_condition = create_filter_conditions(st.session_state.filter_packs, st.session_state.filter_tags)
-    ignore_condition = create_ignore_condition(st.session_state.filter_ignore)
+    query_filter, pre_filter = compile_search_filter(client, collection_name)
 
     if not text_queries and not image_query:
         st.warning("Please enter a query.")
         return
+    if st.session_state.temporal_max_gap and st.session_state.temporal_min_gap > st.session_state.temporal_max_gap:
+        st.warning("Min gap must not be larger than max gap.")
+        return
 
-    query_vectors = []
-    log_query = []
-
-    for text_query in text_queries:
-        text_vector = model.encode(text_query).tolist()
-        query_vectors.append(text_vector)
-        log_query.append(text_query)
-
-    # if image_query:
-    #     from PIL import Image
-    #     image = Image.open(image_query).convert("RGB")
-    #     image_vector = model.encode(image).tolist()
-    #     query_vectors.append(image_vector)
-
-    search_queries = [
-        models.QueryRequest(query=query_vector, filter=models.Filter(must=query_condition, must_not=ignore_condition), limit=limit, with_payload=True) for query_vector in query_vectors
-    ]
-
-    results = client.query_batch_points(
-        collection_name=collection_name,
-        requests=search_queries,
-    )
-
-    # # Post-filter by objects
-    # if st.session_state.filter_objects:
-    #     filtered_results = []
-
-    #     for result in results:
-    #         filtered_result = []
-    #         for hit in result:
-    #             video_name = hit.payload.get("pack") + '_' + hit.payload.get("video")
-    #             frame_file = hit.payload.get("frame")
-    #             object_data = get_object_data("objects", video_name, frame_file)
-    #             if all(obj in object_data for obj in st.session_state.filter_objects):
-    #                 filtered_result.append(hit)
-    #         filtered_results.append(filtered_result)
-    #     st.session_state.results = filtered_results
+    log_query = list(text_queries)
+    embedding_cache = load_embedding_cache()
+    local = isinstance(client, LocalSearchEngine)
+
+    # Per-event results are kept for the session under the current filters, only new or edited
+    # events are encoded and searched (in one batch), then the chains are matched again
+    filter_key = search_filter_key(collection_name)
+    cache = st.session_state.temporal_cache
+    if cache.get("filter") != filter_key:
+        cache.clear()
+        cache.update({"filter": filter_key, "rows": None, "events": {}})
+    event_keys = [embedding_cache.text_key(text_query) for text_query in text_queries]
+    missing = list(dict.fromkeys(key for key in event_keys if key not in cache["events"]))
+    if missing:
+        missing_texts = [text_queries[event_keys.index(key)] for key in missing]
+        query_vectors = embedding_cache.encode_batch(model, missing_texts)
+        if local:
+            # Every keyframe passing the filters is scored, chains are matched over all of them
+            cache["rows"], score_matrix = client.score_rows(collection_name, query_vectors, query_filter, **pre_filter)
+            event_results = list(score_matrix)
+        else:
+            event_results = client.query_batch_points(
+                collection_name=collection_name,
+                requests=[
+                    models.QueryRequest(query=query_vector, filter=query_filter, limit=TEMPORAL_CANDIDATES, with_payload=True) for query_vector in query_vectors.tolist()
+                ],
+            )
+        cache["events"].update(zip(missing, event_results))
+    # Drop removed events so the cache holds at most the current ones
+    cache["events"] = {key: cache["events"][key] for key in event_keys}
+
+    catalog = load_catalog()
+    min_gap = st.session_state.temporal_min_gap
+    max_gap = st.session_state.temporal_max_gap or None # 0 means no limit
+    events = [cache["events"][key] for key in event_keys]
+    if local:
+        chains = client.match_chains(collection_name, cache["rows"], events, catalog.fps, min_gap, max_gap, limit)
+    else:
+        chains = match_points(events, catalog.fps, min_gap, max_gap, limit)
 
-    st.session_state.temporal_results = rerank_temporal_queries(results)
+    # Groups follow the chain ranking, each chain's hits by frame index
+    st.session_state.temporal_results = build_result_set(rank_temporal_chains(chains), collection_name)
+    prefetch_keyframes(st.session_state.temporal_results)
 
     st.session_state.log.append({"collection": collection_name, "query": log_query, "filter_packs": st.session_state.filter_packs, "filter_tags": st.session_state.filter_tags, "filter_objects": st.session_state.filter_objects})
 
@@ -575,7 +439,7 @@ def check_server(client: QdrantClient, collection_name: str) -> None:
         st.error(f"Error connecting to server or collection does not exist: {e}")
 
 @st.dialog("Details", width='large', on_dismiss="rerun")
-def show_details(origin: str, frame_index: int, frame: str, data: str, frame_path: str, fps_file: str, video_name: str, start_time: float = 0) -> None:
+def show_details(origin: str, frame_index: int, frame: str, data: str, frame_path: str, video_name: str, start_time: float = 0) -> None:
     st.write(
         """<style>
         .stDialog *[role="dialog"] {
@@ -586,7 +450,8 @@ def show_details(origin: str, frame_index: int, frame: str, data: str, frame_pat
     )
     info = f"Video: {origin}\tFrame index: {frame_index}\tFrame name: {frame}"
     detail_container = st.container(key='detail_container', border=False)
-    st.session_state.fps = get_video_fps(fps_file, video_name)
+    catalog = load_catalog()
+    st.session_state.fps = catalog.fps(video_name)
     
     # Initialize calculator_index with a default value
     calculator_index = int(start_time * st.session_state.fps)
@@ -595,7 +460,7 @@ def show_details(origin: str, frame_index: int, frame: str, data: str, frame_pat
         cols = st.columns([0.65, 0.35])
         with cols[0]:
             st.video(data, start_time=start_time)
-            duration = get_video_duration(video_name)
+            duration = catalog.length(video_name)
             if duration > 0:
                 selected_seconds = st.slider("Select time", 0, duration, int(start_time))
                 
@@ -609,12 +474,24 @@ def show_details(origin: str, frame_index: int, frame: str, data: str, frame_pat
                     # Update calculator_index based on slider
                     calculator_index = int(selected_seconds * st.session_state.fps)
                     st.write(f"Frame Index: {calculator_index}")
+                    keyframe_map = load_keyframe_map()
+                    if keyframe_map is not None and video_name in keyframe_map:
+                        nearest = int(keyframe_map.nearest_keyframe(video_name, calculator_index)[0])
+                        st.write(f"Nearest keyframe: {nearest:03d}.jpg")
+                    show_frame = st.toggle("Show frame", key="show_calculator_frame")
                 with sub_cols[1]:
                     if st.button("Ignore this video"):
                         st.session_state.filter_ignore.add(origin)
+                if show_frame:
+                    # Frames seen once (here or in the Frame Extractor) are not decoded again
+                    calculator_frame = read_frame(data, not os.path.exists(data), calculator_index, 0.5, load_frame_cache(), video_name, st.session_state.fps)
+                    if calculator_frame is not None:
+                        st.image(calculator_frame, f"Frame {calculator_index}", use_container_width=True)
+                    else:
+                        st.warning(f"Could not read frame {calculator_index}")
 
         with cols[1]:
-            st.image(frame_path, use_container_width=True)
+            st.image(load_keyframe_fetcher().fetch(frame_path) or frame_path, use_container_width=True)
             if info:
                 st.text(info)
             sub_cols = st.columns(2)
@@ -624,15 +501,177 @@ def show_details(origin: str, frame_index: int, frame: str, data: str, frame_pat
             with sub_cols[1]:
                 st.button(label="Use Image Index", key="image_index_button", on_click=add_answer, args=((f"{origin}, {int(frame_index)}"),))
 
+GRID_WIDTH = 1600 # Pixels the result grids span in the wide layout
+
+def keyframe_image(collection_name: str, origin: str, frame: str, frame_path: str | None, num_of_cols: int, widths: tuple[int, ...] | None = None, thumbnail: bool | None = None) -> str | None:
+    """
+    Image to show for a keyframe in a grid of `num_of_cols` columns.
+
+    The smallest generated thumbnail at least as wide as a column (see thumbnails.py), the
+    full-size keyframe `frame_path` when thumbnails were not generated, read through the local
+    keyframe cache when it is remote.
+
+    Args:
+        widths (tuple[int, ...] | None): Pyramid levels of the collection, read from its manifest if not given.
+        thumbnail (bool | None): Whether the keyframe has thumbnails, checked on disk if not given.
+    """
+    thumbnails_path = os.path.join(THUMBNAILS_PATH, collection_name)
+    path = thumbnail_path(thumbnails_path, pick_width(GRID_WIDTH / max(num_of_cols, 1), widths or thumbnail_widths(thumbnails_path)), origin, frame)
+    if thumbnail or (thumbnail is None and os.path.exists(path)):
+        return path
+    if frame_path is None:
+        return None
+    return load_keyframe_fetcher().fetch(frame_path) or frame_path
+
+def build_result_set(hits: list, collection_name: str) -> ResultSet:
+    """
+    What the result grids show for each hit, computed once per search.
+
+    Reruns (e.g., moving the column slider) render from its columns without touching the
+    payloads, the catalog or the thumbnail folders.
+    """
+    return ResultSet.from_hits(hits, collection_name, st.session_state.available_frames_path[collection_name], load_catalog())
+
+def render_image(results: ResultSet, row: int, num_of_cols: int) -> str:
+    """`keyframe_image` of a result, with what the result set already knows; keyframe copies are resolved once."""
+    if row in results.images: # Prefetching has usually downloaded it by now
+        return results.images[row]
+    thumbnail = bool(results.thumbnail[row])
+    image = keyframe_image(results.collection_name, results.origin(row), str(results.frame[row]), results.frame_path(row), num_of_cols, results.thumbnail_widths, thumbnail)
+    if not thumbnail: # Thumbnail levels depend on the number of columns
+        results.images[row] = image
+    return image
+
+def show_result_details(results: ResultSet, row: int) -> None:
+    """Details dialog of a result."""
+    show_details(
+        origin=results.origin(row),
+        frame_index=int(results.frame_index[row]),
+        frame=str(results.frame[row]),
+        data=results.video_data[results.video[row]],
+        frame_path=results.frame_path(row),
+        start_time=float(results.start_time[row]),
+        video_name=results.origin(row),
+    )
+
+def prefetch_keyframes(results: ResultSet) -> None:
+    """Start downloading the keyframes of search results that have no thumbnail, so the grid renders from disk."""
+    load_keyframe_fetcher().prefetch([results.frame_path(row) for row in np.flatnonzero(~results.thumbnail).tolist()])
+
+def video_sprite(collection_name: str, origin: str) -> str | None:
+    """Sprite sheet of every keyframe of a video, None if it was not generated."""
+    path = sprite_path(os.path.join(THUMBNAILS_PATH, collection_name), origin)
+    return path if os.path.exists(path) else None
+
+MODEL_NAME = 'clip-ViT-B-32'
+
 @st.cache_resource
 def load_model() -> SentenceTransformer:
     
-    model = SentenceTransformer('clip-ViT-B-32')
+    model = SentenceTransformer(MODEL_NAME)
     return model
 
 @st.cache_resource
-def load_client() -> QdrantClient:
+def load_embedding_cache() -> EmbeddingCache:
+    """Query embedding cache shared by every session, persisted under cache/embeddings."""
+    return EmbeddingCache(EMBEDDING_CACHE_PATH, MODEL_NAME)
+
+@st.cache_resource
+def load_frame_cache() -> FrameCache:
+    """
+    Extracted frame cache shared by every session, persisted under cache/frames.
+
+    Set FRAME_CACHE_MB (environment or .env) to bound its size, 2048 by default.
+    """
+    load_dotenv()
+    return FrameCache(FRAME_CACHE_PATH, int(float(os.getenv("FRAME_CACHE_MB", 2048)) * (1 << 20)))
+
+@st.cache_resource
+def load_keyframe_fetcher() -> KeyframeFetcher:
+    """
+    Keyframe image cache shared by every session, persisted under cache/keyframes.
+
+    Set KEYFRAME_FETCH_WORKERS (environment or .env) to change the number of concurrent downloads, 16 by default,
+    and KEYFRAME_CACHE_MB to bound its size, 1024 by default.
+    """
+    load_dotenv()
+    return KeyframeFetcher(KEYFRAME_CACHE_PATH, int(os.getenv("KEYFRAME_FETCH_WORKERS", 16)), max_bytes=int(float(os.getenv("KEYFRAME_CACHE_MB", 1024)) * (1 << 20)))
+
+@st.cache_resource
+def load_catalog() -> VideoCatalog:
+    """Video metadata shared by every session of the app."""
+    return VideoCatalog(FPS_PATH, METADATA_PATH, VIDEOS_PER_PACK_PATH, ALL_TAGS_PATH, ALL_OBJECTS_PATH, VIDEO_TAGS_PATHS)
+
+@st.cache_resource
+def load_keyframe_map() -> KeyframeMap | None:
+    """
+    Keyframe map of the local map-keyframes folder, shared by every session.
+
+    Loaded when the app starts (see state.py), so the first details dialog does not wait for
+    the folder to be compiled.
+    """
+    return get_keyframe_map(LOCAL_MAP_KEYFRAMES_PATH)
+
+@st.cache_resource
+def load_point_filter_compiler(_client: QdrantClient, collection_name: str) -> FilterCompiler | None:
+    """
+    Filter compiler over the keyframes of the keyframe map, to turn filters into point IDs of a
+    Qdrant collection. None without a keyframe map or if the collection does not have the IDs
+    of ingest.py (e.g., built by qdrant.ipynb with sequential IDs).
+    """
+    keyframe_map = load_keyframe_map()
+    if keyframe_map is None or not keyframe_map.origins:
+        return None
+    try:
+        if not _client.retrieve(collection_name, ids=[point_id(keyframe_map.origins[0], 1)], with_payload=False, with_vectors=False):
+            return None
+    except Exception:
+        return None
+    catalog = load_catalog()
+    video_tags = [list(catalog.get(origin).tags) if origin in catalog else [] for origin in keyframe_map.origins]
+    video_codes = np.repeat(np.arange(len(keyframe_map.origins), dtype=np.int32), np.diff(keyframe_map.offsets))
+    return FilterCompiler(keyframe_map.origins, video_codes, video_tags)
+
+@st.cache_resource
+def load_object_index(collection_name: str) -> ObjectIndex | None:
+    """
+    Detected-object index saved in the feature store of a collection, None if not built.
+
+    The index is remapped onto the rows of the store when the store changed since it was built,
+    videos it does not cover match no object until it is rebuilt.
+    """
+    if collection_name not in LOCAL_COLLECTIONS:
+        return None
+    store_dir = LOCAL_COLLECTIONS[collection_name]["store"]
+    index = ObjectIndex.load(store_dir)
+    if index is None or not os.path.exists(os.path.join(store_dir, META_FILE)):
+        return index
+    store = FeatureStore.open(store_dir)
+    remapped = index.remap(store.origins, store.offsets)
+    if remapped is not index:
+        print(f"Object index of {collection_name} does not match its feature store, remapped by video; rebuild it with app/object_index.py")
+    return remapped
+
+@st.cache_resource
+def load_client() -> QdrantClient | LocalSearchEngine:
+    """
+    Create the vector search backend.
+
+    Set SEARCH_BACKEND=local (environment or .env) to search the clip features in-process
+    instead of the hosted Qdrant cluster, and SEARCH_QUANTIZATION=int8 or binary to rank by
+    quantized codes before exact re-scoring. SEARCH_INDEX=hnsw searches the HNSW graph instead,
+    with SEARCH_EF setting its ef_search.
+    """
     load_dotenv()
+    if os.getenv("SEARCH_BACKEND", "qdrant").lower() == "local":
+        ef_search = os.getenv("SEARCH_EF")
+        return LocalSearchEngine(
+            LOCAL_COLLECTIONS,
+            VIDEO_TAGS_PATHS,
+            quantization=os.getenv("SEARCH_QUANTIZATION") or None,
+            index=os.getenv("SEARCH_INDEX") or None,
+            ef_search=int(ef_search) if ef_search else None,
+        )
     client = QdrantClient(
         url="https://9bf65806-b1f1-498b-b309-079694a5a23b.us-east4-0.gcp.cloud.qdrant.io", 
         api_key=os.getenv("QDRANT_TOKEN_READ"),
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+import cv2
+import numpy as np
+sys.path.append(str(Path(__file__).resolve().parent.parent / "app"))
+from extraction import extract_frames
+
+
+def make_video(path: str, seconds: int, fps: int = 25, size: tuple[int, int] = (1280, 720)) -> None:
+    """Write a synthetic video with moving content, so frames do not compress to nothing."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, (size[1], size[0] + seconds * fps, 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        writer.write(np.ascontiguousarray(noise[:, i:i + size[0]]))
+    writer.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single-process vs. segmented multi-process frame extraction.")
+    parser.add_argument("--video", help="Local video file (e.g., an L28 video), a synthetic one is generated if omitted")
+    parser.add_argument("--start", type=float, default=0.0, help="Window start in seconds")
+    parser.add_argument("--end", type=float, default=120.0, help="Window end in seconds")
+    parser.add_argument("--step", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    video = args.video
+    if video is None:
+        video = os.path.join(tempfile.mkdtemp(), "synthetic.mp4")
+        print(f"Writing a {int(args.end)}s synthetic video to {video}")
+        make_video(video, int(args.end) + 1)
+
+    def best_of(fn) -> tuple:
+        """Fastest of `repeat` runs, with its wall time."""
+        runs = []
+        for _ in range(args.repeat):
+            start_time = time.time()
+            result = fn()
+            runs.append((time.time() - start_time, result))
+        return min(runs, key=lambda run: run[0])
+
+    baseline, (frames, _, _, stats) = best_of(lambda: extract_frames(video, False, args.start, args.end, args.step))
+    print(f"CPUs: {os.cpu_count()} | window {args.start:.0f}-{args.end:.0f}s | step {args.step} | {len(frames)} frames")
+    print(f"{'workers':>8} {'wall (s)':>9} {'speedup':>8} {'grab (s)':>9} {'decode (s)':>11}")
+    print(f"{'serial':>8} {baseline:>9.2f} {1.0:>8.2f} {stats['grab']:>9.2f} {stats['decode']:>11.2f}")
+    for workers in args.workers:
+        wall, (_, _, _, stats) = best_of(lambda: extract_frames(video, False, args.start, args.end, args.step, workers=workers))
+        print(f"{workers:>8} {wall:>9.2f} {baseline / wall:>8.2f} {stats['grab']:>9.2f} {stats['decode']:>11.2f}")
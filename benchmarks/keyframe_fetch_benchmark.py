@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+import cv2
+import numpy as np
+import requests
+sys.path.append(str(Path(__file__).resolve().parent.parent / "app"))
+from keyframe_fetcher import KeyframeFetcher
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Static file handler adding a fixed delay per request, standing in for the remote dataset."""
+
+    latency = 0.05
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def make_keyframes(root: str, videos: int, frames: int, size: tuple[int, int] = (1280, 720)) -> list[str]:
+    """Write synthetic keyframes as <video>/<frame>.jpg, returns their relative paths."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for v in range(videos):
+        os.makedirs(os.path.join(root, f"L21_V{v + 1:03d}"), exist_ok=True)
+        for f in range(frames):
+            path = f"L21_V{v + 1:03d}/{f + 1:03d}.jpg"
+            cv2.imwrite(os.path.join(root, path), rng.integers(0, 255, (size[1] // 4, size[0] // 4, 3), dtype=np.uint8))
+            paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs. pooled concurrent keyframe fetching against a local HTTP server.")
+    parser.add_argument("--images", type=int, default=200, help="Keyframes in a result page")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server delay per request in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 32])
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    paths = make_keyframes(root, (args.images + 49) // 50, 50)[:args.images]
+    SlowHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/{path}" for path in paths]
+    print(f"{len(urls)} keyframes | {args.latency * 1000:.0f} ms per request")
+
+    start_time = time.time()
+    for url in urls:
+        requests.get(url, timeout=10).content # One connection per request, as the grid did
+    baseline = time.time() - start_time
+    print(f"{'mode':>14} {'wall (s)':>9} {'speedup':>8}")
+    print(f"{'sequential':>14} {baseline:>9.2f} {1.0:>8.2f}")
+
+    for workers in args.workers:
+        fetcher = KeyframeFetcher(tempfile.mkdtemp(), max_workers=workers)
+        start_time = time.time()
+        local_paths = fetcher.fetch_many(urls)
+        wall = time.time() - start_time
+        assert all(local_paths), fetcher.stats()
+        print(f"{f'pool of {workers}':>14} {wall:>9.2f} {baseline / wall:>8.2f}")
+
+    start_time = time.time()
+    fetcher.fetch_many(urls)
+    wall = time.time() - start_time
+    print(f"{'cached':>14} {wall:>9.2f} {baseline / wall:>8.2f}")
+    server.shutdown()
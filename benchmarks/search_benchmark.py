@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+sys.path.append(str(Path(__file__).resolve().parent.parent / "app"))
+from local_engine import LocalSearchEngine
+from catalog import VideoCatalog
+from keyframe_map import KeyframeMap
+from object_index import ObjectIndex
+from result_set import ResultSet
+from filters import create_filter_conditions, create_ignore_condition
+from temporal import match_points, rank_temporal_chains
+from synthetic_corpus import make_corpus, corpus_paths, tag_files, LABELS
+
+COLLECTION = "synthetic"
+
+
+def measure(fn, repeat: int, items: int = 1, warmup: int = 2) -> dict:
+    """
+    Latency percentiles, throughput and peak memory of a call.
+
+    The timed runs are done without tracing; peak memory comes from one more run under
+    tracemalloc (numpy buffers included, memory-mapped vectors excluded).
+
+    Args:
+        fn: Function to call without arguments.
+        repeat (int): Timed runs.
+        items (int): Items (queries, lookups) handled per call, for the throughput.
+        warmup (int): Untimed runs first.
+    Returns:
+        dict: 'p50', 'p95', 'p99' (ms), 'throughput' (items/s) and 'peak_mb'.
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start_time
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50, p95, p99 = np.percentile(times * 1000, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "throughput": items * repeat / times.sum(), "peak_mb": peak / 2**20}
+
+def make_queries(topics: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Query vectors near random topics, like text embeddings of what the corpus shows."""
+    queries = topics[rng.integers(0, len(topics), size=n)] + 0.8 / np.sqrt(topics.shape[1]) * rng.standard_normal((n, topics.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+def load_qdrant(engine: LocalSearchEngine, dim: int, batch: int = 2048) -> QdrantClient:
+    """In-memory Qdrant holding the rows and payloads of the local collection, standing in for the server."""
+    client = QdrantClient(location=":memory:")
+    client.create_collection(COLLECTION, vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+    collection = engine._collection(COLLECTION)
+    for start in range(0, len(collection), batch):
+        rows = range(start, min(start + batch, len(collection)))
+        client.upsert(COLLECTION, points=models.Batch(
+            ids=list(rows),
+            vectors=np.asarray(collection.vectors[start:rows.stop]).tolist(),
+            payloads=[collection.payload(row) for row in rows],
+        ))
+    return client
+
+def run_suite(corpus: dict, root: str, repeat: int, limit: int, qdrant: bool, seed: int = 0) -> dict:
+    """Benchmark every stage on one corpus, returns the measurements by stage name."""
+    rng = np.random.default_rng(seed)
+    paths = corpus_paths(root)
+    files = tag_files(root, corpus["packs"])
+    engine = LocalSearchEngine({COLLECTION: {key: paths[key] for key in ("features", "map_keyframes", "store")}}, tag_files=files)
+    catalog = VideoCatalog(paths["fps"], paths["metadata"], paths["videos_per_pack"], paths["all_tags"], paths["all_objects"], files)
+    compiler = engine.filter_compiler(COLLECTION)
+    queries = make_queries(corpus["topics"], 64, rng)
+    query_cycle = iter(range(10**9))
+    next_query = lambda: queries[next(query_cycle) % len(queries)]
+
+    origins = corpus["origins"]
+    packs = corpus["packs"][:max(len(corpus["packs"]) // 2, 1)]
+    ignore = set(rng.choice(origins, size=min(50, len(origins) // 4), replace=False).tolist())
+    tags = [catalog.pack_tags[packs[0]][0]]
+    results = {}
+
+    # Search: what search_query runs per submitted query
+    results["search (local)"] = measure(lambda: engine.search(COLLECTION, next_query(), limit=limit), repeat)
+    row_mask = compiler.compile(packs, None, ignore)
+    results["search + filters (local)"] = measure(lambda: engine.search(COLLECTION, next_query(), limit=limit, row_mask=row_mask), repeat)
+    results["grouped search (local)"] = measure(lambda: engine.query_points_groups(COLLECTION, next_query(), limit=limit // 4, group_size=3), repeat)
+    batch = [models.QueryRequest(query=next_query().tolist(), limit=limit, with_payload=True) for _ in range(4)]
+    results["batch of 4 (local)"] = measure(lambda: engine.query_batch_points(COLLECTION, batch), repeat, items=4)
+    hits = engine.search(COLLECTION, next_query(), limit=limit)
+    results["result set"] = measure(lambda: ResultSet.from_hits(hits, COLLECTION, paths["store"], catalog), repeat)
+
+    # Filtering: compiled row masks for the local engine, payload filters for Qdrant
+    def compile_cold():
+        compiler._row_mask.cache_clear()
+        compiler._pack_mask.cache_clear()
+        compiler._tag_mask.cache_clear()
+        compiler._ignore_mask.cache_clear()
+        return compiler.compile(packs, tags, ignore)
+    results["filter compile (cold)"] = measure(compile_cold, repeat)
+    results["filter compile (cached)"] = measure(lambda: compiler.compile(packs, tags, ignore), repeat)
+    results["create_ignore_condition"] = measure(lambda: create_ignore_condition(ignore), repeat)
+    payload_filter = models.Filter(must=create_filter_conditions(packs, tags), must_not=create_ignore_condition(ignore))
+    results["payload filter (local)"] = measure(lambda: engine.count(COLLECTION, count_filter=payload_filter), repeat)
+    object_index = ObjectIndex.load(paths["store"])
+    if object_index is not None:
+        def match_cold():
+            object_index._bitmap.cache_clear()
+            return object_index.match(LABELS[:2], min_score=0.5)
+        results["object match (cold)"] = measure(match_cold, repeat)
+
+    # Temporal rerank: chains over the whole score matrix (local) or over per-event hits (Qdrant path)
+    events = [next_query() for _ in range(3)]
+    def chains_local():
+        rows, score_matrix = engine.score_rows(COLLECTION, events)
+        return engine.match_chains(COLLECTION, rows, list(score_matrix), catalog.fps, limit=100)
+    results["temporal chains (local)"] = measure(chains_local, repeat)
+    responses = engine.query_batch_points(COLLECTION, [models.QueryRequest(query=event.tolist(), limit=1000, with_payload=True) for event in events])
+    results["temporal chains (hits)"] = measure(lambda: rank_temporal_chains(match_points(responses, catalog.fps, k=100)), repeat)
+
+    # Lookups: what the result grids and detail views ask per keyframe
+    lookups = 1000
+    lookup_origins = rng.choice(origins, size=lookups).tolist()
+    lookup_frames = rng.integers(0, 10000, size=lookups).tolist()
+    results["catalog start_time"] = measure(lambda: [catalog.start_time(o, f) for o, f in zip(lookup_origins, lookup_frames)], repeat, items=lookups)
+    results["catalog frame_url"] = measure(lambda: [catalog.frame_url(o, f) for o, f in zip(lookup_origins, lookup_frames)], repeat, items=lookups)
+    keyframe_map = KeyframeMap.from_folder(paths["map_keyframes"])
+    lookup_ns = rng.integers(1, 100, size=lookups)
+    results["keyframe map frame_index"] = measure(lambda: keyframe_map.frame_index(lookup_origins, lookup_ns), repeat, items=lookups)
+    results["keyframe map nearest"] = measure(lambda: keyframe_map.nearest_keyframe(lookup_origins, lookup_frames), repeat, items=lookups)
+
+    if qdrant:
+        client = load_qdrant(engine, corpus["dim"])
+        results["search (qdrant)"] = measure(lambda: client.query_points(COLLECTION, query=next_query(), limit=limit), repeat)
+        results["search + filters (qdrant)"] = measure(lambda: client.query_points(COLLECTION, query=next_query(), limit=limit, query_filter=payload_filter), repeat)
+        results["grouped search (qdrant)"] = measure(lambda: client.query_points_groups(COLLECTION, query=next_query(), group_by="origin", limit=limit // 4, group_size=3), repeat)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark search, filtering, temporal rerank and lookups on synthetic corpora of several sizes, offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="Videos per pack of each corpus")
+    parser.add_argument("--packs", type=int, default=4)
+    parser.add_argument("--keyframes", type=int, default=200, help="Average keyframes per video")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--limit", type=int, default=200, help="Results per search, as in the Query Engine")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed runs per stage")
+    parser.add_argument("--qdrant", action="store_true", help="Also run the searches on an in-memory Qdrant loaded with the same points")
+    parser.add_argument("--qdrant-max-rows", type=int, default=100_000, help="Skip the Qdrant stand-in above this many keyframes")
+    parser.add_argument("--root", default=None, help="Folder to generate (and reuse) the corpora in, a temporary one if omitted")
+    parser.add_argument("--json", default=None, help="Also write the measurements to this file, to compare runs")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp()
+    report = []
+    for videos in args.sizes:
+        corpus_root = os.path.join(root, f"{args.packs}x{videos}x{args.keyframes}x{args.dim}")
+        start_time = time.time()
+        corpus = make_corpus(corpus_root, args.packs, videos, args.keyframes, args.dim)
+        print(f"\n{args.packs} packs x {videos} videos: {corpus['rows']} keyframes ({time.time() - start_time:.1f}s to generate or load)")
+        results = run_suite(corpus, corpus_root, args.repeat, args.limit, args.qdrant and corpus["rows"] <= args.qdrant_max_rows)
+        print(f"{'stage':>28} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'items/s':>10} {'peak (MB)':>10}")
+        for stage, r in results.items():
+            print(f"{stage:>28} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['p99']:>9.2f} {r['throughput']:>10.0f} {r['peak_mb']:>10.1f}")
+        report.append({"packs": args.packs, "videos": videos, "rows": corpus["rows"], "results": results})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+sys.path.append(str(Path(__file__).resolve().parent.parent / "app"))
+from feature_store import build_feature_store
+from object_index import build_object_index
+
+LABELS = [
+    "Person", "Man", "Woman", "Clothing", "Car", "Building", "Tree", "Vehicle", "Wheel", "Window",
+    "Human face", "Tire", "Land vehicle", "Motorcycle", "Footwear", "Boat", "Flag", "Chair", "Table", "Bus",
+    "Dog", "Television", "Microphone", "Hat", "Bicycle", "Truck", "Street light", "Flower", "Bird", "Helmet",
+]
+TAGS = ["news", "weather", "sports", "traffic", "health", "economy", "culture", "education", "travel", "food", "music", "fire"]
+FPS_CHOICES = (25.0, 30.0)
+SPEC_FILE = "corpus.json"
+
+
+def corpus_paths(root: str) -> dict[str, str]:
+    """Files and folders of a synthetic corpus, laid out like the project root (see PATH.py)."""
+    return {
+        "features": os.path.join(root, "clip-features-32"),
+        "map_keyframes": os.path.join(root, "map-keyframes"),
+        "objects": os.path.join(root, "objects"),
+        "metadata": os.path.join(root, "media-info"),
+        "store": os.path.join(root, "feature-store"),
+        "fps": os.path.join(root, "video_fps.json"),
+        "videos_per_pack": os.path.join(root, "videos_per_pack.json"),
+        "all_tags": os.path.join(root, "all_tags.json"),
+        "all_objects": os.path.join(root, "all_objects.json"),
+    }
+
+def tag_files(root: str, packs: list[str]) -> list[str]:
+    return [os.path.join(root, pack + "_video_tags.json") for pack in packs]
+
+def _write_json(path: str, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def make_corpus(root: str, packs: int = 2, videos: int = 20, keyframes: int = 200, dim: int = 512, topics: int = 64, objects: bool = True, seed: int = 0) -> dict:
+    """
+    Write a synthetic corpus shaped like the real one, and build its feature store and object index.
+
+    Keyframe vectors are drawn around a few topics per video (shared by every video), so searches
+    have near neighbours spread over many videos like CLIP features do. Keyframe counts vary
+    from half to one and a half times `keyframes` per video. A corpus already written with the
+    same parameters is reused.
+
+    Args:
+        root (str): Output folder.
+        packs (int): Number of packs (L21, L22, ...).
+        videos (int): Videos per pack.
+        keyframes (int): Average keyframes per video.
+        dim (int): Vector size.
+        topics (int): Number of topics the vectors are drawn around.
+        objects (bool): Write the per-keyframe object JSON files and build the object index.
+        seed (int): Random seed.
+    Returns:
+        dict: Parameters of the corpus, with its 'origins', 'packs', 'rows' and 'topics' (unit vectors queries can be drawn around).
+    """
+    spec = {"packs": packs, "videos": videos, "keyframes": keyframes, "dim": dim, "topics": topics, "objects": objects, "seed": seed}
+    paths = corpus_paths(root)
+    spec_path = os.path.join(root, SPEC_FILE)
+    rng = np.random.default_rng(seed)
+    topic_vectors = rng.standard_normal((topics, dim)).astype(np.float32)
+    topic_vectors /= np.linalg.norm(topic_vectors, axis=1, keepdims=True)
+    if os.path.exists(spec_path):
+        with open(spec_path, "r") as f:
+            written = json.load(f)
+        if {key: written.get(key) for key in spec} == spec:
+            return {**written, "topics": topic_vectors}
+
+    for key in ("features", "map_keyframes", "objects", "metadata"):
+        os.makedirs(paths[key], exist_ok=True)
+    pack_names = [f"L{21 + p:02d}" for p in range(packs)]
+    origins, fps_data, videos_per_pack, pack_tags, video_tags = [], {}, {}, {}, {}
+    for pack in pack_names:
+        videos_per_pack[pack] = [f"V{v + 1:03d}" for v in range(videos)]
+        pack_tags[pack] = sorted(rng.choice(TAGS, size=min(6, len(TAGS)), replace=False).tolist())
+        video_tags[pack] = {}
+        for video in videos_per_pack[pack]:
+            origin = pack + '_' + video
+            origins.append(origin)
+            num_frames = int(rng.integers(max(keyframes // 2, 1), keyframes * 3 // 2 + 1))
+            fps = float(rng.choice(FPS_CHOICES))
+
+            # A few scenes per video, each close to one topic
+            scenes = rng.integers(0, topics, size=max(num_frames // 40, 2))
+            scene_of_frame = np.sort(rng.integers(0, len(scenes), size=num_frames))
+            features = topic_vectors[scenes[scene_of_frame]] + 0.6 / np.sqrt(dim) * rng.standard_normal((num_frames, dim)).astype(np.float32)
+            np.save(os.path.join(paths["features"], origin + ".npy"), features.astype(np.float16))
+
+            frame_idx = np.concatenate([[0], np.cumsum(rng.integers(int(fps), int(fps * 6), size=num_frames - 1))])
+            with open(os.path.join(paths["map_keyframes"], origin + ".csv"), "w") as f:
+                f.write("n,pts_time,fps,frame_idx\n")
+                for n, index in enumerate(frame_idx.tolist(), start=1):
+                    f.write(f"{n},{index / fps:.2f},{fps},{index}\n")
+
+            length = int(frame_idx[-1] / fps) + 1
+            fps_data[origin] = fps
+            video_tags[pack][origin] = sorted(rng.choice(pack_tags[pack], size=int(rng.integers(1, 4)), replace=False).tolist())
+            _write_json(os.path.join(paths["metadata"], origin + ".json"), {
+                "length": length,
+                "title": f"Synthetic video {origin}",
+                "watch_url": f"https://youtube.com/watch?v={origin.replace('_', '')}",
+                "keywords": video_tags[pack][origin],
+            })
+
+            if objects:
+                os.makedirs(os.path.join(paths["objects"], origin), exist_ok=True)
+                # Frequent labels (people, cars) dominate, like the detector output
+                weights = 1.0 / np.arange(1, len(LABELS) + 1)
+                for n in range(1, num_frames + 1):
+                    count = int(rng.integers(3, 15))
+                    labels = rng.choice(len(LABELS), size=count, p=weights / weights.sum())
+                    scores = np.sort(rng.random(count))[::-1]
+                    _write_json(os.path.join(paths["objects"], origin, f"{n:03d}.json"), {
+                        "detection_class_entities": [LABELS[label] for label in labels],
+                        "detection_scores": [f"{score:.6f}" for score in scores], # Strings, as in the dataset
+                    })
+
+    _write_json(paths["fps"], fps_data)
+    _write_json(paths["videos_per_pack"], videos_per_pack)
+    _write_json(paths["all_tags"], pack_tags)
+    _write_json(paths["all_objects"], LABELS)
+    for pack, file in zip(pack_names, tag_files(root, pack_names)):
+        _write_json(file, video_tags[pack])
+
+    rows = build_feature_store(paths["features"], paths["map_keyframes"], paths["store"])
+    if objects:
+        offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([np.load(os.path.join(paths["features"], origin + ".npy"), mmap_mode="r").shape[0] for origin in origins])
+        build_object_index(paths["objects"], origins, offsets, LABELS).save(paths["store"])
+    written = {**spec, "origins": origins, "packs": pack_names, "rows": rows}
+    _write_json(spec_path, written)
+    return {**written, "topics": topic_vectors}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus (clip features, map-keyframes, objects, metadata, tags) with its feature store.")
+    parser.add_argument("--out", required=True, help="Output folder")
+    parser.add_argument("--packs", type=int, default=2)
+    parser.add_argument("--videos", type=int, default=20, help="Videos per pack")
+    parser.add_argument("--keyframes", type=int, default=200, help="Average keyframes per video")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--no-objects", action="store_true", help="Skip the object files and index")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    corpus = make_corpus(args.out, args.packs, args.videos, args.keyframes, args.dim, objects=not args.no_objects, seed=args.seed)
+    print(f"{len(corpus['origins'])} videos, {corpus['rows']} keyframes in {args.out} ({time.time() - start_time:.1f}s)")